@@ -0,0 +1,103 @@
+""" Per-message cost of the logger calls on the send and receive paths.
+
+"eager" is how the call sites logged before logger took str.format arguments: the message and the hex dump were
+built first, then handed to a logger that dropped them. "lazy" is the current logger, below the effective level it
+returns after one isEnabledFor check and nothing is formatted.
+
+Run from the repository root::
+
+    python -m benchmarks.log_overhead
+"""
+import binascii
+import logging
+import sys
+import threading
+import timeit
+
+from src.robomaster import client
+from src.robomaster import logger
+from src.robomaster import protocol
+
+N = 200000
+
+
+def _eager_log(msg):
+    """ the logger functions before, formatting happened at the call site """
+    pass
+
+
+class _NullConn:
+    def send(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+def _make_client():
+    cli = client.Client.__new__(client.Client)
+    cli._conn = _NullConn()
+    cli._has_sent = 0
+    cli._recorder = None
+    cli._seq_ids = protocol.SeqIdAllocator()
+    # never started, Client.stop() only checks it is not alive.
+    cli._thread = threading.Thread()
+    return cli
+
+
+def _make_msg():
+    proto = protocol.ProtoChassisSpeedMode()
+    proto._x_spd = 0.5
+    msg = protocol.Msg(protocol.host2byte(9, 6), protocol.host2byte(3, 6), proto)
+    msg.pack()
+    return msg
+
+
+def per_call(fn, number=N):
+    """ best of 3, microseconds per call """
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    msg = _make_msg()
+    data = msg.pack()
+    cli = _make_client()
+
+    def recv_eager():
+        _eager_log("Client: recv_msg, {0}".format(msg))
+
+    def recv_lazy():
+        logger.info("Client: recv_msg, {0}", msg)
+
+    def send_eager():
+        _eager_log("Client: send_msg, msg {0} {1}".format(0, msg))
+        _eager_log("Client: send_msg, cmset:{0:2x}, cmdid:{1:2x}, {2}".format(msg.cmdset, msg.cmdid,
+                                                                             binascii.hexlify(data)))
+
+    def send_lazy():
+        logger.debug("Client: send_msg, msg {0} {1}", 0, msg)
+        logger.debug("Client: send_msg, cmset:{0:2x}, cmdid:{1:2x}, {2}", msg.cmdset, msg.cmdid, logger.hexlify(data))
+
+    logger.set_level(logging.WARNING)
+    print("python {0}, {1} calls, logging below the level".format(sys.version.split()[0], N))
+    print("recv info line (Msg repr):     eager {0:.2f} us, lazy {1:.2f} us".format(
+        per_call(recv_eager), per_call(recv_lazy)))
+    print("send debug lines (repr + hex): eager {0:.2f} us, lazy {1:.2f} us".format(
+        per_call(send_eager), per_call(send_lazy)))
+    print("Client.send_msg, pack and log: {0:.2f} us".format(per_call(lambda: cli.send_msg(msg))))
+
+    # enabled, records formatted and handed to a handler that drops them.
+    handler = logging.NullHandler()
+    handler.emit = lambda record: record.getMessage()
+    logging.getLogger("robomaster").addHandler(handler)
+    logger.set_level(logging.DEBUG)
+    try:
+        print("enabled, formatted by the handler: recv {0:.2f} us, send {1:.2f} us".format(
+            per_call(recv_lazy, N // 10), per_call(send_lazy, N // 10)))
+    finally:
+        logging.getLogger("robomaster").removeHandler(handler)
+        logger.set_level(logging.NOTSET)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+""" Memory and time of decoding received msgs.
+
+Run from the repository root::
+
+    python -m benchmarks.msg_memory
+
+To compare with an older revision, run the same command in a checkout of it, e.g.
+``git worktree add /tmp/before <rev>``. Revisions without protocol.FrameParser decode the datagram with
+protocol.decode_msg, one frame per call, as their Connection did.
+"""
+import gc
+import struct
+import sys
+import time
+import tracemalloc
+
+from src.robomaster import algo
+from src.robomaster import protocol
+
+# period pushes packed per datagram, as the robot sends them.
+FRAMES_PER_DATAGRAM = 8
+
+
+def make_push(seq_id, msg_id=21):
+    """ a ProtoPushPeriodMsg frame carrying 6 floats """
+    payload = bytes((0, msg_id)) + struct.pack('<6f', seq_id, 2, 3, 4, 5, 6)
+    n = 13 + len(payload)
+    buf = bytearray(n)
+    buf[0] = 0x55
+    buf[1] = n & 0xff
+    buf[2] = (n >> 8) & 0x3 | 4
+    buf[3] = algo.crc8_calc(buf[0:3])
+    buf[4] = protocol.host2byte(9, 0)
+    buf[5] = protocol.host2byte(9, 6)
+    buf[6] = seq_id & 0xff
+    buf[7] = (seq_id >> 8) & 0xff
+    buf[8] = 0
+    buf[9] = protocol.ProtoPushPeriodMsg._cmdset
+    buf[10] = protocol.ProtoPushPeriodMsg._cmdid
+    buf[11:11 + len(payload)] = payload
+    struct.pack_into('<H', buf, n - 2, algo.crc16_calc(buf[0:n - 2]))
+    return bytes(buf)
+
+
+DATAGRAM = b''.join(make_push(i) for i in range(FRAMES_PER_DATAGRAM))
+
+
+def make_parser():
+    """ :return: FrameParser, None on revisions without it """
+    parser_cls = getattr(protocol, 'FrameParser', None)
+    return parser_cls() if parser_cls is not None else None
+
+
+def iter_msgs(parser, data):
+    if parser is not None:
+        return parser.iter_frames(data)
+    return _decode_all(data)
+
+
+def _decode_all(data):
+    while data:
+        msg, data = protocol.decode_msg(data)
+        if msg is None:
+            return
+        yield msg
+
+
+def release(msg):
+    # Msg.release came with the zero-copy receive ring.
+    if hasattr(msg, 'release'):
+        msg.release()
+
+
+def held_bytes_per_msg(n=50000):
+    """ bytes allocated per decoded msg kept alive, buffers and proto included """
+    parser = make_parser()
+    keep = []
+    gc.collect()
+    tracemalloc.start()
+    for _ in range(n // FRAMES_PER_DATAGRAM):
+        for msg in iter_msgs(parser, DATAGRAM):
+            msg.unpack_protocol()
+            keep.append(msg)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / len(keep)
+
+
+def decode_time(parser, n=100000, repeat=5):
+    """ best of repeat, microseconds to decode, unpack and release one msg """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n // FRAMES_PER_DATAGRAM):
+            for msg in iter_msgs(parser, DATAGRAM):
+                msg.unpack_protocol()
+                release(msg)
+        elapsed = (time.perf_counter() - start) / n * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def gc_collections_held(n=200000):
+    """ collections per generation while n decoded msgs are kept alive """
+    parser = make_parser()
+    keep = []
+    gc.collect()
+    before = [stat['collections'] for stat in gc.get_stats()]
+    for _ in range(n // FRAMES_PER_DATAGRAM):
+        for msg in iter_msgs(parser, DATAGRAM):
+            msg.unpack_protocol()
+            keep.append(msg)
+    return [stat['collections'] - b for stat, b in zip(gc.get_stats(), before)]
+
+
+def object_sizes():
+    msg = protocol.Msg()
+    proto = protocol.ProtoPushPeriodMsg()
+    sizes = {'Msg': sys.getsizeof(msg), 'ProtoPushPeriodMsg': sys.getsizeof(proto)}
+    for name, obj in (('Msg', msg), ('ProtoPushPeriodMsg', proto)):
+        if hasattr(obj, '__dict__'):
+            sizes[name] += sys.getsizeof(obj.__dict__)
+    return sizes
+
+
+def main():
+    print("python {0}, {1} frames per datagram".format(sys.version.split()[0], FRAMES_PER_DATAGRAM))
+    print("object size, instance dict included: {0}".format(object_sizes()))
+    print("bytes held per decoded msg: {0:.0f}".format(held_bytes_per_msg()))
+    print("gc collections holding 200k msgs: {0}".format(gc_collections_held()))
+    print("decode + unpack + release: {0:.2f} us/msg".format(decode_time(make_parser())))
+
+
+if __name__ == '__main__':
+    main()
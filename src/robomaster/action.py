@@ -53,8 +53,7 @@ class _AutoRegisterAction(type):
         registered_actions[key] = cls
 
 class Action(metaclass=_AutoRegisterAction):
-    _action_mutex = threading.Lock()
-    _next_action_id = RM_SDK_FIRST_ACTION_ID
+    _action_ids = protocol.SeqIdAllocator(RM_SDK_FIRST_ACTION_ID, RM_SDK_LAST_ACTION_ID)
     _action_proto_cls = None
     _push_proto_cls = None
     _target = protocol.host2byte(0, 0)
@@ -72,14 +71,7 @@ class Action(metaclass=_AutoRegisterAction):
         self._on_state_changed = None
 
     def _get_next_action_id(self):
-        self.__class__._action_mutex.acquire()
-        action_id = self.__class__._next_action_id
-        if self.__class__._next_action_id == RM_SDK_LAST_ACTION_ID:
-            self.__class__._next_action_id = RM_SDK_FIRST_ACTION_ID
-        else:
-            self.__class__._next_action_id = self.__class__._next_action_id + 1
-        self.__class__._action_mutex.release()
-        return action_id
+        return self._action_ids.next()
 
     def __repr__(self):
         return "<action, name:{0} id:{1:d}, state:{2}, percent:{3:d}%>".format(
@@ -145,7 +137,7 @@ class Action(metaclass=_AutoRegisterAction):
             orgin = self._state
             self._state = state
             logger.info("Action, name:{0} _changeto_state from {1} "
-                        "to {2}".format(self.__class__.__name__, orgin, self._state))
+                        "to {2}", self.__class__.__name__, orgin, self._state)
 
             if self._on_state_changed and self._obj:
                 self._on_state_changed(self._obj, self, orgin, self._state)
@@ -201,16 +193,16 @@ class TextAction(Action):
         return "<action, name:{0}, state:{1}".format(self.__class__.__name__, self._state)
 
     def _update_action_state(self, proto_state):
-        logger.debug("TextAction: _update_action_state, proto_state {0}".format(proto_state))
+        logger.debug("TextAction: _update_action_state, proto_state {0}", proto_state)
         if proto_state == 'ok':
             self._changeto_state(ACTION_SUCCEEDED)
         elif re.match(r'Re\d{4} ok', proto_state):
             self._changeto_state(ACTION_SUCCEEDED)
         elif proto_state == 'error':
             self._changeto_state(ACTION_FAILED)
-            logger.error("TextAction: action failed ! resp: {0}".format(proto_state))
+            logger.error("TextAction: action failed ! resp: {0}", proto_state)
         else:
-            logger.error("TextAction: action failed ! resp: {0}".format(proto_state))
+            logger.error("TextAction: action failed ! resp: {0}", proto_state)
 
     def make_action_key(self):
         return self.target
@@ -251,7 +243,7 @@ class ActionDispatcher:
     
     @classmethod
     def _on_recv(cls, self, msg):
-        logger.debug("ActionDispatcher: on_recv, in_progress:{0}".format(self._in_progress))
+        logger.debug("ActionDispatcher: on_recv, in_progress:{0}", self._in_progress)
         proto = msg.get_proto()
         if proto is None:
             return
@@ -284,17 +276,17 @@ class ActionDispatcher:
                     action._changeto_state(ACTION_SUCCEEDED)
             else:
                 action._changeto_state(ACTION_FAILED)
-            logger.debug("ActionDispatcher, found_proto, action:{0}".format(action))
+            logger.debug("ActionDispatcher, found_proto, action:{0}", action)
         
         if found_action:
             if isinstance(action, TextAction):
-                logger.debug("ActionDispatcher, found text action, and will update_from_push action:{0}".format(action))
+                logger.debug("ActionDispatcher, found text action, and will update_from_push action:{0}", action)
                 if action.is_running:
                     action.update_from_push(proto)
                 return
             
             if proto._action_id == action._action_id:
-                logger.debug("ActionDispatcher, found action, and will update_from_push action:{0}".format(action))
+                logger.debug("ActionDispatcher, found action, and will update_from_push action:{0}", action)
                 if action.is_running:
                     action.update_from_push(proto)
 
@@ -316,7 +308,7 @@ class ActionDispatcher:
                 act = self._in_progress[k]
                 if action.target == act.target:
                     action = list(self._in_progress.values())[0]
-                    logger.error("Robot is already performing {0} action(s) {1}".format(len(self._in_progress), action))
+                    logger.error("Robot is already performing {0} action(s) {1}", len(self._in_progress), action)
                     raise Exception("Robot is already performing {0} action(s) {1}".format(
                         len(self._in_progress), action))
             self._in_progress_mutex.release()
@@ -334,17 +326,17 @@ class ActionDispatcher:
 
         if isinstance(action, TextAction):
             action._changeto_state(ACTION_STARTED)
-        logger.info("ActionDispatcher: send_action, action:{0}".format(action))
+        logger.info("ActionDispatcher: send_action, action:{0}", action)
 
     @classmethod
     def _on_action_state_changed(cls, self, action, orgin, target):
         if action.is_completed:
             action_key = action.make_action_key()
-            logger.debug("ActionDispatcher, in_progress:{0}".format(self._in_progress))
+            logger.debug("ActionDispatcher, in_progress:{0}", self._in_progress)
             self._in_progress_mutex.acquire()
             if action_key in self._in_progress.keys():
-                logger.debug("ActionDispatcher, del action:{0}".format(action))
+                logger.debug("ActionDispatcher, del action:{0}", action)
                 del (self._in_progress[action_key])
             else:
-                logger.warning("ActionDispatcher, del failed, action: {0}".format(action))
+                logger.warning("ActionDispatcher, del failed, action: {0}", action)
             self._in_progress_mutex.release()
@@ -0,0 +1,511 @@
+import asyncio
+
+from src.robomaster import action
+from src.robomaster import chassis
+from src.robomaster import client
+from src.robomaster import config
+from src.robomaster import conn
+from src.robomaster import dds
+from src.robomaster import logger
+from src.robomaster import protocol
+from src.robomaster import robot
+from src.robomaster import util
+
+__all__ = ['AioClient', 'AioRobot', 'AioChassis', 'AioSubscriber', 'Subscription']
+
+SUBSCRIPTION_DEFAULT_QUEUE_SIZE = 64
+
+_SUB_CLOSED = object()
+
+
+class _ClientProtocol(asyncio.DatagramProtocol):
+    def __init__(self, cli):
+        self._client = cli
+
+    def connection_made(self, transport):
+        self._client._transport = transport
+
+    def datagram_received(self, data, addr):
+        self._client._on_datagram(data)
+
+    def error_received(self, exc):
+        logger.warning("AioClient: error_received, exception:{0}", exc)
+
+    def connection_lost(self, exc):
+        if exc:
+            logger.warning("AioClient: connection_lost, exception:{0}", exc)
+
+
+class AioClient:
+    """ asyncio counterpart of client.Client, one datagram transport and no threads """
+
+    def __init__(self, host=9, index=6, local_addr=config.ROBOT_DEFAULT_LOCAL_WIFI_ADDR,
+                 remote_addr=config.ENV_ROBOT_DEFAULT_ADDR):
+        self._host = host
+        self._index = index
+        self._local_addr = local_addr
+        self._remote_addr = remote_addr
+        self._transport = None
+        self._parser = protocol.FrameParser()
+        self._wait_ack_list = {}
+        self._seq_ids = protocol.SeqIdAllocator()
+        self._handlers = {}
+        self._has_sent = 0
+        self._has_recv = 0
+
+    @property
+    def hostbyte(self):
+        return protocol.host2byte(self._host, self._index)
+
+    @property
+    def remote_addr(self):
+        return self._remote_addr
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: _ClientProtocol(self), local_addr=self._local_addr)
+
+    def close(self):
+        for future in list(self._wait_ack_list.values()):
+            future.cancel()
+        self._wait_ack_list.clear()
+        if self._transport:
+            self._transport.close()
+            self._transport = None
+
+    def add_handler(self, name, f):
+        self._handlers[name] = f
+
+    def remove_handler(self, name):
+        self._handlers.pop(name, None)
+
+    def send_msg(self, msg):
+        msg._seq_id = self._seq_ids.next()
+        return self._send_msg(msg)
+
+    def _send_msg(self, msg):
+        data = msg.pack()
+        self._has_sent += 1
+        try:
+            self._transport.sendto(data, self._remote_addr)
+        except Exception as e:
+            logger.warning("AioClient: send_msg, exception {0}", str(e))
+            return False
+        return True
+
+    def send_msg_future(self, msg):
+        """ Send msg, the returned asyncio future is resolved with the ack msg, or None if msg needs no ack. """
+        future = asyncio.get_running_loop().create_future()
+        if msg._need_ack > 0:
+            # skip the seq_ids still waiting for an ack.
+            for _ in range(len(self._wait_ack_list) + 1):
+                msg._seq_id = self._seq_ids.next()
+                ident = client.Client._make_ack_identify(msg)
+                if ident not in self._wait_ack_list:
+                    break
+                logger.warning("AioClient: send_msg_future, seq_id:{0} is still in flight, skip it.", msg._seq_id)
+            self._wait_ack_list[ident] = future
+            future.add_done_callback(lambda f: self._on_ack_future_done(ident, f))
+            self._send_msg(msg)
+        else:
+            future.set_result(None)
+            self.send_msg(msg)
+        return future
+
+    async def send_sync_msg(self, msg, timeout=3.0):
+        if self._transport is None:
+            logger.error("AioClient: send_sync_msg, client is not started.")
+            return None
+        try:
+            return await asyncio.wait_for(self.send_msg_future(msg), timeout)
+        except asyncio.TimeoutError:
+            logger.error("AioClient: send_sync_msg wait msg receiver:{0}, cmdset:0x{1:02x}, cmdid:0x{2:02x} "
+                         "timeout!", msg.receiver, msg.cmdset, msg.cmdid)
+            return None
+
+    async def send_sync_proto(self, proto, target, timeout=3.0):
+        """ send proto to target and check the retcode of its ack
+
+        :return: bool: True if the ack retcode is 0
+        """
+        msg = protocol.Msg(self.hostbyte, target, proto)
+        resp_msg = await self.send_sync_msg(msg, timeout)
+        if resp_msg is None:
+            logger.warning("AioClient: send_sync_proto, proto:{0} resp_msg is None.", proto)
+            return False
+        resp_proto = resp_msg.get_proto()
+        if resp_proto is None or resp_proto._retcode != 0:
+            logger.warning("AioClient: send_sync_proto, proto:{0}, resp_proto:{1}", proto, resp_proto)
+            return False
+        return True
+
+    def send_async_proto(self, proto, target):
+        """ send proto to target without asking for an ack, e.g. a push such as ProtoChassisSpeedMode
+
+        :return: bool: True if the msg was sent
+        """
+        if self._transport is None:
+            logger.error("AioClient: send_async_proto, client is not started.")
+            return False
+        msg = protocol.Msg(self.hostbyte, target, proto)
+        msg._need_ack = 0
+        return self.send_msg(msg)
+
+    def _on_ack_future_done(self, ident, future):
+        if future.cancelled() and self._wait_ack_list.get(ident) is future:
+            del self._wait_ack_list[ident]
+
+    def _resolve_ack(self, msg, result):
+        future = self._wait_ack_list.pop(client.Client._make_ack_identify(msg), None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def _on_datagram(self, data):
+        for msg in self._parser.iter_frames(data):
+            self._has_recv += 1
+            try:
+                msg.unpack_protocol()
+            except Exception as e:
+                logger.warning("AioClient: unpack_protocol, msg:{0}, exception:{1}", msg, e)
+                # the request failed, as Client.wait_msg_future does not wait for it either.
+                if msg.is_ack:
+                    self._resolve_ack(msg, None)
+                continue
+            if msg.is_ack:
+                self._resolve_ack(msg, msg)
+            for f in list(self._handlers.values()):
+                f(msg)
+
+
+class Subscription:
+    """ Async iterator over the samples of one subscribed subject.
+
+    The robot side subscription is added on first iteration (or on entering ``async with``) and removed by close().
+    When the consumer falls behind, the oldest queued sample is dropped.
+    """
+
+    def __init__(self, subscriber, subject, maxsize=SUBSCRIPTION_DEFAULT_QUEUE_SIZE):
+        self._subscriber = subscriber
+        self._subject = subject
+        self._queue = asyncio.Queue(maxsize)
+        self._opened = False
+        self._closed = False
+        self._dropped = 0
+
+    def __repr__(self):
+        return "<Subscription {0}, opened:{1}, closed:{2}, dropped:{3}>".format(
+            self._subject.name, self._opened, self._closed, self._dropped)
+
+    @property
+    def subject(self):
+        return self._subject
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    async def open(self):
+        if not self._opened:
+            self._opened = True
+            if not await self._subscriber._add(self):
+                self._closed = True
+                raise Exception("Subscription: subscribe {0} failed.".format(self._subject.name))
+        return self
+
+    async def close(self):
+        if self._opened and not self._closed:
+            self._closed = True
+            await self._subscriber._del(self)
+            self._put(_SUB_CLOSED)
+
+    def _put(self, sample):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self._dropped += 1
+        self._queue.put_nowait(sample)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._opened:
+            await self.open()
+        if self._closed and self._queue.empty():
+            raise StopAsyncIteration
+        sample = await self._queue.get()
+        if sample is _SUB_CLOSED:
+            raise StopAsyncIteration
+        return sample
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+class AioSubscriber:
+    _host = protocol.host2byte(9, 0)
+
+    def __init__(self, cli):
+        self._client = cli
+        self._subscriptions = {}
+        self._sub_msg_id = dds.SDK_FIRST_DDS_ID
+        cli.add_handler("AioSubscriber", self._on_msg)
+
+    def get_next_subject_id(self):
+        if self._sub_msg_id > dds.SDK_LAST_DDS_ID:
+            self._sub_msg_id = dds.SDK_FIRST_DDS_ID
+        else:
+            self._sub_msg_id += 1
+        return self._sub_msg_id
+
+    def subscribe(self, subject, maxsize=SUBSCRIPTION_DEFAULT_QUEUE_SIZE):
+        return Subscription(self, subject, maxsize)
+
+    async def close(self):
+        for subscription in list(self._subscriptions.values()):
+            await subscription.close()
+
+    async def _add(self, subscription):
+        subject = subscription.subject
+        proto = protocol.ProtoAddSubMsg()
+        proto._node_id = self._client.hostbyte
+        proto._sub_freq = subject.freq
+        proto._sub_data_num = 1
+        proto._msg_id = self.get_next_subject_id()
+        proto._sub_uid_list.append(subject.uid)
+        subject._subject_id = proto._msg_id
+        self._subscriptions[proto._msg_id] = subscription
+        if not await self._client.send_sync_proto(proto, self._host):
+            del self._subscriptions[proto._msg_id]
+            return False
+        return True
+
+    async def _del(self, subscription):
+        msg_id = subscription.subject._subject_id
+        if self._subscriptions.get(msg_id) is not subscription:
+            return False
+        del self._subscriptions[msg_id]
+        proto = protocol.ProtoDelMsg()
+        proto._msg_id = msg_id
+        proto._node_id = self._client.hostbyte
+        return await self._client.send_sync_proto(proto, self._host)
+
+    def _on_msg(self, msg):
+        if msg.cmdset != 0x48 or msg.cmdid != 0x08:
+            return
+        proto = msg.get_proto()
+        if proto is None:
+            return
+        subscription = self._subscriptions.get(proto._msg_id)
+        if subscription is None:
+            return
+        subscription.subject.decode(proto._data_buf)
+        subscription._put(subscription.subject.data_info())
+
+
+class AioActionDispatcher(action.ActionDispatcher):
+    """ ActionDispatcher whose actions are awaited on the event loop """
+
+    def __init__(self, cli):
+        super().__init__(cli)
+        self._futures = {}
+
+    def initialize(self):
+        self._client.add_handler("ActionDispatcher", lambda msg: self._on_recv(self, msg))
+
+    async def run_action(self, act, timeout=None):
+        act._action_id = act._get_next_action_id()
+        for in_progress in self._in_progress.values():
+            if act.target == in_progress.target:
+                raise Exception("Robot is already performing {0} action(s) {1}".format(
+                    len(self._in_progress), in_progress))
+
+        future = asyncio.get_running_loop().create_future()
+        self._futures[act] = future
+        self._in_progress[act.make_action_key()] = act
+        act._obj = self
+        act._on_state_changed = self._on_aio_action_state_changed
+        self._client.send_msg(self.get_msg_by_action(act))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("AioActionDispatcher: run_action, {0} timeout.", act)
+            act._changeto_state(action.ACTION_EXCEPTION)
+        finally:
+            self._futures.pop(act, None)
+        return act
+
+    @classmethod
+    def _on_aio_action_state_changed(cls, self, act, orgin, target):
+        cls._on_action_state_changed(self, act, orgin, target)
+        future = self._futures.get(act)
+        if act.is_completed and future is not None and not future.done():
+            future.set_result(act)
+
+
+class AioChassis:
+    _host = protocol.host2byte(3, 6)
+
+    def __init__(self, aio_robot):
+        self._robot = aio_robot
+        self._client = aio_robot.client
+
+    async def drive_speed(self, x=0.0, y=0.0, z=0.0):
+        """ async version of chassis.Chassis.drive_speed """
+        proto = protocol.ProtoChassisSpeedMode()
+        proto._x_spd = util.CHASSIS_SPD_X_CHECKER.val2proto(x)
+        proto._y_spd = util.CHASSIS_SPD_Y_CHECKER.val2proto(y)
+        proto._z_spd = util.CHASSIS_SPD_Z_CHECKER.val2proto(z)
+        # a push, the robot sends no ack for it.
+        return self._client.send_async_proto(proto, self._host)
+
+    async def drive_wheels(self, w1=0, w2=0, w3=0, w4=0):
+        """ async version of chassis.Chassis.drive_wheels """
+        proto = protocol.ProtoSetWheelSpeed()
+        proto._w1_spd = util.WHEEL_SPD_CHECKER.val2proto(w1)
+        proto._w2_spd = util.WHEEL_SPD_CHECKER.val2proto(-w2)
+        proto._w3_spd = util.WHEEL_SPD_CHECKER.val2proto(-w3)
+        proto._w4_spd = util.WHEEL_SPD_CHECKER.val2proto(w4)
+        return await self._client.send_sync_proto(proto, self._host)
+
+    async def move(self, x=0, y=0, z=0, xy_speed=0.5, z_speed=30, timeout=None):
+        """ async version of chassis.Chassis.move, returns the action once it is completed """
+        act = chassis.ChassisMoveAction(x, y, z, xy_speed, z_speed)
+        return await self._robot.action_dispatcher.run_action(act, timeout)
+
+    def sub_position(self, cs=0, freq=5, maxsize=SUBSCRIPTION_DEFAULT_QUEUE_SIZE):
+        """ Subscribe to chassis position, iterate the returned Subscription with ``async for`` to get (x, y, z) """
+        subject = chassis.PositionSubject(cs)
+        subject.freq = freq
+        return self._robot.dds.subscribe(subject, maxsize)
+
+    def sub_attitude(self, freq=5, maxsize=SUBSCRIPTION_DEFAULT_QUEUE_SIZE):
+        """ Subscribe to chassis attitude, yields (yaw, pitch, roll) """
+        subject = chassis.AttiInfoSubject()
+        subject.freq = freq
+        return self._robot.dds.subscribe(subject, maxsize)
+
+    def sub_status(self, freq=5, maxsize=SUBSCRIPTION_DEFAULT_QUEUE_SIZE):
+        """ Subscribe to chassis status, yields the same tuple as chassis.Chassis.sub_status """
+        subject = chassis.SaStatusSubject()
+        subject.freq = freq
+        return self._robot.dds.subscribe(subject, maxsize)
+
+    def sub_imu(self, freq=5, maxsize=SUBSCRIPTION_DEFAULT_QUEUE_SIZE):
+        """ Subscribe to chassis imu, yields (acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z) """
+        subject = chassis.ImuSubject()
+        subject.freq = freq
+        return self._robot.dds.subscribe(subject, maxsize)
+
+
+class AioRobot:
+    """ asyncio counterpart of robot.Robot, every robot runs on the caller's event loop """
+    _sdk_host = robot.ROBOT_DEFAULT_HOST
+    _heart_beat_interval = 1
+
+    def __init__(self, cli=None):
+        self._client = cli
+        self._chassis = None
+        self._dds = None
+        self._action_dispatcher = None
+        self._heart_beat_task = None
+        self._initialized = False
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def chassis(self):
+        return self._chassis
+
+    @property
+    def dds(self):
+        return self._dds
+
+    @property
+    def action_dispatcher(self):
+        return self._action_dispatcher
+
+    async def initialize(self, conn_type=config.DEFAULT_CONN_TYPE, proto_type=config.DEFAULT_PROTO_TYPE, sn=None):
+        if not self._client:
+            local_addr, remote_addr = await self._request_connection(conn_type, proto_type, sn)
+            self._client = AioClient(9, 6, local_addr, remote_addr)
+        await self._client.start()
+
+        self._action_dispatcher = AioActionDispatcher(self._client)
+        self._action_dispatcher.initialize()
+        self._dds = AioSubscriber(self._client)
+        self._chassis = AioChassis(self)
+
+        await self._enable_sdk(1)
+        await self.reset()
+        self._heart_beat_task = asyncio.get_running_loop().create_task(self._heart_beat())
+        self._initialized = True
+        return True
+
+    async def close(self):
+        if self._heart_beat_task:
+            self._heart_beat_task.cancel()
+            self._heart_beat_task = None
+        if self._initialized:
+            await self._dds.close()
+            await self._enable_sdk(0)
+        if self._client:
+            self._client.close()
+        self._initialized = False
+        logger.info("AioRobot close")
+
+    async def reset(self):
+        await self._sub_node_reset()
+        await self._sub_add_node()
+        await self.set_robot_mode(robot.FREE)
+
+    async def set_robot_mode(self, mode=robot.GIMBAL_LEAD):
+        proto = protocol.ProtoSetRobotMode()
+        if mode == robot.FREE:
+            proto._mode = 0
+        elif mode == robot.GIMBAL_LEAD:
+            proto._mode = 1
+        elif mode == robot.CHASSIS_LEAD:
+            proto._mode = 2
+        else:
+            logger.warning("AioRobot: set_robot_mode, unsupported mode = {0}", mode)
+        return await self._client.send_sync_proto(proto, protocol.host2byte(9, 0))
+
+    async def _request_connection(self, conn_type, proto_type, sn):
+        # the sdk handshake is a single blocking exchange, run it off the event loop.
+        sdk_conn = conn.SdkConnection()
+        try:
+            result, local_addr, remote_addr = await asyncio.get_running_loop().run_in_executor(
+                None, sdk_conn.request_connection, self._sdk_host, conn_type, proto_type, sn)
+        finally:
+            sdk_conn.close()
+        if not result:
+            logger.error("AioRobot: Connection Failed, conn_type {0}, host {1}, target {2}, use default "
+                         "address.", conn_type, local_addr, remote_addr)
+            return config.ROBOT_DEFAULT_LOCAL_WIFI_ADDR, config.ENV_ROBOT_DEFAULT_ADDR
+        return local_addr, remote_addr
+
+    async def _enable_sdk(self, enable=1):
+        proto = protocol.ProtoSetSdkMode()
+        proto._enable = enable
+        return await self._client.send_sync_proto(proto, protocol.host2byte(9, 0))
+
+    async def _sub_node_reset(self):
+        proto = protocol.ProtoSubNodeReset()
+        proto._node_id = self._client.hostbyte
+        return await self._client.send_sync_proto(proto, protocol.host2byte(9, 0))
+
+    async def _sub_add_node(self):
+        proto = protocol.ProtoSubscribeAddNode()
+        proto._node_id = self._client.hostbyte
+        return await self._client.send_sync_proto(proto, protocol.host2byte(9, 0))
+
+    async def _heart_beat(self):
+        while True:
+            proto = protocol.ProtoSdkHeartBeat()
+            self._client.send_msg(protocol.Msg(self._client.hostbyte, protocol.host2byte(9, 0), proto))
+            await asyncio.sleep(self._heart_beat_interval)
@@ -1,3 +1,14 @@
+import binascii
+import os
+
+from src.robomaster import config
+from src.robomaster import logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 crc8_table = [
     0x00, 0x5e, 0xbc, 0xe2, 0x61, 0x3f, 0xdd, 0x83, 0xc2, 0x9c, 0x7e, 0x20, 0xa3, 0xfd, 0x1f, 0x41,
     0x9d, 0xc3, 0x21, 0x7f, 0xfc, 0xa2, 0x40, 0x1e, 0x5f, 0x01, 0xe3, 0xbd, 0x3e, 0x60, 0x82, 0xdc,
@@ -53,18 +64,117 @@ crc16_table = [
 ]
 
 
-def crc8_calc(data, crc=0x77):
+# Bit-reversal of every byte value. The crc16 above is the reflected (LSB first) form of CRC-CCITT, so it can be
+# computed by binascii.crc_hqx (MSB first, implemented in C) on bit-reversed input with a bit-reversed seed.
+_BIT_REVERSE = bytes(int('{0:08b}'.format(i)[::-1], 2) for i in range(256))
+
+CRC_BACKEND_TABLE = "table"
+CRC_BACKEND_HQX = "hqx"
+CRC_BACKEND_NUMPY = "numpy"
+
+_VALID_CRC_BACKENDS = {CRC_BACKEND_TABLE, CRC_BACKEND_HQX, CRC_BACKEND_NUMPY}
+
+
+def _crc8_table_calc(data, crc=0x77):
     for t in range(0, len(data)):
         crc = crc8_table[crc ^ data[t]]
     return crc
 
 
-def crc16_calc(data, crc=0x3692):
+def _crc16_table_calc(data, crc=0x3692):
     for t in range(0, len(data)):
         crc = ((crc >> 8) & 0xff) ^ crc16_table[((crc ^ data[t]) & 0xff)]
     return crc
 
 
+def _crc8_fast_calc(data, crc=0x77):
+    table = crc8_table
+    for b in data:
+        crc = table[crc ^ b]
+    return crc
+
+
+def _reverse16(value):
+    return (_BIT_REVERSE[value & 0xff] << 8) | _BIT_REVERSE[(value >> 8) & 0xff]
+
+
+def _crc16_hqx_calc(data, crc=0x3692):
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    elif not isinstance(data, (bytes, bytearray)):
+        data = bytes(data)
+    return _reverse16(binascii.crc_hqx(data.translate(_BIT_REVERSE), _reverse16(crc)))
+
+
+def _crc16_numpy_calc_many(frames, crc=0x3692):
+    """ Group frames by length and run the crc16 column by column over each group at once. """
+    result = [0] * len(frames)
+    groups = {}
+    for i, frame in enumerate(frames):
+        groups.setdefault(len(frame), []).append(i)
+    for length, indexes in groups.items():
+        data = np.frombuffer(b''.join(bytes(frames[i]) for i in indexes), dtype=np.uint8).reshape(len(indexes), length)
+        crcs = np.full(len(indexes), crc, dtype=np.uint16)
+        for t in range(0, length):
+            crcs = (crcs >> 8) ^ _np_crc16_table[(crcs ^ data[:, t]) & 0xff]
+        for i, value in zip(indexes, crcs.tolist()):
+            result[i] = value
+    return result
+
+
+def _crc16_calc_many(frames, crc=0x3692):
+    return [crc16_calc(frame, crc) for frame in frames]
+
+
+crc8_calc = _crc8_fast_calc
+crc16_calc = _crc16_hqx_calc
+crc16_calc_many = _crc16_calc_many
+_crc_backend = None
+
+
+def set_crc_backend(name):
+    """ Select the crc implementation
+
+    :param name: "table": the reference per-byte table loop; "hqx": crc16 through binascii.crc_hqx (default);
+                 "numpy": same as "hqx" for single frames, crc16_calc_many runs vectorised, falls back to "hqx"
+                 when numpy is not installed
+    :return: the backend name actually in use
+    """
+    global crc8_calc, crc16_calc, crc16_calc_many, _crc_backend
+    if name not in _VALID_CRC_BACKENDS:
+        raise ValueError("unsupported crc backend {0}".format(name))
+    if name == CRC_BACKEND_NUMPY and np is None:
+        logger.warning("algo: set_crc_backend, numpy is not available, use {0}.", CRC_BACKEND_HQX)
+        name = CRC_BACKEND_HQX
+    if name == CRC_BACKEND_TABLE:
+        crc8_calc = _crc8_table_calc
+        crc16_calc = _crc16_table_calc
+        crc16_calc_many = _crc16_calc_many
+    else:
+        crc8_calc = _crc8_fast_calc
+        crc16_calc = _crc16_hqx_calc
+        if name == CRC_BACKEND_NUMPY:
+            crc16_calc_many = _crc16_numpy_calc_many
+        else:
+            crc16_calc_many = _crc16_calc_many
+    _crc_backend = name
+    return name
+
+
+def get_crc_backend():
+    return _crc_backend
+
+
+def crc16_check_many(frames):
+    """ Check the trailing crc16 of many complete frames
+
+    :param frames: list of frames, each ending with its little-endian crc16
+    :return: list of bool
+    """
+    crcs = crc16_calc_many([memoryview(frame)[:-2] for frame in frames])
+    return [len(frame) >= 2 and crc == (frame[-2] | (frame[-1] << 8)) for frame, crc in zip(frames, crcs)]
+
+
 def simple_encrypt(data):
     buf = bytearray(len(data))
     key = 0x07
@@ -73,3 +183,13 @@ def simple_encrypt(data):
         buf[i] = r & 0xff
         key = (key + 7) ^ 178
     return buf
+
+
+if np is not None:
+    _np_crc16_table = np.array(crc16_table, dtype=np.uint16)
+
+try:
+    set_crc_backend(os.environ.get(config.ENV_CRC_BACKEND, config.DEFAULT_CRC_BACKEND))
+except ValueError as e:
+    logger.warning("algo: {0}, use {1}.", e, config.DEFAULT_CRC_BACKEND)
+    set_crc_backend(config.DEFAULT_CRC_BACKEND)
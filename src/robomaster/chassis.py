@@ -5,9 +5,16 @@ from src.robomaster import module
 from src.robomaster import protocol
 from src.robomaster import util
 from src.robomaster import action
+from src.robomaster import scheduler
 import threading
+import time
 
-__all__ = ['Chassis', 'ChassisMoveAction']
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = ['Chassis', 'ChassisMoveAction', 'VelocityStream']
 
 class ChassisMoveAction(action.Action):
     _action_proto_cls = protocol.ProtoPositionMove
@@ -57,12 +64,14 @@ class ChassisMoveAction(action.Action):
         self._pos_x = util.CHASSIS_POS_X_SET_CHECKER.proto2val(proto._pos_x)
         self._pos_y = util.CHASSIS_POS_Y_SET_CHECKER.proto2val(proto._pos_y)
         self._pos_z = util.CHASSIS_POS_Z_SET_CHECKER.proto2val(proto._pos_z)
-        logger.info("{0} update_from_push: {1}".format(self.__class__.__name__, self))
+        logger.info("{0} update_from_push: {1}", self.__class__.__name__, self)
 
 class PositionSubject(dds.Subject):
     name = dds.DDS_POSITION
     uid = dds.SUB_UID_MAP[name]
     type = dds.DDS_SUB_TYPE_PERIOD
+    data_size = 12
+    fields = ('x', 'y', 'z')
 
     def __init__(self, cs):
         self._position_x = 0
@@ -97,10 +106,28 @@ class PositionSubject(dds.Subject):
     def decode(self, buf):
         self._position_x, self._position_y, self._position_z = struct.unpack('<fff', buf)
 
+    def decode_many(self, bufs):
+        raw = dds.unpack_float_rows(bufs, 3)
+        out = np.empty(len(raw), dtype=self.values_dtype())
+        if len(raw) == 0:
+            return out
+        if self._cs == 0:
+            if self._first_flag:
+                self._offset_x, self._offset_y, self._offset_z = raw[0].tolist()
+                self._first_flag = False
+            raw = raw - (self._offset_x, self._offset_y, self._offset_z)
+        out['x'] = util.CHASSIS_POS_X_SUB_CHECKER.proto2val_array(raw[:, 0])
+        out['y'] = util.CHASSIS_POS_Y_SUB_CHECKER.proto2val_array(raw[:, 1])
+        out['z'] = util.CHASSIS_POS_Z_SUB_CHECKER.proto2val_array(raw[:, 2])
+        self._position_x, self._position_y, self._position_z = out[-1].tolist()
+        return out
+
 class AttiInfoSubject(dds.Subject):
     name = dds.DDS_ATTITUDE
     uid = dds.SUB_UID_MAP[name]
     type = dds.DDS_SUB_TYPE_PERIOD
+    data_size = 12
+    fields = ('yaw', 'pitch', 'roll')
 
     def __init__(self):
         self._yaw = 0
@@ -119,10 +146,22 @@ class AttiInfoSubject(dds.Subject):
         self._pitch = util.CHASSIS_PITCH_CHECKER.proto2val(self._pitch)
         self._roll = util.CHASSIS_ROLL_CHECKER.proto2val(self._roll)
 
+    def decode_many(self, bufs):
+        raw = dds.unpack_float_rows(bufs, 3)
+        out = np.empty(len(raw), dtype=self.values_dtype())
+        out['yaw'] = util.CHASSIS_YAW_CHECKER.proto2val_array(raw[:, 0])
+        out['pitch'] = util.CHASSIS_PITCH_CHECKER.proto2val_array(raw[:, 1])
+        out['roll'] = util.CHASSIS_ROLL_CHECKER.proto2val_array(raw[:, 2])
+        if len(out):
+            self._yaw, self._pitch, self._roll = out[-1].tolist()
+        return out
+
 class ImuSubject(dds.Subject):
     name = dds.DDS_IMU
     uid = dds.SUB_UID_MAP[name]
     type = dds.DDS_SUB_TYPE_PERIOD
+    data_size = 24
+    fields = ('acc_x', 'acc_y', 'acc_z', 'gyro_x', 'gyro_y', 'gyro_z')
 
     def __init__(self):
         self._acc_x = 0
@@ -147,10 +186,23 @@ class ImuSubject(dds.Subject):
         self._gyro_y = util.CHASSIS_GYRO_CHECKER.proto2val(self._gyro_y)
         self._gyro_z = util.CHASSIS_GYRO_CHECKER.proto2val(self._gyro_z)
 
+    def decode_many(self, bufs):
+        raw = dds.unpack_float_rows(bufs, 6)
+        out = np.empty(len(raw), dtype=self.values_dtype())
+        for i, name in enumerate(self.fields):
+            checker = util.CHASSIS_ACC_CHECKER if i < 3 else util.CHASSIS_GYRO_CHECKER
+            out[name] = checker.proto2val_array(raw[:, i])
+        if len(out):
+            self._acc_x, self._acc_y, self._acc_z, self._gyro_x, self._gyro_y, self._gyro_z = out[-1].tolist()
+        return out
+
 class SaStatusSubject(dds.Subject):
     name = dds.DDS_SA_STATUS
     uid = dds.SUB_UID_MAP[name]
     type = dds.DDS_SUB_TYPE_PERIOD
+    fields = ('static_flag', 'up_hill', 'down_hill', 'on_slope', 'is_pick_up', 'slip_flag', 'impact_x', 'impact_y',
+              'impact_z', 'roll_over', 'hill_static')
+    field_dtype = 'u1'
 
     def __init__(self):
         self._static_flag = 0
@@ -205,20 +257,176 @@ class SaStatusSubject(dds.Subject):
         self._roll_over = (buf[1] >> 1) & 0x01
         self._hill_static = (buf[1] >> 2) & 0x01
 
+    def decode_many(self, bufs):
+        raw = np.frombuffer(b''.join(bytes(buf[0:2]) for buf in bufs), dtype=np.uint8).reshape(-1, 2)
+        out = np.empty(len(raw), dtype=self.values_dtype())
+        for i, name in enumerate(self.fields):
+            out[name] = (raw[:, i // 8] >> (i % 8)) & 0x01
+        if len(out):
+            self._static_flag, self._up_hill, self._down_hill, self._on_slope, self._is_pick_up, self._slip_flag, \
+                self._impact_x, self._impact_y, self._impact_z, self._roll_over, self._hill_static = out[-1].tolist()
+        return out
+
+class VelocityStream:
+    """ Chassis velocity sent at a fixed rate from a dedicated thread, see Chassis.open_velocity_stream
+
+    set() only stores the setpoint, the sender thread sends the latest one every period without waiting for an ack,
+    so the control rate does not depend on the round trip and a lost frame is replaced by the next one. Every
+    ack_every-th frame asks for an ack, the answered, lost and round trip numbers are in stats().
+    """
+
+    def __init__(self, chassis, rate_hz=50, ack_every=0, timeout=None):
+        """
+        :param chassis: Chassis
+        :param rate_hz: float: frames sent per second
+        :param ack_every: int: ask for an ack every ack_every frames, 0 for never
+        :param timeout: float: send zero velocity if set() is not called for timeout seconds, None to keep the last
+        """
+        if rate_hz <= 0:
+            raise ValueError("VelocityStream: rate_hz must be positive, got {0}".format(rate_hz))
+        self._chassis = chassis
+        self._period = 1.0 / rate_hz
+        self._ack_every = ack_every
+        self._timeout = timeout
+        self._setpoint = (0.0, 0.0, 0.0)
+        self._updated = time.monotonic()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._sent = 0
+        self._late = 0
+        self._ack_sampled = 0
+        self._ack_received = 0
+        self._ack_lost = 0
+        self._ack_rtt = None
+        self._ack_future = None
+
+    def __repr__(self):
+        return "<VelocityStream period:{0:.3f}s, setpoint:{1}, {2}>".format(self._period, self._setpoint, self.stats())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def is_open(self):
+        return self._thread is not None and not self._stop_event.is_set()
+
+    def set(self, x=0.0, y=0.0, z=0.0):
+        """
+        Replace the setpoint, it goes out with the next frame
+
+        :param x: float: [-3.5, 3.5], velocity along the x-axis, unit: m/s
+        :param y: float: [-3.5, 3.5], velocity along the y-axis, unit: m/s
+        :param z: float: [-600, 600], rotational velocity around the z-axis, unit: °/s
+        """
+        self._setpoint = (util.CHASSIS_SPD_X_CHECKER.val2proto(x), util.CHASSIS_SPD_Y_CHECKER.val2proto(y),
+                          util.CHASSIS_SPD_Z_CHECKER.val2proto(z))
+        self._updated = time.monotonic()
+
+    def stats(self):
+        """ :return: dict of frames sent, ticks missed, sampled acks asked, received, lost and the last round trip """
+        return {'sent': self._sent, 'late': self._late, 'ack_sampled': self._ack_sampled,
+                'ack_received': self._ack_received, 'ack_lost': self._ack_lost, 'ack_rtt': self._ack_rtt}
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._send_task, name="chassis-velocity", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """ stop the sender thread and send zero velocity """
+        if self._thread is None or self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._setpoint = (0.0, 0.0, 0.0)
+        self._send(0.0, 0.0, 0.0)
+        if self._ack_future is not None:
+            self._ack_future.cancel()
+
+    def _send_task(self):
+        deadline = time.monotonic()
+        while not self._stop_event.is_set():
+            x, y, z = self._setpoint
+            if self._timeout and time.monotonic() - self._updated > self._timeout:
+                x = y = z = 0.0
+            self._send(x, y, z)
+            deadline += self._period
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                # fell behind, skip the missed ticks instead of sending a burst.
+                self._late += int(-delay / self._period) + 1
+                deadline = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+
+    def _send(self, x, y, z):
+        proto = protocol.ProtoChassisSpeedMode()
+        proto._x_spd = x
+        proto._y_spd = y
+        proto._z_spd = z
+        client = self._chassis.client
+        msg = protocol.Msg(client.hostbyte, self._chassis._host, proto)
+        try:
+            self._sent += 1
+            if self._ack_every and self._sent % self._ack_every == 0:
+                self._sample_ack(client, msg)
+            else:
+                client.send_msg(msg)
+        except Exception as e:
+            logger.warning("VelocityStream: send, exception {0}", e)
+
+    def _sample_ack(self, client, msg):
+        previous = self._ack_future
+        if previous is not None and not previous.done():
+            self._ack_lost += 1
+            previous.cancel()
+        msg._need_ack = 1
+        sent_time = time.monotonic()
+        future = client.send_msg_future(msg)
+        self._ack_sampled += 1
+        self._ack_future = future
+        future.add_done_callback(lambda f: self._on_ack(f, sent_time))
+
+    def _on_ack(self, future, sent_time):
+        if future.cancelled() or future.result() is None:
+            return
+        self._ack_received += 1
+        self._ack_rtt = time.monotonic() - sent_time
+
+
 class Chassis(module.Module):
     _host = protocol.host2byte(3, 6)
 
     def __init__(self, robot):
         super().__init__(robot)
         self._action_dispatcher = robot.action_dispatcher
-        self._auto_timer = None
+        # scheduled auto stop and the api it stops, see _arm_auto_stop.
+        self._auto_stop = None
+        self._auto_stop_api = None
+        self._velocity_stream = None
 
     def stop(self):
-        if self._auto_timer:
-            if self._auto_timer.is_alive():
-                self._auto_timer.cancel()
+        if self._auto_stop:
+            self._auto_stop.cancel()
+        if self._velocity_stream:
+            self._velocity_stream.close()
         super().stop()
 
+    @property
+    def telemetry(self):
+        """ Latest chassis data without a callback, e.g. chassis.telemetry.latest(dds.DDS_IMU)
+
+        The data has to be subscribed first, callback may be None: chassis.sub_imu(freq=50)
+
+        :return: telemetry.Telemetry, latest(name) returns TelemetrySample(timestamp, values) or None
+        """
+        return self._robot.dds.telemetry
+
     def _set_mode(self, mode):
         proto = protocol.ProtoChassisSetWorkMode()
         return self._send_sync_proto(proto)
@@ -248,23 +456,32 @@ class Chassis(module.Module):
         proto._w3_spd = util.WHEEL_SPD_CHECKER.val2proto(-w3)
         proto._w4_spd = util.WHEEL_SPD_CHECKER.val2proto(w4)
         if timeout:
-            if self._auto_timer:
-                if self._auto_timer.is_alive():
-                    self._auto_timer.cancel()
-            self._auto_timer = threading.Timer(timeout, self._auto_stop_timer, args=("drive_wheels",))
-            self._auto_timer.start()
-            return self._send_sync_proto(proto)
+            self._arm_auto_stop(timeout, "drive_wheels")
         return self._send_sync_proto(proto)
-    
+
+    def _arm_auto_stop(self, timeout, api):
+        """ move the auto stop deadline, one scheduler entry per chassis instead of a Timer thread per call """
+        if self._auto_stop is not None and self._auto_stop_api == api:
+            self._auto_stop.reschedule(timeout)
+            return
+        if self._auto_stop is not None:
+            self._auto_stop.cancel()
+        self._auto_stop = scheduler.default_scheduler().call_later(timeout, self._auto_stop_timer, api)
+        self._auto_stop_api = api
+
     def _auto_stop_timer(self, api="drive_speed"):
+        # runs on the shared scheduler thread, sent without ack so that no AckFuture is left waiting.
         if api == "drive_speed":
             logger.info("Chassis: drive_speed timeout, auto stop!")
-            self.drive_speed(0, 0, 0, 0)
+            proto = protocol.ProtoChassisSpeedMode()
         elif api == "drive_wheels":
             logger.info("Chassis: drive_wheels timeout, auto stop!")
-            self.drive_wheels(0, 0, 0, 0)
+            proto = protocol.ProtoSetWheelSpeed()
+            proto._w1_spd = proto._w2_spd = proto._w3_spd = proto._w4_spd = 0
         else:
-            logger.warning("Chassis: unsupported api:{0}".format(api))
+            logger.warning("Chassis: unsupported api:{0}", api)
+            return
+        self._send_async_proto(proto)
 
     def drive_speed(self, x=0.0, y=0.0, z=0.0, timeout=None):
         """
@@ -279,16 +496,33 @@ class Chassis(module.Module):
         proto._x_spd = util.CHASSIS_SPD_X_CHECKER.val2proto(x)
         proto._y_spd = util.CHASSIS_SPD_Y_CHECKER.val2proto(y)
         proto._z_spd = util.CHASSIS_SPD_Z_CHECKER.val2proto(z)
-        logger.info("x_spd:{0:f}, y_spd:{1:f}, z_spd:{2:f}".format(proto._x_spd, proto._y_spd, proto._z_spd))
+        logger.info("x_spd:{0:f}, y_spd:{1:f}, z_spd:{2:f}", proto._x_spd, proto._y_spd, proto._z_spd)
         if timeout:
-            if self._auto_timer:
-                if self._auto_timer.is_alive():
-                    self._auto_timer.cancel()
-            self._auto_timer = threading.Timer(timeout, self._auto_stop_timer, args=("drive_speed",))
-            self._auto_timer.start()
-            return self._send_sync_proto(proto)
+            self._arm_auto_stop(timeout, "drive_speed")
         return self._send_sync_proto(proto)
     
+    def open_velocity_stream(self, rate_hz=50, ack_every=0, timeout=None):
+        """
+            Stream chassis velocity for teleop and planners, a replacement of drive_speed at high rates
+
+            Example::
+
+                stream = chassis.open_velocity_stream(rate_hz=50, ack_every=25, timeout=0.5)
+                stream.set(x=0.5, z=30)
+                ...
+                stream.close()
+
+            :param rate_hz: float: frames sent per second, the latest setpoint is sent
+            :param ack_every: int: ask for an ack every ack_every frames to watch the link, 0 for never
+            :param timeout: float: (0, ∞), send zero velocity if set() is not called within the time, unit: seconds
+            :return: VelocityStream, started, an open stream of this chassis is closed first
+        """
+        if self._velocity_stream:
+            self._velocity_stream.close()
+        self._velocity_stream = VelocityStream(self, rate_hz, ack_every, timeout)
+        self._velocity_stream.start()
+        return self._velocity_stream
+
     def set_pwm_value(self, pwm1=None, pwm2=None, pwm3=None, pwm4=None, pwm5=None, pwm6=None):
         """
             Set PWM output duty cycle
@@ -484,3 +718,22 @@ class Chassis(module.Module):
         subject = ImuSubject()
         subject.freq = freq
         return sub_dds.add_subject_info(subject, callback, args, kw)
+
+    def sub_many(self, freq=5, position=None, attitude=None, imu=None, status=None, cs=0):
+        """ Subscribe to several chassis data with one subscription, the robot pushes them together in one packet
+
+        :param freq: enum: (1, 5, 10, 20, 50), sets the push frequency of subscribed data, in Hz
+        :param position: callback of the position data, see sub_position, None to skip
+        :param attitude: callback of the attitude data, see sub_attitude, None to skip
+        :param imu: callback of the imu data, see sub_imu, None to skip
+        :param status: callback of the status data, see sub_status, None to skip
+        :param cs: int: [0, 1] Coordinate system selection for chassis position, see sub_position
+        :return: bool: Result of data subscription, each data is unsubscribed with its unsub_* method
+        """
+        subjects = []
+        for subject, callback in ((PositionSubject(cs), position), (AttiInfoSubject(), attitude),
+                                  (ImuSubject(), imu), (SaStatusSubject(), status)):
+            if callback is not None:
+                subject.set_callback(callback, (), {})
+                subjects.append(subject)
+        return self._robot.dds.subscribe_many(subjects, freq)
@@ -1,18 +1,36 @@
-import binascii
 import threading
+from concurrent import futures
 from src.robomaster import protocol
 from src.robomaster import config
 from src.robomaster import conn
 from src.robomaster import logger
 from src.robomaster import event
+from src.robomaster import scheduler
 
-CLIENT_MAX_EVENT_NUM = 16
+class AckFuture(futures.Future):
+    """ A pending request, keyed by the integer ack identify in Client._wait_ack_list and resolved with the ack msg
+    by the recv task. """
+
+    def __init__(self, msg, ident=None):
+        super().__init__()
+        self._msg = msg
+        self._ident = ident
+        # scheduler.ScheduledCall cancelling the future once its ack is overdue.
+        self._deadline = None
+
+
+def gather(fs, timeout=3.0):
+    """ Wait for several futures returned by Client.send_msg_future
+
+    :param fs: list of futures
+    :param timeout: float: total time to wait for all of them, unit: second
+    :return: list of ack msgs in the order of fs, None for the requests without an ack in time
+    """
+    done, not_done = futures.wait(fs, timeout)
+    for future in not_done:
+        future.cancel()
+    return [future.result() if future in done and not future.cancelled() else None for future in fs]
 
-class EventIdentify(object):
-    def __init__(self):
-        self._valid = False
-        self._ident = None
-        self._event = threading.Event()
 
 class MsgHandler:
     def __init__(self, proto_data=None, req_cb=None, ack_cb=None):
@@ -29,7 +47,7 @@ class MsgHandler:
         return cmd_set * 256 + cmd_id
 
     def dict_key(self):
-        logger.debug('MsgHandler: dict_key, isinstance:', isinstance(self._proto_data, protocol.ProtoData))
+        logger.debug('MsgHandler: dict_key, isinstance:{0}', isinstance(self._proto_data, protocol.ProtoData))
         if self._proto_data:
             return self.make_dict_key(self.proto_data._cmdset, self.proto_data._cmdid)
         return None
@@ -45,9 +63,10 @@ class Client:
             try:
                 self._conn = conn.Connection(config.ROBOT_DEFAULT_LOCAL_WIFI_ADDR,
                                              config.ENV_ROBOT_DEFAULT_ADDR,
-                                             protocol=config.DEFAULT_PROTO_TYPE)
+                                             protocol=config.DEFAULT_PROTO_TYPE,
+                                             zero_copy=config.DEFAULT_RECV_ZERO_COPY)
             except Exception as e:
-                logger.error('Client: __init__, create Connection, exception: {0}'.format(e))
+                logger.error('Client: __init__, create Connection, exception: {0}', e)
                 self._conn = None
         
         self._has_sent = 0
@@ -56,13 +75,20 @@ class Client:
         self._dispatcher = event.Dispatcher()
 
         self._handler_dict = {}
+        # callbacks precomputed per cmdkey from _handler_dict, see add_msg_handler.
+        self._ack_cb_table = {}
+        self._req_cb_table = {}
 
         self._wait_ack_list = {}
         self._wait_ack_mutex = threading.Lock()
-        self._event_list = []
+        # seq_ids of the msgs sent by this client, and the ids skipped because a request with it is still in flight.
+        self._seq_ids = protocol.SeqIdAllocator()
+        self._seq_id_reused = 0
 
         self._thread = None
         self._running = False
+        self._recv_batch_num = config.DEFAULT_RECV_BATCH_NUM
+        self._recorder = None
 
     def __del__(self):
         self.stop()
@@ -84,9 +110,6 @@ class Client:
         if not self._conn:
             logger.warning("Client: initialize, no connections, init connections first.")
             return False
-        for i in range(0, CLIENT_MAX_EVENT_NUM):
-            ident = EventIdentify()
-            self._event_list.append(ident)
 
         try:
             self._conn.create()
@@ -119,52 +142,96 @@ class Client:
             self._conn.close()
     
     def send_msg(self, msg):
+        msg._seq_id = self._seq_ids.next()
+        self._send_msg(msg)
+
+    def _send_msg(self, msg):
         data = msg.pack()
-        logger.debug("Client: send_msg, msg {0} {1}".format(self._has_sent, msg))
+        logger.debug("Client: send_msg, msg {0} {1}", self._has_sent, msg)
 
-        logger.debug("Client: send_msg, cmset:{0:2x}, cmdid:{1:2x}, {2}".format(msg.cmdset, msg.cmdid,
-                                                                                binascii.hexlify(data)))
+        logger.debug("Client: send_msg, cmset:{0:2x}, cmdid:{1:2x}, {2}", msg.cmdset, msg.cmdid, logger.hexlify(data))
 
         self._has_sent += 1
         self.send(data)
 
-    def send_sync_msg(self, msg, callback=None, timeout=3.0):
+    def send_msg_future(self, msg, timeout=None):
+        """ Send msg without blocking, the ack is delivered through the returned future.
+
+        Independent requests can be sent back to back and waited for together with gather(). A future without an ack
+        is cancelled after timeout, so that a caller dropping it does not leave it in the pending request map.
+
+        :param msg: Msg to send
+        :param timeout: float: the future is cancelled without an ack by then, unit: second,
+                        config.DEFAULT_ACK_FUTURE_TIMEOUT if None
+        :return: AckFuture resolved with the ack msg, resolved with None at once if msg needs no ack
+        """
+        future = AckFuture(msg)
         if not self._running:
-            logger.error("Client: send_sync_msg, client recv_task is not running.")
-            return None
+            logger.error("Client: send_msg_future, client recv_task is not running.")
+            future.set_result(None)
+            return future
         if msg._need_ack > 0:
-            evt = self._ack_register_identify(msg)
-            if evt is None:
-                logger.error("Client: send_sync_msg, ack_register failed.")
-                return None
+            if timeout is None:
+                timeout = config.DEFAULT_ACK_FUTURE_TIMEOUT
+            self._ack_register_identify(future)
+            future._deadline = scheduler.default_scheduler().call_later(timeout, future.cancel)
+            future.add_done_callback(self._on_ack_future_done)
+            self._send_msg(msg)
+        else:
             self.send_msg(msg)
-            evt._event.wait(timeout)
-            if not evt._event.isSet():
-                logger.error("Client: send_sync_msg wait msg receiver:{0}, cmdset:0x{1:02x}, cmdid:0x{2:02x} \
-timeout!".format(msg.receiver, msg.cmdset, msg.cmdid))
-                evt._valid = False
-                return None
-            resp_msg = self._ack_unregister_identify(evt._ident)
-            evt._valid = False
-            if resp_msg is None:
-                logger.error("Client, send_sync_msg, get resp msg failed.")
-            else:
-                if isinstance(resp_msg, protocol.Msg):
-                    try:
+            future.set_result(None)
+        return future
+
+    def wait_msg_future(self, future, timeout=3.0, callback=None):
+        """ Wait for the ack of a request sent by send_msg_future
+
+        :param future: AckFuture
+        :param timeout: float: unit: second
+        :param callback: called with the ack msg
+        :return: ack msg, None on timeout or failure
+        """
+        msg = future._msg
+        try:
+            resp_msg = future.result(timeout)
+        except futures.TimeoutError:
+            logger.error("Client: send_sync_msg wait msg receiver:{0}, cmdset:0x{1:02x}, cmdid:0x{2:02x} \
+timeout!", msg.receiver, msg.cmdset, msg.cmdid)
+            future.cancel()
+            return None
+        except futures.CancelledError:
+            # cancelled by its deadline, see send_msg_future, or by the caller.
+            logger.warning("Client: wait_msg_future, receiver:{0}, cmdset:0x{1:02x}, cmdid:0x{2:02x} is cancelled.",
+                           msg.receiver, msg.cmdset, msg.cmdid)
+            return None
+        if future._ident is None:
+            return resp_msg
+        if resp_msg is None:
+            logger.error("Client, send_sync_msg, get resp msg failed.")
+        else:
+            if isinstance(resp_msg, protocol.Msg):
+                try:
+                    # the connection has unpacked it already, its buffer may be recycled by now.
+                    if resp_msg.get_proto() is None:
                         resp_msg.unpack_protocol()
-                        if callback:
-                            callback(resp_msg)
-                    except Exception as e:
-                        self._unpack_failed += 1
-                        logger.warning("Client: send_sync_msg, resp_msg {0:d} cmdset:0x{1:02x}, cmdid:0x{2:02x}, "
-                                       "e {3}".format(self._has_sent, resp_msg.cmdset, resp_msg.cmdid, format(e)))
-                        return None
-                else:
-                    logger.warning("Client: send_sync_msg, has_sent:{0} resp_msg:{1}.".format(
-                        self._has_sent, resp_msg))
+                    if callback:
+                        callback(resp_msg)
+                except Exception as e:
+                    self._unpack_failed += 1
+                    logger.warning("Client: send_sync_msg, resp_msg {0:d} cmdset:0x{1:02x}, cmdid:0x{2:02x}, "
+                                   "e {3}", self._has_sent, resp_msg.cmdset, resp_msg.cmdid, format(e))
                     return None
+            else:
+                logger.warning("Client: send_sync_msg, has_sent:{0} resp_msg:{1}.", self._has_sent, resp_msg)
+                return None
 
-            return resp_msg
+        return resp_msg
+
+    def send_sync_msg(self, msg, callback=None, timeout=3.0):
+        if not self._running:
+            logger.error("Client: send_sync_msg, client recv_task is not running.")
+            return None
+        if msg._need_ack > 0:
+            return self.wait_msg_future(self.send_msg_future(msg, timeout), timeout, callback)
         else:
             self.send_msg(msg)
 
@@ -176,11 +243,25 @@ timeout!".format(msg.receiver, msg.cmdset, msg.cmdid))
         self._has_sent += 1
         self.send(data)
 
+    def set_recorder(self, recorder):
+        """ Record every raw datagram sent and received from now on
+
+        :param recorder: recorder.Recorder, None to stop recording
+        :return: the previous recorder
+        """
+        previous = self._recorder
+        self._recorder = recorder
+        if self._conn:
+            self._conn._recorder = recorder
+        return previous
+
     def send(self, data):
+        if self._recorder is not None:
+            self._recorder.record_tx(data)
         try:
             self._conn.send(data)
         except Exception as e:
-            logger.warning("Client: send, exception {0}".format(str(e)))
+            logger.warning("Client: send, exception {0}", str(e))
 
     def send_async_msg(self, msg):
         if not self._running:
@@ -196,91 +277,103 @@ timeout!".format(msg.receiver, msg.cmdset, msg.cmdid))
         self._running = True
         logger.info("Client: recv_task, Start to Recving data...")
         while self._running:
-            msg = self._conn.recv()
+            msgs = self._conn.recv_batch(self._recv_batch_num)
             if not self._running:
+                # not dispatched, still give back their receive buffers.
+                for msg in msgs:
+                    msg.release()
                 break
-            if msg is None:
+            if not msgs:
                 logger.warning("Client: _recv_task, recv msg is None, skip.")
                 continue
-            logger.info("Client: recv_msg, {0}".format(msg))
-            self._has_recv += 1
-            self._dispatch_to_send_sync(msg)
-            self._dispatch_to_callback(msg)
-            if self._dispatcher:
-                self._dispatcher.dispatch(msg)
+            self._has_recv += len(msgs)
+            for msg in msgs:
+                logger.info("Client: recv_msg, {0}", msg)
+                self._dispatch_to_send_sync(msg)
+                self._dispatch_to_callback(msg)
+                if self._dispatcher:
+                    self._dispatcher.dispatch(msg)
+                msg.release()
         self._running = False
 
     def _dispatch_to_send_sync(self, msg):
         if msg.is_ack:
-            logger.debug("Client: dispatch_to_send_sync, {0} cmdset:{1} cmdid:{2}".format(
-                self._has_recv, hex(msg._cmdset), hex(msg._cmdid)))
+            logger.debug("Client: dispatch_to_send_sync, {0} cmdset:0x{1:02x} cmdid:0x{2:02x}",
+                         self._has_recv, msg._cmdset, msg._cmdid)
             ident = self._make_ack_identify(msg)
-            self._wait_ack_mutex.acquire()
-            if ident in self._wait_ack_list.keys():
-                for i, evt in enumerate(self._event_list):
-                    if evt._ident == ident and evt._valid:
-                        self._wait_ack_list[ident] = msg
-                        evt._event.set()
-            else:
-                logger.debug("Client: dispatch_to_send_sync, ident:{0} is not in wait_ack_list {1}".format(
-                    ident, self._wait_ack_list))
-            self._wait_ack_mutex.release()
+            with self._wait_ack_mutex:
+                future = self._wait_ack_list.pop(ident, None)
+            if future is None:
+                logger.debug("Client: dispatch_to_send_sync, ident:0x{0:x} is not in wait_ack_list, {1} pending",
+                             ident, len(self._wait_ack_list))
+                return
+            try:
+                future.set_result(msg)
+            except futures.InvalidStateError:
+                logger.debug("Client: dispatch_to_send_sync, ident:0x{0:x} is cancelled.", ident)
 
     def _dispatch_to_callback(self, msg):
+        key = (msg._cmdset << 8) | msg._cmdid
         if msg._is_ack:
-            key = MsgHandler.make_dict_key(msg.cmdset, msg.cmdid)
-            if key in self._handler_dict.keys():
-                self._handler_dict[key]._ack_cb(self, msg)
+            cb = self._ack_cb_table.get(key)
+            if cb is not None:
+                cb(self, msg)
             else:
                 logger.debug("Client: dispatch_to_callback, msg cmdset:{0:2x}, cmdid:{1:2x} is not define ack \
-handler".format(msg.cmdset, msg.cmdid))
+handler", msg.cmdset, msg.cmdid)
         else:
-            key = MsgHandler.make_dict_key(msg.cmdset, msg.cmdid)
-            logger.debug("self_hander_dict keys: {0}".format(self._handler_dict.keys()))
-            if key in self._handler_dict.keys():
-                self._handler_dict[key]._req_cb(self, msg)
+            cb = self._req_cb_table.get(key)
+            if cb is not None:
+                cb(self, msg)
             else:
-                logger.debug("Client: _dispatch_to_callback, cmdset:{0}, cmdid:{1} is not define req handler".format(
-                    hex(msg.cmdset), hex(msg.cmdid)))
+                logger.debug("Client: _dispatch_to_callback, cmdset:0x{0:02x}, cmdid:0x{1:02x} is not define req "
+                             "handler", msg.cmdset, msg.cmdid)
                 
     @staticmethod
     def _make_ack_identify(msg):
+        """ pack (peer host, cmdset, cmdid, seq_id) into one integer key """
         if msg.is_ack:
-            return str(msg._sender) + str(hex(msg.cmdset)) + str(hex(msg.cmdid)) + str(msg._seq_id)
+            host = msg._sender
         else:
-            return str(msg._receiver) + str(hex(msg.cmdset)) + str(hex(msg.cmdid)) + str(msg._seq_id)
-
-    def _ack_register_identify(self, msg):
-        self._wait_ack_mutex.acquire()
-        ident = self._make_ack_identify(msg)
-        self._wait_ack_list[ident] = 1
-        self._wait_ack_mutex.release()
-        evt = None
-
-        for i, evt_ident in enumerate(self._event_list):
-            if not evt_ident._valid:
-                evt = evt_ident
-                break
-        if evt is None:
-            logger.error("Client: event list is run out.")
-            return None
-        evt._valid = True
-        evt._ident = ident
-        evt._event.clear()
-        return evt
+            host = msg._receiver
+        return (host << 32) | (msg._cmdset << 24) | (msg._cmdid << 16) | (msg._seq_id & 0xffff)
 
-    def _ack_unregister_identify(self, identify):
-        try:
-            self._wait_ack_mutex.acquire()
-            if identify in self._wait_ack_list.keys():
-                return self._wait_ack_list.pop(identify)
+    def _ack_register_identify(self, future):
+        """ draw the seq_id of the request and wait for its ack, ids still waiting for an ack are skipped """
+        msg = future._msg
+        with self._wait_ack_mutex:
+            for _ in range(len(self._wait_ack_list) + 1):
+                msg._seq_id = self._seq_ids.next()
+                future._ident = self._make_ack_identify(msg)
+                if future._ident not in self._wait_ack_list:
+                    break
+                self._seq_id_reused += 1
+                logger.warning("Client: ack_register_identify, seq_id:{0} is still in flight, skip it.", msg._seq_id)
             else:
-                logger.warning("can not find ident:{0} in wait_ack_list.".format(identify))
-                return None
-        finally:
-            self._wait_ack_mutex.release()
+                logger.error("Client: ack_register_identify, no free seq_id, {0} requests in flight.",
+                             len(self._wait_ack_list))
+            self._wait_ack_list[future._ident] = future
+        return future
+
+    def _ack_unregister_identify(self, future):
+        with self._wait_ack_mutex:
+            if self._wait_ack_list.get(future._ident) is future:
+                del self._wait_ack_list[future._ident]
+                return True
+        return False
+
+    def _on_ack_future_done(self, future):
+        future._deadline.cancel()
+        if future.cancelled():
+            self._ack_unregister_identify(future)
 
     def add_msg_handler(self, handler):
         key = handler.dict_key()
         if key:
-            self._handler_dict[key] = handler
\ No newline at end of file
+            self._handler_dict[key] = handler
+            self._ack_cb_table.pop(key, None)
+            self._req_cb_table.pop(key, None)
+            if handler._ack_cb:
+                self._ack_cb_table[key] = handler._ack_cb
+            if handler._req_cb:
+                self._req_cb_table[key] = handler._req_cb
\ No newline at end of file
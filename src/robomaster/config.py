@@ -1,6 +1,34 @@
 DEFAULT_CONN_TYPE = "ap"
 DEFAULT_PROTO_TYPE = "udp"
 
+# crc backend, one of "table", "hqx", "numpy", can be overridden by environment variable
+DEFAULT_CRC_BACKEND = "hqx"
+ENV_CRC_BACKEND = "ROBOMASTER_CRC_BACKEND"
+
+# receive into preallocated buffers and decode through memoryview
+DEFAULT_RECV_ZERO_COPY = False
+# max datagrams drained by the client recv task per wakeup
+DEFAULT_RECV_BATCH_NUM = 32
+# seconds a Client.send_msg_future future waits for its ack before it is cancelled, when the caller sets no timeout
+DEFAULT_ACK_FUTURE_TIMEOUT = 10.0
+
+# dds pushes waiting for the dispatch task, the oldest is dropped when full
+DEFAULT_DDS_INGRESS_QUEUE_SIZE = 256
+# dds callback delivery, mode one of "worker", "inline", policy one of "latest", "queue", "all", see dds.SubDelivery
+DEFAULT_DDS_DELIVERY_MODE = "worker"
+DEFAULT_DDS_DELIVERY = "latest"
+DEFAULT_DDS_DELIVERY_QUEUE_SIZE = 32
+
+# bytes preallocated for a recorder.Recorder data file, and seconds between two runs of its writer thread
+DEFAULT_RECORDER_CAPACITY = 64 * 1024 * 1024
+DEFAULT_RECORDER_FLUSH_INTERVAL = 0.05
+# datagrams a replay.ReplayConnection plays ahead of the client recv task
+DEFAULT_REPLAY_MAX_PENDING = 64
+
+# shared memory telemetry ring, name prefix and slots, see shm.ShmRingWriter
+DEFAULT_SHM_PREFIX = "robomaster_"
+DEFAULT_SHM_CAPACITY = 1024
+
 ROBOT_SDK_PORT_MIN = 10100
 ROBOT_SDK_PORT_MAX = 10500
 
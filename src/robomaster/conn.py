@@ -1,6 +1,8 @@
-import binascii
+import collections
 import random
+import select
 import socket
+import threading
 import traceback
 
 from src.robomaster import config
@@ -11,7 +13,68 @@ CONNECTION_LOCAL_ENV = 'local_env'
 CONNECTION_PROTO_TCP = 'tcp'
 CONNECTION_PROTO_UDP = 'udp'
 
+RECV_BUF_SIZE = 2048
+RECV_RING_SLOT_NUM = 64
+RECV_BATCH_MAX_NUM = 32
+
+# MSG_DONTWAIT is not available on every platform, fall back to polling the socket with select.
+_MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
+
+class RecvSlot:
+    """ A receive buffer of RecvBufferRing, recycled once every message decoded from it is released """
+    __slots__ = ('buf', 'view', 'refs', '_lock')
+
+    def __init__(self, size, lock):
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.refs = 0
+        self._lock = lock
+
+    def retain(self):
+        with self._lock:
+            self.refs += 1
+
+    def release(self):
+        with self._lock:
+            self.refs -= 1
+
+
+class RecvBufferRing:
+    """ Preallocated receive buffers for BaseConnection zero copy mode """
+
+    def __init__(self, slot_num=RECV_RING_SLOT_NUM, slot_size=RECV_BUF_SIZE):
+        self._lock = threading.Lock()
+        self._slot_size = slot_size
+        self._slots = [RecvSlot(slot_size, self._lock) for _ in range(0, slot_num)]
+        self._index = 0
+        self._overflow = 0
+
+    @property
+    def overflow(self):
+        """ times every slot was still in use and a temporary buffer was allocated """
+        return self._overflow
+
+    def acquire(self):
+        with self._lock:
+            slot_num = len(self._slots)
+            for i in range(0, slot_num):
+                slot = self._slots[(self._index + i) % slot_num]
+                if slot.refs == 0:
+                    self._index = (self._index + i + 1) % slot_num
+                    slot.refs = 1
+                    return slot
+            self._overflow += 1
+        logger.warning("RecvBufferRing: acquire, all {0} slots in use, allocate temporary buffer.", slot_num)
+        slot = RecvSlot(self._slot_size, self._lock)
+        slot.refs = 1
+        return slot
+
+
 class BaseConnection:
+    # recorder.Recorder receiving every raw datagram, see Client.set_recorder.
+    _recorder = None
+
     def __init__(self):
         self._sock = None
         self._buf = bytearray()
@@ -19,6 +82,9 @@ class BaseConnection:
         self._target_addr = None
         self._proto_type = None
         self._proto = None
+        self._ring = None
+        self._parser = None
+        self._pending = collections.deque()
 
     def create(self):
         """Create a socket connection."""
@@ -30,52 +96,133 @@ class BaseConnection:
                 # This allows the socket to receive data sent to this address
                 # and sets the source address when sending data
                 self._sock.bind(self._host_addr) # define the local address to bind to
-                logger.info("UdpConnection, bind {0}".format(self._host_addr))
+                logger.info("UdpConnection, bind {0}", self._host_addr)
             else:
-                logger.error("Connection: {0} unexpected connection param set".format(self._proto_type))
+                logger.error("Connection: {0} unexpected connection param set", self._proto_type)
 
         except Exception as e:
-            logger.warning("udpConnection: create, host_addr:{0}, exception:{1}".format(self._host_addr, e))
+            logger.warning("udpConnection: create, host_addr:{0}, exception:{1}", self._host_addr, e)
             raise
 
     def close(self):
         if self._sock:
             self._sock.close()
 
-    def recv(self):
+    @property
+    def zero_copy(self):
+        return self._ring is not None
+
+    @staticmethod
+    def _make_parser(proto):
+        if proto == "v1":
+            return protocol.FrameParser()
+        return None
+
+    @property
+    def parser(self):
+        """ the v1 FrameParser, exposes frame, drop and resync counters """
+        return self._parser
+
+    def recv(self, flags=0):
+        if self._pending:
+            return self._pending.popleft()
+        msgs = self._recv_msgs(flags)
+        if not msgs:
+            return None
+        self._pending.extend(msgs[1:])
+        return msgs[0]
+
+    def recv_batch(self, max_num=RECV_BATCH_MAX_NUM):
+        """ Block for one datagram, then drain every datagram already pending on the socket.
+
+        :param max_num: int: upper limit of datagrams handled per call
+        :return: list of decoded msgs
+        """
+        if self._pending:
+            msgs = list(self._pending)
+            self._pending.clear()
+        else:
+            msgs = self._recv_msgs()
+        for i in range(1, max_num):
+            try:
+                if _MSG_DONTWAIT:
+                    msgs.extend(self._recv_msgs(_MSG_DONTWAIT))
+                elif select.select([self._sock], [], [], 0)[0]:
+                    msgs.extend(self._recv_msgs())
+                else:
+                    break
+            except BlockingIOError:
+                break
+        return msgs
+
+    def _recv_msgs(self, flags=0):
+        """ Receive one datagram and decode every msg in it. """
+        if self._ring is not None:
+            return self._recv_zero_copy(flags)
         try:
             if self._sock:
-                data, host = self._sock.recvfrom(2048)
-                logger.debug("Connection: recv, length data:{0}, host:{1}".format(len(data), host))
+                data, host = self._sock.recvfrom(RECV_BUF_SIZE, flags)
+                logger.debug("Connection: recv, length data:{0}, host:{1}", len(data), host)
+        except BlockingIOError:
+            raise
         except Exception as e:
-            logger.warning("Connection: recv, exception:{0}".format(e))
+            logger.warning("Connection: recv, exception:{0}", e)
             raise
 
-        if data is None:
+        if data is None or len(data) == 0:
             logger.warning("Connection: recv buff None.")
-            return None
-        
-        self._buf.extend(data)
-        if len(self._buf) == 0:
-            logger.warning("Connection: recv buff None.")
-            return None
-        
-        msg, self._buf = protocol.decode_msg(self._buf, self._proto)
-        if not msg:
-            logger.warning("Connection: protocol.decode_msg is None.")
-            return None
-        else:
-            if isinstance(msg, protocol.MsgBase):
-                if not msg.unpack_protocol():
-                    logger.warning("Connection: recv, msg.unpack_protocol failed, msg:{0}".format(msg))
-            return msg
-        
+            return []
+        if self._recorder is not None:
+            self._recorder.record_rx(data)
+
+        if self._parser is None:
+            msg, self._buf = protocol.decode_msg(data, self._proto)
+            if not msg:
+                logger.warning("Connection: protocol.decode_msg is None.")
+                return []
+            return [msg]
+        return self._decode(data, None)
+
+    def _recv_zero_copy(self, flags=0):
+        """ Receive into a RecvBufferRing slot, the decoded msgs reference the slot through memoryview.
+
+        The caller releases each msg once dispatch finishes, consumers which keep a msg longer retain it.
+        """
+        slot = self._ring.acquire()
+        try:
+            try:
+                nbytes, host = self._sock.recvfrom_into(slot.view[0:RECV_BUF_SIZE], 0, flags)
+            except BlockingIOError:
+                raise
+            except Exception as e:
+                logger.warning("Connection: recv, exception:{0}", e)
+                raise
+            if nbytes == 0:
+                logger.warning("Connection: recv buff None.")
+                return []
+            if self._recorder is not None:
+                self._recorder.record_rx(slot.view[0:nbytes])
+            return self._decode(slot.view[0:nbytes], slot)
+        finally:
+            slot.release()
+
+    def _decode(self, data, slot):
+        msgs = []
+        for msg in self._parser.iter_frames(data):
+            if slot is not None and isinstance(msg._buf, memoryview):
+                msg._slot = slot
+                slot.retain()
+            if not msg.unpack_protocol():
+                logger.warning("Connection: recv, msg.unpack_protocol failed, msg:{0}", msg)
+            msgs.append(msg)
+        return msgs
+
     def send(self, buf):
         try:
             if self._sock:
                 self._sock.sendto(buf, self._target_addr)
         except Exception as e:
-            logger.warning("Connection: send, exception:{0}".format(e))
+            logger.warning("Connection: send, exception:{0}", e)
             raise
 
     def send_self(self, buf):
@@ -83,11 +230,11 @@ class BaseConnection:
             if self._sock:
                 self._sock.sendto(buf, self._host_addr)
         except Exception as e:
-            logger.warning("Connection: send, exception:{0}".format(e))
+            logger.warning("Connection: send, exception:{0}", e)
             raise
 
 class Connection(BaseConnection):
-    def __init__(self, host_addr, target_addr, proto="v1", protocol=CONNECTION_PROTO_UDP):
+    def __init__(self, host_addr, target_addr, proto="v1", protocol=CONNECTION_PROTO_UDP, zero_copy=False):
         self._host_addr = host_addr
         self._target_addr = target_addr
         self._proto = proto
@@ -95,6 +242,11 @@ class Connection(BaseConnection):
 
         self._sock = None
         self._buf = bytearray()
+        self._ring = None
+        self._parser = self._make_parser(proto)
+        self._pending = collections.deque()
+        if zero_copy and proto == "v1":
+            self._ring = RecvBufferRing()
 
     def __repr__(self):
         return "Connection, host:{0}, target:{1}".format(self._host_addr, self._target_addr)
@@ -120,13 +272,13 @@ class SdkConnection(BaseConnection):
             return False, None
         
         buf = msg.pack()
-        logger.debug("SdkConnection, switch_remote_route, bug:{0}, remote_addr:{1}.".format(buf, remote_addr))
+        logger.debug("SdkConnection, switch_remote_route, bug:{0}, remote_addr:{1}.", buf, remote_addr)
         try:
             self._sock.settimeout(timeout)
             self._sock.sendto(buf, remote_addr)
             data, address = self._sock.recvfrom(1024)
             self._sock.settimeout(timeout)
-            logger.debug("SdkConnection, data:{0}.".format(binascii.hexlify(data)))
+            logger.debug("SdkConnection, data:{0}.", logger.hexlify(data))
             resp_msg, data = protocol.decode_msg(data)
             resp_msg.unpack_protocol()
             if resp_msg:
@@ -138,20 +290,20 @@ class SdkConnection(BaseConnection):
                         logger.error("SdkConnection: reject connection, service is busy!")
                         return False, None
                     if prot._state == 2:
-                        logger.info("SdkConnection: got config ip:{0}".format(prot._config_ip))
+                        logger.info("SdkConnection: got config ip:{0}", prot._config_ip)
                         return True, prot._config_ip
         except socket.timeout:
             logger.error("SdkConnection: RECV TimeOut!")
             raise
         except Exception as e:
-            logger.warning("SdkConnection: switch_remote_route, exception:{0}, Please Check Connections.".format(e))
-            logger.warning("SdkConnection:{0}".format(traceback.format_exc()))
+            logger.warning("SdkConnection: switch_remote_route, exception:{0}, Please Check Connections.", e)
+            logger.warning("SdkConnection:{0}", traceback.format_exc())
             return False, None
         
     def request_connection(self, sdk_host, conn_type=None, proto_type=None, sn=None):
         if conn_type is None:
             logger.error("Not Specific conn_type!")
-        logger.info("CONN TYPE is {0}".format(conn_type))
+        logger.info("CONN TYPE is {0}", conn_type)
         local_addr = None
         remote_addr = None
         proto = protocol.ProtoSetSdkConnection()
@@ -160,13 +312,13 @@ class SdkConnection(BaseConnection):
             
             # localhost 
             proto._ip = '0.0.0.0' 
-            logger.info("Robot: request_connection, ap get local ip:{0}".format(proto._ip))
+            logger.info("Robot: request_connection, ap get local ip:{0}", proto._ip)
             proto._port = random.randint(config.ROBOT_SDK_PORT_MIN, config.ROBOT_SDK_PORT_MAX)
 
             remote_addr = config.ENV_ROBOT_DEFAULT_ADDR
             local_addr = (proto._ip, proto._port)
 
-        logger.info("SdkConnection: request_connection, local addr {0}, remote_addr {1}, ".format(local_addr, remote_addr))
+        logger.info("SdkConnection: request_connection, local addr {0}, remote_addr {1}, ", local_addr, remote_addr)
 
         proto._host = sdk_host
         if proto_type == CONNECTION_PROTO_TCP:
@@ -187,5 +339,5 @@ class SdkConnection(BaseConnection):
             logger.warning("SdkConnection: Connection Failed, please check hareware connections!!!")
             return False, local_addr, remote_addr
         except Exception as e:
-            logger.warning("SdkConnection: request_connection, switch_remote_route exception {0}".format(str(e)))
+            logger.warning("SdkConnection: request_connection, switch_remote_route exception {0}", str(e))
             return False, local_addr, remote_addr
\ No newline at end of file
@@ -1,11 +1,17 @@
 from abc import abstractmethod
-from queue import Queue
+from queue import Queue, Empty, Full
 import collections
 import threading
+from src.robomaster import config
 from src.robomaster import logger
 from src.robomaster import module
 from src.robomaster import protocol
-from concurrent.futures import ThreadPoolExecutor
+from src.robomaster import telemetry
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 SDK_FIRST_DDS_ID = 20
 SDK_LAST_DDS_ID = 225
@@ -25,9 +31,30 @@ SUB_UID_MAP = {
 DDS_SUB_TYPE_EVENT = 1
 DDS_SUB_TYPE_PERIOD = 0
 
+# callback delivery policies, see SubDelivery.
+DELIVERY_LATEST = "latest"
+DELIVERY_QUEUE = "queue"
+DELIVERY_ALL = "all"
+_DELIVERY_POLICIES = (DELIVERY_LATEST, DELIVERY_QUEUE, DELIVERY_ALL)
+# where callbacks run, see SubDelivery.
+DELIVERY_WORKER = "worker"
+DELIVERY_INLINE = "inline"
+_DELIVERY_MODES = (DELIVERY_WORKER, DELIVERY_INLINE)
+
 registered_subjects = {}
 dds_cmd_filter = {(0x48, 0x08)}
 
+_PERIOD_PUSH_CMD = (protocol.ProtoPushPeriodMsg._cmdset, protocol.ProtoPushPeriodMsg._cmdid)
+
+
+def _make_cmd_key(cmdset, cmdid):
+    return (cmdset << 8) | cmdid
+
+
+def unpack_float_rows(bufs, num):
+    """ join payloads of num little-endian float32 values each into a (len(bufs), num) float64 array """
+    return np.frombuffer(b''.join(bufs), dtype='<f4').reshape(-1, num).astype(np.float64)
+
 
 class _AutoRegisterSubject(type):
     '''hepler to automatically register Proto Class whereever they're defined '''
@@ -50,6 +77,17 @@ class Subject(metaclass=_AutoRegisterSubject):
     type = DDS_SUB_TYPE_PERIOD
     uid = 0
     freq = 1
+    # bytes of this subject in a period push, None if variable (it must then be the last one of a batch).
+    data_size = None
+    # names and dtype of the data_info values, used by telemetry history.
+    fields = ()
+    field_dtype = 'f8'
+    # callback delivery, None for config.DEFAULT_DDS_DELIVERY_MODE / DEFAULT_DDS_DELIVERY /
+    # DEFAULT_DDS_DELIVERY_QUEUE_SIZE.
+    delivery_mode = None
+    delivery_policy = None
+    delivery_size = None
+    _delivery = None
 
     def __init__(self):
         self._task = None
@@ -70,12 +108,183 @@ class Subject(metaclass=_AutoRegisterSubject):
     def data_info(self):
         return None
 
-    def exec(self):
-        self._callback(self.data_info(), *self._cb_args, **self._cb_kw)
+    def values_dtype(self):
+        """ numpy dtype of one data_info row, one column per name in fields """
+        return np.dtype([(name, self.field_dtype) for name in self.fields])
+
+    def decode_many(self, bufs):
+        """ Decode many pushed payloads of this subject at once, e.g. a queued burst or a recording, requires numpy
+
+        Subjects with fixed layouts override this with a vectorised version, this one runs decode()/data_info()
+        per payload.
+
+        :param bufs: sequence of payloads as passed to decode()
+        :return: numpy structured array of values_dtype(), row i equals data_info() after decode(bufs[i]), the subject
+                 is left in the same state as after decoding the payloads one by one
+        """
+        rows = []
+        for buf in bufs:
+            self.decode(buf)
+            rows.append(self.data_info())
+        return np.array(rows, dtype=self.values_dtype())
+
+    def exec(self, data_info=None):
+        if self._callback is None:
+            return
+        if data_info is None:
+            data_info = self.data_info()
+        self._callback(data_info, *self._cb_args, **self._cb_kw)
 
 class SubHandler(collections.namedtuple("SubHandler", ("obj subject f"))):
     __slots__ = ()
 
+
+class SubDelivery:
+    """ Samples of one subscription waiting for its callback.
+
+    The mode decides where the callback runs:
+
+    - DELIVERY_WORKER: on a thread owned by this subscription, samples arrive in order
+    - DELIVERY_INLINE: directly on the dispatch task, for cheap callbacks, every sample is delivered and the policy
+      does not apply
+
+    With a worker, the policy decides what happens while the callback is busy:
+
+    - DELIVERY_LATEST: keep only the newest pending sample, replaced samples are counted as coalesced
+    - DELIVERY_QUEUE: keep up to maxsize pending samples, the oldest is dropped when full
+    - DELIVERY_ALL: keep up to maxsize pending samples, the dispatch task blocks when full, nothing is lost
+    """
+
+    def __init__(self, subject, policy=None, maxsize=None, mode=None):
+        self._subject = subject
+        self._cond = threading.Condition(threading.Lock())
+        self._pending = collections.deque()
+        self._closed = False
+        self._worker = None
+        self._delivered = 0
+        self._dropped = 0
+        self._coalesced = 0
+        self.configure(policy, maxsize, mode)
+
+    def __repr__(self):
+        return "<SubDelivery {0}, mode:{1}, policy:{2}, maxsize:{3}, {4}>".format(
+            self._subject.name, self._mode, self._policy, self._maxsize, self.stats())
+
+    @property
+    def policy(self):
+        return self._policy
+
+    @property
+    def mode(self):
+        return self._mode
+
+    def configure(self, policy=None, maxsize=None, mode=None):
+        policy = policy or config.DEFAULT_DDS_DELIVERY
+        if policy not in _DELIVERY_POLICIES:
+            raise ValueError("SubDelivery: unsupported policy {0}, expect one of {1}".format(policy,
+                                                                                             _DELIVERY_POLICIES))
+        mode = mode or config.DEFAULT_DDS_DELIVERY_MODE
+        if mode not in _DELIVERY_MODES:
+            raise ValueError("SubDelivery: unsupported mode {0}, expect one of {1}".format(mode, _DELIVERY_MODES))
+        maxsize = maxsize or config.DEFAULT_DDS_DELIVERY_QUEUE_SIZE
+        with self._cond:
+            self._policy = policy
+            self._maxsize = maxsize
+            self._mode = mode
+            if mode == DELIVERY_WORKER and self._worker is None and not self._closed:
+                self._worker = threading.Thread(target=self._work, name="dds-{0}".format(self._subject.name),
+                                                daemon=True)
+                self._worker.start()
+            self._cond.notify_all()
+
+    def stats(self):
+        """ :return: dict of delivered, dropped, coalesced and pending sample counts """
+        with self._cond:
+            return {'delivered': self._delivered, 'dropped': self._dropped, 'coalesced': self._coalesced,
+                    'pending': len(self._pending)}
+
+    def offer(self, data_info):
+        """ deliver a sample inline or queue it for the worker according to the policy """
+        if self._mode == DELIVERY_INLINE:
+            self._exec(data_info)
+            return
+        with self._cond:
+            if self._closed:
+                return
+            if self._policy == DELIVERY_LATEST:
+                if self._pending:
+                    self._pending[-1] = data_info
+                    self._coalesced += 1
+                else:
+                    self._pending.append(data_info)
+            elif self._policy == DELIVERY_QUEUE:
+                if len(self._pending) >= self._maxsize:
+                    self._pending.popleft()
+                    self._dropped += 1
+                self._pending.append(data_info)
+            else:
+                while len(self._pending) >= self._maxsize and not self._closed and self._mode == DELIVERY_WORKER:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                self._pending.append(data_info)
+            self._cond.notify_all()
+
+    def _exec(self, data_info):
+        try:
+            self._subject.exec(data_info)
+        except Exception as e:
+            logger.warning("SubDelivery: {0} callback exception {1}", self._subject.name, e)
+        self._delivered += 1
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                data_info = self._pending.popleft()
+                self._cond.notify_all()
+            self._exec(data_info)
+
+    def close(self):
+        """ drop the pending samples, stop the worker and wake a blocked dispatch task """
+        with self._cond:
+            self._closed = True
+            self._dropped += len(self._pending)
+            self._pending.clear()
+            self._cond.notify_all()
+
+
+def delivery(mode=None, policy=None, maxsize=None):
+    """ Decorator declaring how a subscription callback wants its samples, see SubDelivery
+
+    Example::
+
+        @dds.delivery(mode=dds.DELIVERY_INLINE)
+        def on_imu(imu_info):
+            ...
+
+        robot.chassis.sub_imu(freq=50, callback=on_imu)
+
+    The declaration takes precedence over Subject.delivery_mode/delivery_policy/delivery_size,
+    Subscriber.set_delivery() can still change it after subscribing.
+    """
+    def decorator(callback):
+        callback._dds_delivery = (mode, policy, maxsize)
+        return callback
+    return decorator
+
+
+def _routes_size(routes):
+    """ bytes of a period push needed by its routes, the fixed size subjects of a batch and nothing of its tail """
+    size = 0
+    for _, start, end in routes:
+        size = max(size, start if end is None else end)
+    return size
+
+
 class Subscriber(module.Module):
     _host = protocol.host2byte(9, 0)
     _sub_msg_id = SDK_FIRST_DDS_ID
@@ -86,14 +295,27 @@ class Subscriber(module.Module):
         
         self.msg_sub_dict = {}
         self._publisher = collections.defaultdict(list)
-        self._msg_queue = Queue()
+        # routing indexes derived from _publisher, replaced as a whole under _dds_mutex so that
+        # the dispatch task reads them without locking.
+        self._period_index = {}
+        self._event_index = {}
+        self._telemetry = telemetry.Telemetry()
+        self._msg_queue = Queue(config.DEFAULT_DDS_INGRESS_QUEUE_SIZE)
+        self._ingress_dropped = 0
+        # batched pushes shorter than their subjects, and payloads a subject failed to decode.
+        self._short_pushes = 0
+        self._decode_errors = 0
         self._dispatcher_running = False
         self._dispatcher_thread = None
-        self.excutor = ThreadPoolExecutor(max_workers=15)
 
     def __del__(self):
         self.stop()
 
+    @property
+    def telemetry(self):
+        """ latest value cache of the subscribed subjects, see telemetry.Telemetry """
+        return self._telemetry
+
     def get_next_subject_id(self):
         if self._sub_msg_id > SDK_LAST_DDS_ID:
             self._sub_msg_id = SDK_FIRST_DDS_ID
@@ -104,68 +326,209 @@ class Subscriber(module.Module):
     def start(self):
         self._dds_mutex = threading.Lock()
         self._client.add_handler(self, "Subscriber", self._msg_recv)
+        self._dispatcher_running = True
         self._dispatcher_thread = threading.Thread(target=self._dispatch_task)
         self._dispatcher_thread.start()
 
     def stop(self):
         self._dispatcher_running = False
+        for handler in list(self._publisher.values()):
+            if handler.subject._delivery is not None:
+                handler.subject._delivery.close()
         if self._dispatcher_thread:
-            self._msg_queue.put(None)
+            # the recv task may keep the queue full, a blocking put could wait forever.
+            self._enqueue(None)
             self._dispatcher_thread.join()
             self._dispatcher_thread = None
-        self.excutor.shutdown(wait=False)
+            while True:
+                try:
+                    msg = self._msg_queue.get_nowait()
+                except Empty:
+                    break
+                if msg is not None:
+                    msg.release()
+        self._telemetry.close()
+
+    def set_delivery(self, subject_name, policy=None, maxsize=None, mode=None):
+        """
+        Set how samples of a subscribed subject reach its callback
+
+        :param subject_name: name of the subject, e.g. DDS_IMU
+        :param policy: DELIVERY_LATEST, DELIVERY_QUEUE or DELIVERY_ALL, see SubDelivery
+        :param maxsize: pending samples kept by DELIVERY_QUEUE and DELIVERY_ALL
+        :param mode: DELIVERY_WORKER or DELIVERY_INLINE
+        :return: bool: False if the subject is not subscribed
+        """
+        handler = self._publisher.get(subject_name)
+        if handler is None or handler.subject._delivery is None:
+            logger.warning("Subscriber: set_delivery, {0} is not subscribed.", subject_name)
+            return False
+        handler.subject._delivery.configure(policy, maxsize, mode)
+        return True
+
+    @staticmethod
+    def _make_delivery(subject):
+        mode, policy, maxsize = subject.delivery_mode, subject.delivery_policy, subject.delivery_size
+        declared = getattr(subject._callback, '_dds_delivery', None)
+        if declared is not None:
+            mode, policy, maxsize = (d if d is not None else v for d, v in zip(declared, (mode, policy, maxsize)))
+        return SubDelivery(subject, policy, maxsize, mode)
+
+    def stats(self):
+        """
+        Delivery counters
+
+        :return: dict, ingress_dropped: pushes dropped because the dispatch task fell behind, ingress_pending: pushes
+                 waiting for it, short_pushes: batched pushes shorter than the sizes of their subjects, decode_errors:
+                 payloads a subject failed to decode, subjects: {name: SubDelivery.stats()}
+        """
+        subjects = {}
+        for name, handler in list(self._publisher.items()):
+            if handler.subject._delivery is not None:
+                subjects[name] = handler.subject._delivery.stats()
+        return {'ingress_dropped': self._ingress_dropped, 'ingress_pending': self._msg_queue.qsize(),
+                'short_pushes': self._short_pushes, 'decode_errors': self._decode_errors, 'subjects': subjects}
 
     @classmethod
     def _msg_recv(cls, self, msg):
-        for cmd_set, cmd_id in list(dds_cmd_filter):
-            if msg.cmdset == cmd_set and msg.cmdid == cmd_id:
-                 self._msg_queue.put(msg)
+        if (msg._cmdset, msg._cmdid) in dds_cmd_filter and self._dispatcher_running:
+            msg.retain()
+            self._enqueue(msg)
+
+    def _enqueue(self, msg):
+        """ put a push, or the None stop marker, on the ingress queue without blocking """
+        while True:
+            try:
+                self._msg_queue.put_nowait(msg)
+                return
+            except Full:
+                pass
+            # the dispatch task fell behind, drop the oldest push rather than stall the client recv task.
+            try:
+                old = self._msg_queue.get_nowait()
+            except Empty:
+                continue
+            if old is None:
+                # keep the stop marker, drop this push instead.
+                self._msg_queue.put_nowait(old)
+                if msg is not None:
+                    msg.release()
+                    self._ingress_dropped += 1
+                return
+            old.release()
+            self._ingress_dropped += 1
 
     def _dispatch_task(self):
-        self._dispatcher_running = True
         logger.info("Subscriber: dispatcher_task is running...")
-        while self._dispatcher_running:
-            msg = self._msg_queue.get(1)
+        while True:
+            msg = self._msg_queue.get()
             if msg is None:
-                if not self._dispatcher_running:
-                    break
+                break
+            if not self._dispatcher_running:
+                # stopping, drop the pushes queued in front of the stop marker.
+                msg.release()
+                continue
+            proto = msg.get_proto()
+            if proto is None:
+                logger.warning("Subscriber: _publish, msg.get_proto None, msg:{0}", msg)
+                msg.release()
                 continue
-            self._dds_mutex.acquire()
-            for name in self._publisher:
-                handler = self._publisher[name]
-                logger.debug("Subscriber: msg: {0}".format(msg))
-                proto = msg.get_proto()
-                if proto is None:
-                    logger.warning("Subscriber: _publish, msg.get_proto None, msg:{0}".format(msg))
-                    continue
-                # logger.debug("handler type: {0}, DDS_SUB_TYPE_PERIOD: {1}".format(handler.subject.type, DDS_SUB_TYPE_PERIOD))
-                if handler.subject.type == DDS_SUB_TYPE_PERIOD and\
-                        msg.cmdset == 0x48 and msg.cmdid == 0x08:
-                    logger.debug("Subscriber: _publish: msg_id:{0}, subject_id:{1}".format(proto._msg_id,
-                                                                                           handler.subject._subject_id))
-                    if proto._msg_id == handler.subject._subject_id:
-                        logger.debug("test test test")
-                        handler.subject.decode(proto._data_buf)
-                        logger.debug("close close")
-                        if handler.subject._task is None:
-                            handler.subject._task = self.excutor.submit(handler.subject.exec)
-                        if handler.subject._task.done() is True:
-                            handler.subject._task = self.excutor.submit(handler.subject.exec)
-                elif handler.subject.type == DDS_SUB_TYPE_EVENT:
-                    if handler.subject.cmdset == msg.cmdset and handler.subject.cmdid == msg.cmdid:
-                        handler.subject.decode(proto._data_buf)
-                        if handler.subject._task is None:
-                            handler.subject._task = self.excutor.submit(handler.subject.exec)
-                        if handler.subject._task.done() is True:
-                            handler.subject._task = self.excutor.submit(handler.subject.exec)
-            self._dds_mutex.release()
-            logger.info("Subscriber: _publish, msg is {0}".format(msg))
+            if (msg._cmdset, msg._cmdid) == _PERIOD_PUSH_CMD:
+                routes = self._period_index.get(proto._msg_id)
+                if routes is not None:
+                    logger.debug("Subscriber: _publish: msg_id:{0}, routes:{1}", proto._msg_id, routes)
+                    buf = proto._data_buf
+                    if len(buf) < _routes_size(routes):
+                        # a slice would be short for some subjects, drop the whole batch.
+                        self._short_pushes += 1
+                        logger.warning("Subscriber: _publish, msg_id:{0}, {1} bytes for {2} bytes of subjects.",
+                                       proto._msg_id, len(buf), _routes_size(routes))
+                        routes = ()
+                    for handler, start, end in routes:
+                        if start == 0 and end is None:
+                            self._publish(handler, buf)
+                        else:
+                            self._publish(handler, buf[start:end])
+            for handler in self._event_index.get(_make_cmd_key(msg._cmdset, msg._cmdid), ()):
+                self._publish(handler, proto._data_buf)
+            logger.debug("Subscriber: _publish, msg is {0}", msg)
+            msg.release()
+
+    def _publish(self, handler, buf):
+        subject = handler.subject
+        try:
+            subject.decode(buf)
+            # data_info is not idempotent for every subject (position applies its offsets), evaluate it once here.
+            data_info = subject.data_info()
+        except Exception as e:
+            # a malformed payload must not end the dispatch task.
+            self._decode_errors += 1
+            logger.warning("Subscriber: _publish, {0} failed to decode {1} bytes, exception {2}", subject.name,
+                           len(buf), e)
+            return
+        self._telemetry.publish(subject.name, data_info)
+        if subject._callback is None or subject._delivery is None:
+            return
+        subject._delivery.offer(data_info)
+
+    def _add_publisher(self, handler, start=0, end=None):
+        """ register handler under its subject name and refresh the routing indexes, call with _dds_mutex held
+
+        :param start, end: slice of the pushed payload decoded by the subject, for batched subscriptions
+        """
+        old = self._publisher.get(handler.subject.name)
+        if old is not None:
+            self._del_publisher(old.subject.name)
+        self._publisher[handler.subject.name] = handler
+        subject = handler.subject
+        subject._delivery = self._make_delivery(subject)
+        if subject.fields:
+            self._telemetry.register(subject.name, subject.fields, subject.field_dtype)
+        if subject.type == DDS_SUB_TYPE_PERIOD:
+            period_index = dict(self._period_index)
+            period_index[subject._subject_id] = period_index.get(subject._subject_id, ()) + ((handler, start, end),)
+            self._period_index = period_index
+        elif subject.type == DDS_SUB_TYPE_EVENT:
+            key = _make_cmd_key(subject.cmdset, subject.cmdid)
+            event_index = dict(self._event_index)
+            event_index[key] = event_index.get(key, ()) + (handler,)
+            self._event_index = event_index
+
+    def _del_publisher(self, subject_name):
+        """ drop the handler of subject_name from _publisher and the routing indexes, call with _dds_mutex held
+
+        :return: the removed handler or None
+        """
+        handler = self._publisher.pop(subject_name, None)
+        if handler is None:
+            return None
+        subject = handler.subject
+        if subject._delivery is not None:
+            subject._delivery.close()
+        if subject.type == DDS_SUB_TYPE_PERIOD:
+            period_index = dict(self._period_index)
+            routes = tuple(r for r in period_index.get(subject._subject_id, ()) if r[0] is not handler)
+            if routes:
+                period_index[subject._subject_id] = routes
+            else:
+                period_index.pop(subject._subject_id, None)
+            self._period_index = period_index
+        elif subject.type == DDS_SUB_TYPE_EVENT:
+            key = _make_cmd_key(subject.cmdset, subject.cmdid)
+            event_index = dict(self._event_index)
+            handlers = tuple(h for h in event_index.get(key, ()) if h is not handler)
+            if handlers:
+                event_index[key] = handlers
+            else:
+                event_index.pop(key, None)
+            self._event_index = event_index
+        return handler
 
     def add_cmd_filter(self, cmd_set, cmd_id):
         dds_cmd_filter.add((cmd_set, cmd_id))
 
     def del_cmd_filter(self, cmd_set, cmd_id):
-        dds_cmd_filter.remove((cmd_set, cmd_id))
+        dds_cmd_filter.discard((cmd_set, cmd_id))
 
     def add_subject_event_info(self, subject, callback=None, *args):
         """
@@ -177,13 +540,11 @@ class Subscriber(module.Module):
         # For event subscription, only a filter is added (no periodic task)
         subject.set_callback(callback, args[0], args[1])
         handler = SubHandler(self, subject, callback)
-        subject._task = None
-        self._dds_mutex.acquire()
-        self._publisher[subject.name] = handler
-        self._dds_mutex.release()
+        with self._dds_mutex:
+            self._add_publisher(handler)
         self.add_cmd_filter(subject.cmdset, subject.cmdid)
-        logger.debug("Subscriber: add_subject_event_info, subject:{0}, cmdset:{1}, cmdid:{2}".format(
-            subject.name, subject.cmdset, subject.cmdid))
+        logger.debug("Subscriber: add_subject_event_info, subject:{0}, cmdset:{1}, cmdid:{2}",
+                     subject.name, subject.cmdset, subject.cmdid)
         return True
     
     def del_subject_event_info(self, subject):
@@ -193,12 +554,12 @@ class Subscriber(module.Module):
         :param subject: The subject instance corresponding to the event
         :return: bool: Result of the operation
         """
-        # For event subscriptions, only remove the filter (no task cancellation needed unless one exists)
-        if self._publisher[subject.name].subject._task is None:
-            pass
-        elif self._publisher[subject.name].subject._task.done() is False:
-            self._publisher[subject.name].subject._task.cancel()
-        self.del_cmd_filter(subject.cmdset, subject.cmdid)
+        with self._dds_mutex:
+            self._del_publisher(subject.name)
+            remaining = _make_cmd_key(subject.cmdset, subject.cmdid) in self._event_index
+        # other event subjects may still listen on the same command.
+        if not remaining and (subject.cmdset, subject.cmdid) != _PERIOD_PUSH_CMD:
+            self.del_cmd_filter(subject.cmdset, subject.cmdid)
         return True
 
     def add_subject_info(self, subject, callback=None, *args):
@@ -213,12 +574,6 @@ class Subscriber(module.Module):
         subject.set_callback(callback, args[0], args[1])
         handler = SubHandler(self, subject, callback)
 
-        self._dds_mutex.acquire()
-        self._publisher[subject.name] = handler
-        self._dds_mutex.release()
-
-        logger.debug(f"publisher: {self._publisher.keys()}")
-
         # Construct and send a protocol message to initiate the subscription
         proto = protocol.ProtoAddSubMsg()
         proto._node_id = self.client.hostbyte
@@ -226,30 +581,75 @@ class Subscriber(module.Module):
         proto._sub_data_num = 1
         proto._msg_id = self.get_next_subject_id()
         subject._subject_id = proto._msg_id
-        subject._task = None
         proto._sub_uid_list.append(subject.uid)
+
+        with self._dds_mutex:
+            self._add_publisher(handler)
+
+        logger.debug("publisher: {0}", self._publisher.keys())
         logger.debug("subscriber")
         return self._send_sync_proto(proto, protocol.host2byte(9, 0))
 
+    def subscribe_many(self, subjects, freq=None):
+        """
+        Subscribe to several period subjects with one subscription, the robot then pushes all of them in a
+        single payload that is split across the subjects.
+
+        :param subjects: period subject instances, callbacks are set beforehand with subject.set_callback(), at most
+                         one of them may have a variable data_size
+        :param freq: push frequency in Hz, defaults to the highest freq of the subjects
+        :return: bool: Result of the request (True if successful)
+        """
+        subjects = list(subjects)
+        if not subjects:
+            raise ValueError("Subscriber: subscribe_many, no subjects.")
+        for subject in subjects:
+            if subject.type != DDS_SUB_TYPE_PERIOD:
+                raise ValueError("Subscriber: subscribe_many, {0} is not a period subject.".format(subject.name))
+        variable = [subject for subject in subjects if subject.data_size is None]
+        if len(variable) > 1:
+            raise ValueError("Subscriber: subscribe_many, more than one variable size subject {0}.".format(
+                [subject.name for subject in variable]))
+        # the variable size subject takes the tail of the payload.
+        subjects = [subject for subject in subjects if subject.data_size is not None] + variable
+
+        proto = protocol.ProtoAddSubMsg()
+        proto._node_id = self.client.hostbyte
+        proto._sub_freq = freq or max(subject.freq for subject in subjects)
+        proto._sub_data_num = len(subjects)
+        proto._msg_id = self.get_next_subject_id()
+        proto._sub_uid_list.extend(subject.uid for subject in subjects)
+
+        with self._dds_mutex:
+            start = 0
+            for subject in subjects:
+                subject.freq = proto._sub_freq
+                subject._subject_id = proto._msg_id
+                end = start + subject.data_size if subject.data_size is not None else None
+                self._add_publisher(SubHandler(self, subject, subject._callback), start, end)
+                start = end
+
+        logger.debug("Subscriber: subscribe_many, msg_id:{0}, subjects:{1}", proto._msg_id, subjects)
+        return self._send_sync_proto(proto, protocol.host2byte(9, 0))
+
     def del_subject_info(self, subject_name):
         """
-        Delete a data subscription
+        Delete a data subscription, a batched subscription is only removed from the robot with its last subject
 
         :param subject_name: The name of the subject to unsubscribe from
         :return: bool: Result of the unsubscription operation
         """
-        logger.debug("Subscriber: del_subject_info: name:{0}, self._publisher:{1}".format(subject_name,
-                     self._publisher))
-        if subject_name in self._publisher:
-            subject_id = self._publisher[subject_name].subject._subject_id
-            if self._publisher[subject_name].subject._task.done() is False:
-                self._publisher[subject_name].subject._task.cancel()
-            self._dds_mutex.acquire()
-            del self._publisher[subject_name]
-            self._dds_mutex.release()
+        logger.debug("Subscriber: del_subject_info: name:{0}, self._publisher:{1}", subject_name, self._publisher)
+        with self._dds_mutex:
+            handler = self._del_publisher(subject_name)
+            in_use = handler is not None and handler.subject._subject_id in self._period_index
+        if handler is not None:
+            subject_id = handler.subject._subject_id
+            if in_use:
+                return True
             proto = protocol.ProtoDelMsg()
             proto._msg_id = subject_id
             proto._node_id = self.client.hostbyte
             return self._send_sync_proto(proto, protocol.host2byte(9, 0))
         else:
-            logger.warning("Subscriber: fail to del_subject_info", subject_name)
\ No newline at end of file
+            logger.warning("Subscriber: fail to del_subject_info {0}", subject_name)
\ No newline at end of file
@@ -7,17 +7,20 @@ class Handler(collections.namedtuple("Handler", ("obj name f"))):
 class Dispatcher:
     def __init__(self):
         self._dispatcher_handlers = collections.defaultdict(list)
+        # snapshot of the registered handlers, rebuilt on add/remove so dispatch never walks the dict.
+        self._handler_table = ()
     
     def add_handler(self, obj, name, f):
         handler = Handler(obj, name, f)
         self._dispatcher_handlers[name] = handler
-        logger.debug("Dispacher: add_handler {0}, _dispatcher_handlers:{1}".format(name, self._dispatcher_handlers))
+        self._handler_table = tuple(self._dispatcher_handlers.values())
+        logger.debug("Dispacher: add_handler {0}, _dispatcher_handlers:{1}", name, self._dispatcher_handlers)
         return handler
     
     def remove_handler(self, name):
         del self._dispatcher_handlers[name]
+        self._handler_table = tuple(self._dispatcher_handlers.values())
 
     def dispatch(self, msg, **kw):
-        for name in self._dispatcher_handlers:
-            handler = self._dispatcher_handlers[name]
+        for handler in self._handler_table:
             handler.f(handler.obj, msg)
\ No newline at end of file
@@ -1,15 +1,86 @@
-def info(msg: str) -> None:
-    """Log an info message."""
-    # print(f"[INFO] {msg}")
+import binascii
+import logging
 
-def warning(msg: str) -> None:
-    """Log a warning message."""
-    # print(f"[WARNING] {msg}")
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
 
-def error(msg: str) -> None:
-    """Log an error message."""
-    # print(f"[ERROR] {msg}")
+_logger = logging.getLogger("robomaster")
+_logger.addHandler(logging.NullHandler())
 
-def debug(msg: str) -> None:
-    """Log a debug message."""
-    # print(f"[DEBUG] {msg}")
\ No newline at end of file
+
+class _BraceMessage:
+    """Defer str.format() until a handler actually emits the record."""
+    __slots__ = ('_fmt', '_args')
+
+    def __init__(self, fmt, args):
+        self._fmt = fmt
+        self._args = args
+
+    def __str__(self):
+        if not self._args:
+            return self._fmt
+        return self._fmt.format(*self._args)
+
+
+class _Hexlify:
+    """Hex-dump a buffer only when formatted."""
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __str__(self):
+        return str(binascii.hexlify(self._data))
+
+    def __format__(self, spec):
+        return format(str(self), spec)
+
+
+def hexlify(data) -> _Hexlify:
+    """Lazy binascii.hexlify for log arguments."""
+    return _Hexlify(data)
+
+
+def set_level(level) -> None:
+    """Set the level of the "robomaster" logger, e.g. logger.set_level(logger.DEBUG)."""
+    _logger.setLevel(level)
+
+
+def enable_stream(level=DEBUG) -> logging.Handler:
+    """Log to stderr at the given level, returns the installed handler."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(threadName)s %(message)s"))
+    _logger.addHandler(handler)
+    _logger.setLevel(level)
+    return handler
+
+
+def is_enabled_for(level) -> bool:
+    """Guard for call sites that need extra work to build their arguments."""
+    return _logger.isEnabledFor(level)
+
+
+def info(msg: str, *args) -> None:
+    """Log an info message, args are applied with str.format only if the level is enabled."""
+    if _logger.isEnabledFor(INFO):
+        _logger.log(INFO, _BraceMessage(msg, args), stacklevel=2)
+
+
+def warning(msg: str, *args) -> None:
+    """Log a warning message, args are applied with str.format only if the level is enabled."""
+    if _logger.isEnabledFor(WARNING):
+        _logger.log(WARNING, _BraceMessage(msg, args), stacklevel=2)
+
+
+def error(msg: str, *args) -> None:
+    """Log an error message, args are applied with str.format only if the level is enabled."""
+    if _logger.isEnabledFor(ERROR):
+        _logger.log(ERROR, _BraceMessage(msg, args), stacklevel=2)
+
+
+def debug(msg: str, *args) -> None:
+    """Log a debug message, args are applied with str.format only if the level is enabled."""
+    if _logger.isEnabledFor(DEBUG):
+        _logger.log(DEBUG, _BraceMessage(msg, args), stacklevel=2)
@@ -51,37 +51,42 @@ class Module(metaclass=_AutoRegisterModule):
                 version = "{0:02d}.{1:02d}.{2:02d}.{3:02d}".format(prot._aa, prot._bb, prot._cc, prot._dd)
                 return version
             else:
-                logger.warning("Module: get_version, {0} failed.".format(self.__class__.__name__))
+                logger.warning("Module: get_version, {0} failed.", self.__class__.__name__)
                 return None
         except Exception as e:
-            logger.warning("Module: get_version, {0} exception {1}.".format(self.__class__.__name__, str(e)))
+            logger.warning("Module: get_version, {0} exception {1}.", self.__class__.__name__, str(e))
             return None
 
-    def _send_sync_proto(self, proto, target=None):
-        if not self.client:
-            return False
+    def _send_proto_future(self, proto, target=None):
+        """ Send proto without waiting, see Client.send_msg_future
 
+        :return: AckFuture of the ack msg
+        """
         if target:
             msg = protocol.Msg(self._client.hostbyte, target, proto)
         else:
             msg = protocol.Msg(self._client.hostbyte, self._host, proto)
+        return self._client.send_msg_future(msg)
+
+    def _send_sync_proto(self, proto, target=None):
+        if not self.client:
+            return False
+
         try:
-            resp_msg = self._client.send_sync_msg(msg)
+            resp_msg = self._client.wait_msg_future(self._send_proto_future(proto, target))
             if resp_msg:
                 proto = resp_msg.get_proto()
                 if proto._retcode == 0:
                     return True
                 else:
-                    logger.warning("{0}: send_sync_proto, proto:{1}, retcode:{2} ".format(self.__class__.__name__,
-                                                                                          proto,
-                                                                                          proto._retcode))
+                    logger.warning("{0}: send_sync_proto, proto:{1}, retcode:{2} ", self.__class__.__name__, proto,
+                                   proto._retcode)
                     return False
             else:
-                logger.warning("{0}: send_sync_proto, proto:{1} resp_msg is None.".format(
-                    self.__class__.__name__, proto))
+                logger.warning("{0}: send_sync_proto, proto:{1} resp_msg is None.", self.__class__.__name__, proto)
                 return False
         except Exception as e:
-            logger.warning("{0}: send_sync_proto, proto:{1}, exception:{2}".format(self.__class__.__name__, proto, e))
+            logger.warning("{0}: send_sync_proto, proto:{1}, exception:{2}", self.__class__.__name__, proto, e)
             return False
 
     def _send_async_proto(self, proto, target=None):
@@ -95,5 +100,5 @@ class Module(metaclass=_AutoRegisterModule):
         try:
             return self._client.send_async_msg(msg)
         except Exception as e:
-            logger.error("{0}: _send_async_proto, proto:{1}, exception:{2}".format(self.__class__.__name__, proto, e))
+            logger.error("{0}: _send_async_proto, proto:{1}, exception:{2}", self.__class__.__name__, proto, e)
             return False
@@ -1,5 +1,5 @@
-from abc import abstractmethod
-import binascii
+import itertools
+import operator
 import struct
 from src.robomaster import logger
 from src.robomaster import algo
@@ -34,8 +34,37 @@ def make_proto_cls_key(cmdset, cmdid):
     return cmdset * 256 + cmdid
 
 
+PROTO_KEY_NUM = 256 * 256
+
 # registered protocol dict.
 registered_protos = {}
+# flat view of registered_protos indexed by cmdset * 256 + cmdid, None for unregistered keys.
+_proto_table = [None] * PROTO_KEY_NUM
+
+_ADD_SUB_HEADER_STRUCT = struct.Struct('<BBBBB')
+_UINT64_STRUCT = struct.Struct('<Q')
+_UINT16_STRUCT = struct.Struct('<H')
+
+def _compile_fields(fields):
+    """ compile a field schema into a struct.Struct and an attribute getter
+
+    :param fields: sequence of (attribute name, struct format), name is None for padding
+    :return: (struct.Struct, attribute names, getter returning a tuple of the attribute values)
+    """
+    codec = struct.Struct('<' + ''.join(fmt for _, fmt in fields))
+    names = tuple(name for name, _ in fields if name)
+    if len(names) == 1:
+        single = operator.attrgetter(names[0])
+
+        def getter(obj):
+            return single(obj),
+    elif names:
+        getter = operator.attrgetter(*names)
+    else:
+        def getter(obj):
+            return ()
+    return codec, names, getter
+
 
 class _AutoRegisterProto(type):
     """ help to automatically register Proto Class where ever they're defined """
@@ -50,14 +79,25 @@ class _AutoRegisterProto(type):
         key = make_proto_cls_key(attrs['_cmdset'], attrs['_cmdid'])
         if key in registered_protos.keys():
             raise ValueError("Duplicate proto class %s" % (name))
+        if attrs.get('_req_fields') is not None:
+            cls._req_struct, cls._req_names, getter = _compile_fields(attrs["_req_fields"])
+            cls._req_getter = staticmethod(getter)
+            cls._req_size = cls._req_struct.size
         registered_protos[key] = cls
+        _proto_table[key] = cls
 
 class ProtoData(metaclass=_AutoRegisterProto):
+    __slots__ = ()
     _cmdset = None
     _cmdid = None
     _cmdtype = DUSS_MB_TYPE_REQ
     _req_size = 0
     _resp_size = 0
+    # request payload schema, ((attribute name, struct format), ...), compiled once at class registration.
+    _req_fields = None
+    _req_struct = None
+    _req_names = ()
+    _req_getter = None
 
     def __init__(self, **kwargs):
         self._buf = None
@@ -89,9 +129,35 @@ class ProtoData(metaclass=_AutoRegisterProto):
         else:
             return None
         
-    @abstractmethod
     def pack_req(self):
-        return b''
+        """ 协议对象打包请求数据
+
+        :return：字节流数据
+        """
+        if self._req_struct is None:
+            return b''
+        buf = bytearray(self._req_struct.size)
+        self._req_struct.pack_into(buf, 0, *self._req_getter(self))
+        return buf
+
+    def pack_req_into(self, buf, offset=0):
+        """ 按 _req_fields 将请求数据打包到调用方提供的缓冲区
+
+        :param buf：可写缓冲区
+        :param offset：写入偏移量
+        :return：写入的字节数
+        """
+        self._req_struct.pack_into(buf, offset, *self._req_getter(self))
+        return self._req_struct.size
+
+    def unpack_req_from(self, buf, offset=0):
+        """ 按 _req_fields 从缓冲区解包请求数据到对象属性
+
+        :param buf：字节流数据
+        :param offset：字节流数据偏移量
+        """
+        for name, value in zip(self._req_names, self._req_struct.unpack_from(buf, offset)):
+            setattr(self, name, value)
     
     def unpack_req(self, buf, offset=0):
         """ 从字节流解包
@@ -123,13 +189,120 @@ class ProtoData(metaclass=_AutoRegisterProto):
             return False
     
 
+class FrameTemplate:
+    """ v1 frame of a fixed size request with everything but seq_id, payload and crc16 filled in.
+
+    magic, length, header crc8, sender, receiver, attri, cmdset and cmdid only depend on the key of the template,
+    the crc16 of the bytes before seq_id is kept as well and the crc16 continues from it.
+    """
+    __slots__ = ('_frame', '_len', '_crc_prefix')
+
+    def __init__(self, cmdset, cmdid, payload_len, sender, receiver, attri):
+        self._len = MSG_MIN_LEN + payload_len
+        frame = bytearray(self._len)
+        frame[0] = MSG_MAGIC
+        frame[1] = self._len & 0xff
+        frame[2] = (self._len >> 8) & 0x3 | 4
+        frame[3] = algo.crc8_calc(frame[0:3])
+        frame[4] = sender
+        frame[5] = receiver
+        frame[8] = attri
+        frame[9] = cmdset
+        frame[10] = cmdid
+        self._frame = bytes(frame)
+        self._crc_prefix = algo.crc16_calc(self._frame[0:6])
+
+    @property
+    def length(self):
+        return self._len
+
+    def pack(self, seq_id, proto, out=None):
+        """ Frame of proto with seq_id
+
+        :param seq_id: int
+        :param proto: ProtoData with a compiled _req_fields schema
+        :param out: bytearray of template length to write the frame into and reuse, a new bytearray if None
+        :return: the frame
+        """
+        if out is None:
+            out = bytearray(self._frame)
+        else:
+            out[:] = self._frame
+        out[6] = seq_id & 0xff
+        out[7] = (seq_id >> 8) & 0xff
+        proto._req_struct.pack_into(out, 11, *proto._req_getter(proto))
+        end = self._len - 2
+        _UINT16_STRUCT.pack_into(out, end, algo.crc16_calc(out[6:end], self._crc_prefix))
+        return out
+
+
+# FrameTemplate by (cmdset, cmdid, payload length, sender, receiver, attri)
+_frame_templates = {}
+
+
+def frame_template(proto, sender, receiver, attri):
+    """ :return: cached FrameTemplate of a request of proto, which must have a compiled _req_fields schema """
+    key = (proto._cmdset, proto._cmdid, proto._req_struct.size, sender, receiver, attri)
+    template = _frame_templates.get(key)
+    if template is None:
+        template = _frame_templates[key] = FrameTemplate(*key)
+    return template
+
+
+class SeqIdAllocator:
+    """ Ids cycling through first..last without a lock.
+
+    next() on an itertools.count is a single C call, so concurrent senders never draw the same value, the modulo
+    maps it into the id range.
+    """
+    __slots__ = ('_first', '_span', '_counter')
+
+    def __init__(self, first=RM_SDK_FIRST_SEQ_ID, last=RM_SDK_LAST_SEQ_ID):
+        self._first = first
+        self._span = last - first + 1
+        self._counter = itertools.count()
+
+    def __repr__(self):
+        return "<SeqIdAllocator {0}..{1}>".format(self._first, self._first + self._span - 1)
+
+    @property
+    def span(self):
+        """ number of distinct ids before they repeat """
+        return self._span
+
+    def next(self):
+        return self._first + next(self._counter) % self._span
+
+    __next__ = next
+
+
+# ids of msgs built outside a client, Client.send_msg draws its own.
+_seq_ids = SeqIdAllocator()
+
+
 class MsgBase:
-    _next_seq_id = RM_SDK_FIRST_SEQ_ID
+    __slots__ = ()
+    # receive buffer slot the msg was decoded from, see conn.RecvBufferRing.
+    _slot = None
 
     def __init__(self):
         pass
 
+    def retain(self):
+        """ keep the receive buffer of the msg alive after dispatch finishes """
+        if self._slot is not None:
+            self._slot.retain()
+
+    def release(self):
+        """ give back the receive buffer of the msg """
+        if self._slot is not None:
+            self._slot.release()
+
+
 class Msg(MsgBase):
+    __slots__ = ('_len', '_sender', '_receiver', '_attri', '_cmdset', '_cmdid', '_is_ack', '_need_ack', '_neek_ack',
+                 '_seq_id', '_proto', '_buf', '_slot')
+
     def __init__(self, sender=0, receiver=0, proto=None):
         self._len = 13 # default length, msg header and crc.
         self._sender = sender
@@ -140,11 +313,7 @@ class Msg(MsgBase):
 
         self._is_ack = False  # True or False
         self._need_ack = 2  # 0 for no need, 1 for ack now, 2 for need when finish.
-        if self.__class__._next_seq_id == RM_SDK_LAST_SEQ_ID:
-            self.__class__._next_seq_id = RM_SDK_FIRST_SEQ_ID
-        else:
-            self.__class__._next_seq_id += 1
-        self._seq_id = self._next_seq_id
+        self._seq_id = _seq_ids.next()
         self._proto = proto
         if self._proto:
             self._cmdset = self._proto.cmdset
@@ -152,6 +321,7 @@ class Msg(MsgBase):
             if self._proto._cmdtype == DUSS_MB_TYPE_PUSH:
                 self._need_ack = 0
         self._buf = None
+        self._slot = None
 
     def __repr__(self):
         return "<Msg sender:0x{0:02x}, receiver:0x{1:02x}, cmdset:0x{2:02x}, cmdid:0x{3:02x}, len:{4:d}, \
@@ -182,19 +352,28 @@ seq_id:{5:d}, is_ack:{6:d}, need_ack:{7:d}>".format(self._sender, self._receiver
     
     def pack(self, is_ack=False):
         self._len = 13
+        data_buf = b''
         try:
             if self._proto:
-                data_buf = b''
                 if is_ack:
                     self._neek_ack = False
                     data_buf = self._proto.pack_resp()
                 else:
                     self._neek_ack = (self._proto._cmdtype == DUSS_MB_TYPE_REQ)
+                    if self._proto._req_struct is not None:
+                        # fixed size request, only seq_id, payload and crc16 change between frames.
+                        self._attri = (1 << 7 if self._is_ack else 0) + (self._need_ack << 5)
+                        template = frame_template(self._proto, self._sender, self._receiver, self._attri)
+                        self._buf = template.pack(self._seq_id, self._proto)
+                        self._len = template.length
+                        logger.debug("Msg: pack, len:{0}, seq_id:{1}, buf:{2}", self._len, self._seq_id,
+                                     logger.hexlify(self._buf))
+                        return self._buf
                     data_buf = self._proto.pack_req()
                 self._len += len(data_buf)
         except Exception as e:
             logger.warning("Msg: pack, cmset:0x{0:02x}, cmdid:0x{1:02x}, proto: {2}, "
-                           "exception {3}".format(self.cmdset, self.cmdid, self._proto.__class__.__name__, e))
+                           "exception {3}", self.cmdset, self.cmdid, self._proto.__class__.__name__, e)
 
         self._buf = bytearray(self._len)
         self._buf[0] = 0x55
@@ -220,36 +399,34 @@ seq_id:{5:d}, is_ack:{6:d}, need_ack:{7:d}>".format(self._sender, self._receiver
             raise Exception("Msg: pack Error.")
 
         # calc whole msg crc16
-        crc_m = algo.crc16_calc(self._buf[0:self._len - 2])
-        struct.pack_into('<H', self._buf, self._len - 2, crc_m)
+        seal_frame(self._buf)
 
-        logger.debug("Msg: pack, len:{0}, seq_id:{1}, buf:{2}".format(
-            self._len, self._seq_id, binascii.hexlify(self._buf)))
+        logger.debug("Msg: pack, len:{0}, seq_id:{1}, buf:{2}", self._len, self._seq_id, logger.hexlify(self._buf))
         return self._buf
     
     def unpack_protocol(self):
-        key = make_proto_cls_key(self._cmdset, self._cmdid)
-        if key in registered_protos.keys():
-            self._proto = registered_protos[key]()
+        proto_cls = _proto_table[(self._cmdset << 8) | self._cmdid]
+        if proto_cls is not None:
+            self._proto = proto_cls()
             try:
                 if self._is_ack:
                     if not self._proto.unpack_resp(self._buf):
-                        logger.warning("Msg: unpack_protocol, msg:{0}".format(self))
+                        logger.warning("Msg: unpack_protocol, msg:{0}", self)
                         return False
                 else:
                     if not self._proto.unpack_req(self._buf):
-                        logger.warning("Msg: unpack_protocol, msg:{0}".format(self))
+                        logger.warning("Msg: unpack_protocol, msg:{0}", self)
                         return False
                 return True
             except Exception as e:
-                logger.warning("Msg: unpack_protocol, {0} failed e {1}".format(self._proto.__class__.__name__, e))
+                logger.warning("Msg: unpack_protocol, {0} failed e {1}", self._proto.__class__.__name__, e)
                 raise
         else:
             logger.info("Msg: unpack_protocol, cmdset:0x{0:02x}, cmdid:0x{1:02x}, class is not registerin registered_\
-protos".format(self._cmdset, self._cmdid))
+protos", self._cmdset, self._cmdid)
             pass
-        logger.warning("Msg: unpack_protocol, not registered_protocol, cmdset:0x{0:02x}, cmdid:0x{1:02x}".format(
-            self._cmdset, self._cmdid))
+        logger.warning("Msg: unpack_protocol, not registered_protocol, cmdset:0x{0:02x}, cmdid:0x{1:02x}",
+                       self._cmdset, self._cmdid)
         return False
     
     def get_proto(self):
@@ -262,11 +439,7 @@ class TextMsg(MsgBase):
         self._buf = None
         self._len = 0
         self._need_ack = 0
-        if self.__class__._next_seq_id == RM_SDK_LAST_SEQ_ID:
-            self.__class__._next_seq_id = RM_SDK_FIRST_SEQ_ID
-        else:
-            self.__class__._next_seq_id += 1
-        self._seq_id = self._next_seq_id
+        self._seq_id = _seq_ids.next()
         self._proto = proto
 
     def __repr__(self):
@@ -282,7 +455,7 @@ class TextMsg(MsgBase):
     def unpack_protocol(self):
         self._proto = TextProtoDrone()
         if not self._proto.unpack_resp(self._buf):
-            logger.warining("TextMsg: unpack_protocol, msg:{0}".format(self))
+            logger.warning("TextMsg: unpack_protocol, msg:{0}", self)
             return False
         return True
 
@@ -292,6 +465,149 @@ class TextMsg(MsgBase):
     def get_buf(self):
         return self._buf
 
+MSG_HEADER_LEN = 4
+MSG_MIN_LEN = 13
+MSG_MAGIC = 0x55
+# offset of the payload in a v1 frame, after magic, length, header crc8, sender, receiver, seq_id, attri, cmdset, cmdid
+MSG_PAYLOAD_OFFSET = 11
+
+
+def seal_frame(frame):
+    """ write the trailing crc16 of a complete v1 frame, e.g. after its header was edited in place
+
+    :param frame: bytearray, the whole frame
+    :return: frame
+    """
+    n = len(frame)
+    _UINT16_STRUCT.pack_into(frame, n - 2, algo.crc16_calc(frame[0:n - 2]))
+    return frame
+
+
+def _unpack_frame(buff, offset, msg_len):
+    # a received msg keeps the seq_id of the frame, skip the allocation of Msg.__init__.
+    msg = Msg.__new__(Msg)
+    msg._slot = None
+    msg._proto = None
+    msg._len = msg_len
+    msg._seq_id = buff[offset + 7] * 256 + buff[offset + 6]
+    msg._attri = buff[offset + 8]
+    msg._sender = buff[offset + 4]
+    msg._receiver = buff[offset + 5]
+    msg._cmdset = int(buff[offset + 9])
+    msg._cmdid = int(buff[offset + 10])
+    msg._is_ack = msg._attri & 0x80 != 0
+    msg._need_ack = (msg._attri & 0x60) >> 5
+    msg._buf = buff[offset + MSG_PAYLOAD_OFFSET:offset + msg_len - 2]
+    return msg
+
+
+def _find_magic(buff, start):
+    if isinstance(buff, (bytes, bytearray)):
+        return buff.find(MSG_MAGIC, start)
+    for i in range(start, len(buff)):
+        if buff[i] == MSG_MAGIC:
+            return i
+    return -1
+
+
+class FrameParser:
+    """ Streaming parser of v1 frames.
+
+    Yields every complete frame of the stream, keeps an incomplete tail for the next call and, on a bad magic
+    number, header crc8 or msg crc16, scans forward to the next magic number with a valid header.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._frames = 0
+        self._dropped = 0
+        self._resyncs = 0
+        self._crc_errors = 0
+
+    def __repr__(self):
+        return "<FrameParser frames:{0}, dropped:{1}, resyncs:{2}, crc_errors:{3}, pending:{4}>".format(
+            self._frames, self._dropped, self._resyncs, self._crc_errors, len(self._buf))
+
+    @property
+    def frames(self):
+        """ number of frames decoded """
+        return self._frames
+
+    @property
+    def dropped(self):
+        """ number of bytes discarded while resynchronising """
+        return self._dropped
+
+    @property
+    def resyncs(self):
+        """ number of times the parser lost the frame boundary """
+        return self._resyncs
+
+    @property
+    def crc_errors(self):
+        """ number of frames with a valid header but a bad crc16 """
+        return self._crc_errors
+
+    @property
+    def pending(self):
+        """ number of bytes waiting for the rest of a frame """
+        return len(self._buf)
+
+    def reset(self):
+        del self._buf[:]
+
+    def iter_frames(self, data):
+        """ Decode every complete frame of data, appended to the pending tail of the previous call.
+
+        Without a pending tail the msgs reference data directly, a memoryview input is therefore not copied.
+
+        :param data: bytes-like, received data
+        :return: generator of Msg
+        """
+        if self._buf:
+            self._buf.extend(data)
+            buff = self._buf
+        else:
+            buff = data
+        offset = 0
+        end = len(buff)
+        try:
+            while end - offset >= MSG_HEADER_LEN:
+                if buff[offset] != MSG_MAGIC:
+                    offset = self._resync(buff, offset)
+                    continue
+                msg_len = (buff[offset + 2] & 0x3) * 256 + buff[offset + 1]
+                if msg_len < MSG_MIN_LEN or algo.crc8_calc(buff[offset:offset + 3]) != buff[offset + 3]:
+                    offset = self._resync(buff, offset)
+                    continue
+                if end - offset < msg_len:
+                    break
+                crc_m = buff[offset + msg_len - 2] | (buff[offset + msg_len - 1] << 8)
+                if algo.crc16_calc(buff[offset:offset + msg_len - 2]) != crc_m:
+                    self._crc_errors += 1
+                    logger.warning("FrameParser: crc16 check failed, msg_len:{0}", msg_len)
+                    offset = self._resync(buff, offset)
+                    continue
+                msg = _unpack_frame(buff, offset, msg_len)
+                offset += msg_len
+                self._frames += 1
+                yield msg
+        finally:
+            if buff is self._buf:
+                del self._buf[:offset]
+            elif offset < end:
+                self._buf.extend(buff[offset:])
+
+    def _resync(self, buff, offset):
+        self._resyncs += 1
+        found = _find_magic(buff, offset + 1)
+        if found < 0:
+            found = len(buff)
+        self._dropped += found - offset
+        logger.warning("FrameParser: resync, drop {0} bytes.", found - offset)
+        return found
+
+
 def decode_msg(buff, protocol="v1"):
     if protocol == "v1":
         if len(buff) < 4:
@@ -305,20 +621,10 @@ def decode_msg(buff, protocol="v1"):
             return None, buff
         msg_len = (buff[2] & 0x3) * 256 + buff[1]
         if len(buff) < msg_len:
-            logger.warning("decode_msg, msg data is not enough, msg_len:{0}, buf_len:{1}".format(msg_len, len(buff)))
+            logger.warning("decode_msg, msg data is not enough, msg_len:{0}, buf_len:{1}", msg_len, len(buff))
             return None, buff
         # unpack from byte array
-        msg = Msg(buff[9], buff[10])
-        msg._len = msg_len
-        msg._seq_id = buff[7] * 256 + buff[6]
-        msg._attri = buff[8]
-        msg._sender = buff[4]
-        msg._receiver = buff[5]
-        msg._cmdset = int(buff[9])
-        msg._cmdid = int(buff[10])
-        msg._is_ack = msg._attri & 0x80 != 0
-        msg._need_ack = (msg._attri & 0x60) >> 5
-        msg._buf = buff[11:msg._len - 2]
+        msg = _unpack_frame(buff, 0, msg_len)
         left_buf = buff[msg_len:]
         return msg, left_buf
 
@@ -327,7 +633,7 @@ def decode_msg(buff, protocol="v1"):
         msg = TextMsg()
         # filter out '\0xcc'
         if buff[0] == 204:
-            logger.warning("decode_msg: recv invalid data, buff {0}".format(buff))
+            logger.warning("decode_msg: recv invalid data, buff {0}", buff)
             return None, bytearray()
         else:
             msg._buf = buff.decode(encoding='utf-8')
@@ -338,20 +644,13 @@ class ProtoGetProductVersion(ProtoData):
     _cmdset = 0
     _cmdid = 0x4f
     _resp_size = 9
+    _req_fields = (('_file_type', 'B'), (None, '4x'), ('_version_mask', 'I'))
 
     def __init__(self):
         self._file_type = 4
+        self._version_mask = 0xffffffff
         self._version = None
 
-    def pack_req(self):
-        buf = bytearray(self._resp_size)
-        buf[0] = self._file_type
-        buf[5] = 0xff
-        buf[6] = 0xff
-        buf[7] = 0xff
-        buf[8] = 0xff
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[0]
         if self._retcode == 0:
@@ -360,7 +659,7 @@ class ProtoGetProductVersion(ProtoData):
             return True
         else:
             self._version = None
-            logger.warning("ProtoGetProductVersion, unpack_resp, retcode {0}".format(self._retcode))
+            logger.warning("ProtoGetProductVersion, unpack_resp, retcode {0}", self._retcode)
             return False
 
 class ProtoGetVersion(ProtoData):
@@ -401,20 +700,16 @@ class ProtoGetSn(ProtoData):
     _cmdset = 0x0
     _cmdid = 0x51
     _req_size = 1
+    _req_fields = (('_type', 'B'),)
 
     def __init__(self):
         self._type = 1
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        buf[0] = self._type
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[offset]
         if self._retcode == 0:
             self._length = buf[offset + 1]
-            self._sn = buf[offset + 3:self._length + offset + 3].decode('utf-8', 'ignore')
+            self._sn = str(buf[offset + 3:self._length + offset + 3], 'utf-8', 'ignore')
             return True
         else:
             return False
@@ -423,30 +718,28 @@ class ProtoSubscribeAddNode(ProtoData):
     _cmdset = 0x48
     _cmdid = 0x01
     _req_size = 5
+    _req_fields = (('_node_id', 'B'), ('_sub_vision', 'I'))
 
     def __init__(self):
         self._node_id = 0
         self._sub_vision = 0x03000000
         self._pub_node_id = 0
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        struct.pack_into("<BI", buf, 0, self._node_id, self._sub_vision)
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[0]
         if self._retcode == 0 or self._retcode == 0x50:
             self._pub_node_id = buf[1]
             return True
         else:
-            logger.warning("ProtoSubscribeAddNode: unpack_resp, retcode:{0}".format(self._retcode))
+            logger.warning("ProtoSubscribeAddNode: unpack_resp, retcode:{0}", self._retcode)
             return False
         
 class ProtoSetSdkConnection(ProtoData):
     _cmdset = 0x3f
     _cmdid = 0xd4
     _req_size = 10
+    _req_fields = (('_control', 'B'), ('_host', 'B'), ('_connection', 'B'), ('_protocol', 'B'), ('_ip_bytes', '4s'),
+                   ('_port', 'H'))
 
     def __init__(self):
         self._control = 0
@@ -456,16 +749,13 @@ class ProtoSetSdkConnection(ProtoData):
         self._ip = '0.0.0.0'
         self._port = 10010
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        buf[0] = self._control
-        buf[1] = self._host
-        buf[2] = self._connection
-        buf[3] = self._protocol
-        ip_bytes = bytes(map(int, self._ip.split('.')))
-        buf[4:8] = ip_bytes
-        struct.pack_into("<H", buf, 8, self._port)
-        return buf
+    @property
+    def _ip_bytes(self):
+        return bytes(map(int, self._ip.split('.')))
+
+    @_ip_bytes.setter
+    def _ip_bytes(self, value):
+        self._ip = "{0:d}.{1:d}.{2:d}.{3:d}".format(*value)
 
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[0]
@@ -481,15 +771,11 @@ class ProtoSetRobotMode(ProtoData):
     _cmdset = 0x3f
     _cmdid = 0x46
     _req_size = 1
+    _req_fields = (('_mode', 'B'),)
 
     def __init__(self):
         self._mode = 1
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        buf[0] = self._mode
-        return buf
-
     def unpack_resp(self, buff, offset=0):
         self._retcode = buff[0]
         if self._retcode == 0:
@@ -501,15 +787,11 @@ class ProtoSubNodeReset(ProtoData):
     _cmdset = 0x48
     _cmdid = 0x02
     _req_size = 1
+    _req_fields = (('_node_id', 'B'),)
 
     def __init__(self):
         self._node_id = 0
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        buf[0] = self._node_id
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[0]
         if self._retcode == 0:
@@ -521,13 +803,11 @@ class ProtoSdkHeartBeat(ProtoData):
     _cmdset = 0x3f
     _cmdid = 0xd5
     _req_size = 0
+    _req_fields = ()
 
     def __init__(self):
         pass
 
-    def pack_req(self):
-        return b''
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[0]
         if self._retcode == 0:
@@ -539,15 +819,11 @@ class ProtoSetSdkMode(ProtoData):
     _cmdset = 0x3f
     _cmdid = 0xd1
     _req_size = 1
+    _req_fields = (('_enable', 'B'),)
 
     def __init__(self):
         self._enable = 1
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        buf[0] = self._enable
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[offset]
         if self._retcode == 0:
@@ -582,7 +858,7 @@ class TextProtoData:
 
         :return: 字节流数据。
         """
-        logger.debug("TextProtoData: pack_req test_cmd {0}, type {1}".format(self.text_cmd, type(self.text_cmd)))
+        logger.debug("TextProtoData: pack_req test_cmd {0}, type {1}", self.text_cmd, type(self.text_cmd))
         self._buf = self.text_cmd
         return self._buf
 
@@ -673,15 +949,11 @@ class ProtoChassisSetWorkMode(ProtoData):
     _cmdset = 0x3f
     _cmdid = 0x19
     _req_size = 1
+    _req_fields = (('_mode', 'B'),)
 
     def __init__(self):
         self._mode = 0
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        buf[0] = self._mode
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[0]
         if self._retcode == 0:
@@ -693,21 +965,17 @@ class ProtoChassisStickOverlay(ProtoData):
     _cmdset = 0x3f
     _cmdid = 0x28
     _req_size = 1
+    _req_fields = (('_mode', 'B'),)
 
     def __init__(self):
         self._mode = 0
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        buf[0] = self._mode
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[offset]
         if self._retcode == 0:
             return True
         else:
-            logger.warning("ProtoChassisStickOverlay: unpack_resp, retcode:{0}".format(self._retcode))
+            logger.warning("ProtoChassisStickOverlay: unpack_resp, retcode:{0}", self._retcode)
             return False
         
 
@@ -715,6 +983,7 @@ class ProtoSetWheelSpeed(ProtoData):
     _cmdset = 0x3f
     _cmdid = 0x20
     _req_size = 8
+    _req_fields = (('_w1_spd', 'h'), ('_w2_spd', 'h'), ('_w3_spd', 'h'), ('_w4_spd', 'h'))
 
     def __init__(self):
         self._w1_spd = 0
@@ -722,17 +991,12 @@ class ProtoSetWheelSpeed(ProtoData):
         self._w3_spd = 0
         self._w4_spd = 0
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        struct.pack_into("<hhhh", buf, 0, self._w1_spd, self._w2_spd, self._w3_spd, self._w4_spd)
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[0]
         if self._retcode == 0:
             return True
         else:
-            logger.warning("ProtoSetWheelSpeed: unpack_resp, retcode:{0}".format(self._retcode))
+            logger.warning("ProtoSetWheelSpeed: unpack_resp, retcode:{0}", self._retcode)
             return False
 
 class ProtoChassisSpeedMode(ProtoData):
@@ -740,17 +1004,13 @@ class ProtoChassisSpeedMode(ProtoData):
     _cmdid = 0x21
     _req_size = 12
     _cmdtype = DUSS_MB_TYPE_PUSH
+    _req_fields = (('_x_spd', 'f'), ('_y_spd', 'f'), ('_z_spd', 'f'))
 
     def __init__(self):
         self._x_spd = float(0)
         self._y_spd = float(0)
         self._z_spd = float(0)
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        struct.pack_into("<fff", buf, 0, self._x_spd, self._y_spd, self._z_spd)
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[0]
         if self._retcode == 0:
@@ -763,6 +1023,8 @@ class ProtoChassisPwmPercent(ProtoData):
     _cmdid = 0x3c
     _req_size = 13
     _cmdtype = DUSS_MB_TYPE_REQ
+    _req_fields = (('_mask', 'B'), ('_pwm1', 'H'), ('_pwm2', 'H'), ('_pwm3', 'H'), ('_pwm4', 'H'), ('_pwm5', 'H'),
+                   ('_pwm6', 'H'))
 
     def __init__(self):
         self._mask = 0
@@ -773,12 +1035,6 @@ class ProtoChassisPwmPercent(ProtoData):
         self._pwm5 = 0
         self._pwm6 = 0
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        buf[0] = self._mask
-        struct.pack_into('<HHHHHH', buf, 1, self._pwm1, self._pwm2, self._pwm3, self._pwm4, self._pwm5, self._pwm6)
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[0]
         if self._retcode == 0:
@@ -792,6 +1048,8 @@ class ProtoChassisPwmFreq(ProtoData):
     _cmdid = 0x2b
     _req_size = 13
     _cmdtype = DUSS_MB_TYPE_REQ
+    _req_fields = (('_mask', 'B'), ('_pwm1', 'H'), ('_pwm2', 'H'), ('_pwm3', 'H'), ('_pwm4', 'H'), ('_pwm5', 'H'),
+                   ('_pwm6', 'H'))
 
     def __init__(self):
         self._mask = 0
@@ -802,12 +1060,6 @@ class ProtoChassisPwmFreq(ProtoData):
         self._pwm5 = 0
         self._pwm6 = 0
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        buf[0] = self._mask
-        struct.pack_into('<HHHHHH', buf, 1, self._pwm1, self._pwm2, self._pwm3, self._pwm4, self._pwm5, self._pwm6)
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[0]
         if self._retcode == 0:
@@ -819,6 +1071,8 @@ class ProtoPositionMove(ProtoData):
     _cmdset = 0x3f
     _cmdid = 0x25
     _req_size = 13
+    _req_fields = (('_action_id', 'B'), ('_ctrl_freq', 'B'), ('_ctrl_mode', 'B'), ('_axis_mode', 'B'), ('_pos_x', 'h'),
+                   ('_pos_y', 'h'), ('_pos_z', 'h'), ('_vel_xy_max', 'B'), ('_agl_omg_max', 'h'))
 
     def __init__(self):
         self._action_id = 0
@@ -832,16 +1086,14 @@ class ProtoPositionMove(ProtoData):
         self._vel_xy_max = 0
         self._agl_omg_max = 300
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        buf[0] = self._action_id
-        buf[1] = self._action_ctrl | self._freq << 2
-        buf[2] = self._ctrl_mode
-        buf[3] = self._axis_mode
-        struct.pack_into('<hhh', buf, 4, self._pos_x, self._pos_y, self._pos_z)
-        buf[10] = self._vel_xy_max
-        struct.pack_into('<h', buf, 11, self._agl_omg_max)
-        return buf
+    @property
+    def _ctrl_freq(self):
+        return self._action_ctrl | self._freq << 2
+
+    @_ctrl_freq.setter
+    def _ctrl_freq(self, value):
+        self._action_ctrl = value & 0x3
+        self._freq = value >> 2
 
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[offset]
@@ -849,13 +1101,16 @@ class ProtoPositionMove(ProtoData):
             self._accept = buf[offset + 1]
             return True
         else:
-            logger.warning("ProtoPositionMove: unpack_resp, retcode:{0}".format(self._retcode))
+            logger.warning("ProtoPositionMove: unpack_resp, retcode:{0}", self._retcode)
             return False
 
 
 class ProtoPositionPush(ProtoData):
     _cmdset = 0x3f
     _cmdid = 0x2a
+    _req_fields = (('_action_id', 'B'), ('_percent', 'B'), ('_action_state', 'B'), ('_pos_x', 'h'), ('_pos_y', 'h'),
+                   ('_pos_z', 'h'))
+    __slots__ = ('_action_id', '_percent', '_action_state', '_pos_x', '_pos_y', '_pos_z', '_retcode')
 
     def __init__(self):
         self._action_id = 0
@@ -865,28 +1120,20 @@ class ProtoPositionPush(ProtoData):
         self._pos_y = 0
         self._pos_z = 0
 
-    def pack_req(self):
-        return b''
-
     # ack push.
     def unpack_req(self, buf, offset=0):
-        self._action_id = buf[0]
-        self._percent = buf[1]
-        self._action_state = buf[2]
-        self._pos_x, self._pos_y, self._pos_z = struct.unpack_from('<hhh', buf, 3)
+        self.unpack_req_from(buf, offset)
         return True
 
     def unpack_resp(self, buf, offset=0):
-        self._action_id = buf[offset]
-        self._percent = buf[offset + 1]
-        self._action_state = buf[offset + 2]
-        self._pos_x, self._pos_y, self._pos_z = struct.unpack_from('<hhh', buf, offset + 3)
+        self.unpack_req_from(buf, offset)
         return True
     
 class ProtoPushPeriodMsg(ProtoData):
     _cmdset = 0x48
     _cmdid = 0x8
     _type = DUSS_MB_TYPE_PUSH
+    __slots__ = ('_sub_mode', '_msg_id', '_data_buf', '_retcode')
 
     def __init__(self):
         self._sub_mode = 0
@@ -923,16 +1170,14 @@ class ProtoAddSubMsg(ProtoData):
     def pack_req(self):
         req_size = self._req_size + self._sub_data_num * 8
         buf = bytearray(req_size)
-        buf[0] = self._node_id
-        buf[1] = self._msg_id
-        buf[2] = (self._timestamp & 0x1) | (self._stop_when_disconnect & 0x2)
-        buf[3] = self._sub_mode
-        buf[4] = self._sub_data_num
+        _ADD_SUB_HEADER_STRUCT.pack_into(buf, 0, self._node_id, self._msg_id,
+                                         (self._timestamp & 0x1) | (self._stop_when_disconnect & 0x2),
+                                         self._sub_mode, self._sub_data_num)
         for i in range(0, self._sub_data_num):
-            logger.info("ProtoSubMsg: UID:{0}".format(hex(self._sub_uid_list[i])))
-            struct.pack_into("<Q", buf, 5 + 8 * i, self._sub_uid_list[i])
-        struct.pack_into("<H", buf, 5 + 8 * self._sub_data_num, self._sub_freq)
-        logger.info("ProtoSubMsg: pack_req, num:{0}, buf {1}".format(self._sub_data_num, binascii.hexlify(buf)))
+            logger.info("ProtoSubMsg: UID:{0}", hex(self._sub_uid_list[i]))
+            _UINT64_STRUCT.pack_into(buf, 5 + 8 * i, self._sub_uid_list[i])
+        _UINT16_STRUCT.pack_into(buf, 5 + 8 * self._sub_data_num, self._sub_freq)
+        logger.info("ProtoSubMsg: pack_req, num:{0}, buf {1}", self._sub_data_num, logger.hexlify(buf))
         return buf
 
     def unpack_resp(self, buf, offset=0):
@@ -950,19 +1195,13 @@ class ProtoDelMsg(ProtoData):
     _cmdset = 0x48
     _cmdid = 0x04
     _req_size = 3
+    _req_fields = (('_sub_mode', 'B'), ('_node_id', 'B'), ('_msg_id', 'B'))
 
     def __init__(self):
         self._node_id = 0
         self._msg_id = 0
         self._sub_mode = 0
 
-    def pack_req(self):
-        buf = bytearray(self._req_size)
-        buf[0] = self._sub_mode
-        buf[1] = self._node_id
-        buf[2] = self._msg_id
-        return buf
-
     def unpack_resp(self, buf, offset=0):
         self._retcode = buf[0]
         if self._retcode == 0:
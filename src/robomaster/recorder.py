@@ -0,0 +1,329 @@
+import bisect
+import collections
+import mmap
+import os
+import struct
+import threading
+import time
+
+from src.robomaster import config
+from src.robomaster import logger
+from src.robomaster import protocol
+
+__all__ = ['Recorder', 'RecordReader', 'RecordFrame', 'RECORD_RX', 'RECORD_TX']
+
+# direction of a recorded datagram
+RECORD_RX = 0
+RECORD_TX = 1
+
+# cmdkey of the index entry of a datagram without a v1 frame in it
+RECORD_NO_CMDKEY = 0xffff
+
+_DATA_MAGIC = b'RMREC\x00\x00\x01'
+_INDEX_MAGIC = b'RMIDX\x00\x00\x01'
+# file header: magic, version, time.time() and time.monotonic() when recording started
+_FILE_HEADER_STRUCT = struct.Struct('<8sI4xdd')
+# data record header: monotonic timestamp, direction, length, followed by length raw bytes
+_RECORD_STRUCT = struct.Struct('<dB1xH')
+# index entry: monotonic timestamp, offset of the frame in the data file, frame length, cmdkey, direction, attri
+_INDEX_STRUCT = struct.Struct('<dQHHBB2x')
+
+_RECORD_VERSION = 2
+
+
+class RecordFrame(collections.namedtuple("RecordFrame", ("timestamp direction cmdkey attri data"))):
+    """ one frame of a recording, data is the raw frame, header and crc included, timestamp is time.monotonic(),
+    see RecordReader.wall_time """
+    __slots__ = ()
+
+    @property
+    def is_ack(self):
+        return self.attri & 0x80 != 0
+
+
+def index_path(path):
+    return path + '.idx'
+
+
+class _MappedFile:
+    """ Append-only file mapped into memory, preallocated and grown by doubling. """
+
+    def __init__(self, path, magic, size, wall_start, mono_start):
+        self._path = path
+        self._file = open(path, 'w+b')
+        self._size = max(size, _FILE_HEADER_STRUCT.size)
+        self._file.truncate(self._size)
+        self._mm = mmap.mmap(self._file.fileno(), self._size)
+        _FILE_HEADER_STRUCT.pack_into(self._mm, 0, magic, _RECORD_VERSION, wall_start, mono_start)
+        self._pos = _FILE_HEADER_STRUCT.size
+
+    @property
+    def pos(self):
+        return self._pos
+
+    def reserve(self, nbytes):
+        """ make room for nbytes more, return the offset they go to """
+        if self._pos + nbytes > self._size:
+            size = self._size
+            while self._pos + nbytes > size:
+                size *= 2
+            self._mm.close()
+            self._file.truncate(size)
+            self._mm = mmap.mmap(self._file.fileno(), size)
+            self._size = size
+        offset = self._pos
+        self._pos += nbytes
+        return offset
+
+    @property
+    def mm(self):
+        return self._mm
+
+    def close(self):
+        """ flush and cut the preallocated tail """
+        if self._mm is None:
+            return
+        self._mm.flush()
+        self._mm.close()
+        self._mm = None
+        self._file.truncate(self._pos)
+        self._file.close()
+
+
+class Recorder:
+    """ Record every raw datagram a Client sends and receives into a memory-mapped log file.
+
+    The hot path only timestamps and copies the datagram into a queue, a writer thread appends it to path and
+    indexes every v1 frame in it into path + '.idx', so a RecordReader can seek by time or cmdkey. Timestamps are
+    time.monotonic(), a wall clock step can not break their order, the wall clock is kept once in the file header.
+
+    Example::
+
+        rec = recorder.Recorder("run.rec")
+        robot.client.set_recorder(rec)
+        ...
+        robot.client.set_recorder(None)
+        rec.close()
+    """
+
+    def __init__(self, path, capacity=None, flush_interval=None):
+        """
+        :param path: data file path, the index goes to path + '.idx'
+        :param capacity: bytes preallocated for the data file, the files grow when full
+        :param flush_interval: seconds between two runs of the writer thread
+        """
+        if capacity is None:
+            capacity = config.DEFAULT_RECORDER_CAPACITY
+        if flush_interval is None:
+            flush_interval = config.DEFAULT_RECORDER_FLUSH_INTERVAL
+        self._path = path
+        wall_start, mono_start = time.time(), time.monotonic()
+        self._data = _MappedFile(path, _DATA_MAGIC, capacity, wall_start, mono_start)
+        # roughly one frame per 64 bytes of data.
+        self._index = _MappedFile(index_path(path), _INDEX_MAGIC, capacity // 64 * _INDEX_STRUCT.size, wall_start,
+                                  mono_start)
+        self._queue = collections.deque()
+        self._interval = flush_interval
+        self._stop_event = threading.Event()
+        self._closed = False
+        self._records = 0
+        self._frames = 0
+        self._thread = threading.Thread(target=self._write_task, name="recorder", daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return "<Recorder {0}, records:{1}, frames:{2}, bytes:{3}>".format(self._path, self._records, self._frames,
+                                                                           self._data.pos)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def path(self):
+        return self._path
+
+    def stats(self):
+        """ :return: dict of records and frames written, data bytes and records waiting for the writer """
+        return {'records': self._records, 'frames': self._frames, 'bytes': self._data.pos,
+                'pending': len(self._queue)}
+
+    def record(self, direction, data):
+        """ queue a datagram, called on the send and recv paths """
+        if not self._closed:
+            self._queue.append((time.monotonic(), direction, bytes(data)))
+
+    def record_rx(self, data):
+        self.record(RECORD_RX, data)
+
+    def record_tx(self, data):
+        self.record(RECORD_TX, data)
+
+    def close(self):
+        """ write what is queued, stop the writer thread and cut the files to their used size """
+        if self._closed:
+            return
+        self._closed = True
+        self._stop_event.set()
+        self._thread.join()
+        self._data.close()
+        self._index.close()
+
+    def _write_task(self):
+        while not self._stop_event.wait(self._interval):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        queue = self._queue
+        while queue:
+            timestamp, direction, data = queue.popleft()
+            try:
+                self._write(timestamp, direction, data)
+            except Exception as e:
+                logger.error("Recorder: write, exception {0}", e)
+
+    def _write(self, timestamp, direction, data):
+        nbytes = len(data)
+        offset = self._data.reserve(_RECORD_STRUCT.size + nbytes)
+        mm = self._data.mm
+        start = offset + _RECORD_STRUCT.size
+        # payload first, a reader stops at the first zero header of a file cut short.
+        mm[start:start + nbytes] = data
+        _RECORD_STRUCT.pack_into(mm, offset, timestamp, direction, nbytes)
+        self._records += 1
+
+        pos = 0
+        indexed = False
+        while nbytes - pos >= protocol.MSG_PAYLOAD_OFFSET and data[pos] == protocol.MSG_MAGIC:
+            frame_len = (data[pos + 2] & 0x3) * 256 + data[pos + 1]
+            if frame_len < protocol.MSG_MIN_LEN or pos + frame_len > nbytes:
+                break
+            self._write_index(timestamp, start + pos, frame_len, (data[pos + 9] << 8) | data[pos + 10], direction,
+                              data[pos + 8])
+            indexed = True
+            pos += frame_len
+        if not indexed:
+            self._write_index(timestamp, start, nbytes, RECORD_NO_CMDKEY, direction, 0)
+
+    def _write_index(self, timestamp, offset, length, cmdkey, direction, attri):
+        entry = self._index.reserve(_INDEX_STRUCT.size)
+        _INDEX_STRUCT.pack_into(self._index.mm, entry, timestamp, offset, length, cmdkey, direction, attri)
+        self._frames += 1
+
+
+def _map_readonly(path, magic):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < _FILE_HEADER_STRUCT.size:
+            raise ValueError("RecordReader: {0} is not a recording".format(path))
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    file_magic, version, wall_start, mono_start = _FILE_HEADER_STRUCT.unpack_from(mm, 0)
+    if file_magic != magic or version != _RECORD_VERSION:
+        mm.close()
+        raise ValueError("RecordReader: {0} is not a recording, or of an unsupported version".format(path))
+    return mm, wall_start, mono_start
+
+
+class RecordReader:
+    """ Read a recording made by Recorder.
+
+    Example::
+
+        with recorder.RecordReader("run.rec") as reader:
+            for frame in reader.frames(start=t0, cmdkey=0x4808):
+                ...
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._data, self._wall_start, self._mono_start = _map_readonly(path, _DATA_MAGIC)
+        index, _, _ = _map_readonly(index_path(path), _INDEX_MAGIC)
+        try:
+            entries = []
+            end = len(index) - (len(index) - _FILE_HEADER_STRUCT.size) % _INDEX_STRUCT.size
+            for entry in _INDEX_STRUCT.iter_unpack(index[_FILE_HEADER_STRUCT.size:end]):
+                if entry[0] == 0:
+                    break
+                entries.append(entry)
+        finally:
+            index.close()
+        self._entries = entries
+        self._timestamps = [entry[0] for entry in entries]
+
+    def __repr__(self):
+        return "<RecordReader {0}, frames:{1}>".format(self._path, len(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def time_range(self):
+        """ (first, last) monotonic timestamp, None for an empty recording """
+        if not self._timestamps:
+            return None
+        return self._timestamps[0], self._timestamps[-1]
+
+    @property
+    def started(self):
+        """ time.time() when the recording started """
+        return self._wall_start
+
+    def wall_time(self, timestamp):
+        """ :return: time.time() of a monotonic timestamp of the recording """
+        return self._wall_start + (timestamp - self._mono_start)
+
+    def monotonic_time(self, wall_time):
+        """ :return: monotonic timestamp of a time.time() value, for seek and frames """
+        return self._mono_start + (wall_time - self._wall_start)
+
+    def close(self):
+        self._data.close()
+
+    def seek(self, timestamp):
+        """ :return: position of the first frame recorded at or after the monotonic timestamp """
+        return bisect.bisect_left(self._timestamps, timestamp)
+
+    def records(self):
+        """ every recorded datagram in order
+
+        :return: generator of (timestamp, direction, data)
+        """
+        mm = self._data
+        offset = _FILE_HEADER_STRUCT.size
+        end = len(mm)
+        while end - offset >= _RECORD_STRUCT.size:
+            timestamp, direction, nbytes = _RECORD_STRUCT.unpack_from(mm, offset)
+            if timestamp == 0:
+                break
+            offset += _RECORD_STRUCT.size
+            yield timestamp, direction, mm[offset:offset + nbytes]
+            offset += nbytes
+
+    def frames(self, start=None, end=None, cmdkey=None, direction=None):
+        """ frames in recording order, filtered by the index
+
+        :param start: monotonic timestamp of the first frame, None from the beginning
+        :param end: frames recorded before end, None to the end
+        :param cmdkey: int or collection of ints, cmdset * 256 + cmdid, None for every frame
+        :param direction: RECORD_RX, RECORD_TX or None for both
+        :return: generator of RecordFrame
+        """
+        if isinstance(cmdkey, int):
+            cmdkey = (cmdkey,)
+        i = 0 if start is None else self.seek(start)
+        stop = len(self._entries) if end is None else self.seek(end)
+        mm = self._data
+        for timestamp, offset, length, key, d, attri in self._entries[i:stop]:
+            if cmdkey is not None and key not in cmdkey:
+                continue
+            if direction is not None and d != direction:
+                continue
+            yield RecordFrame(timestamp, d, key, attri, mm[offset:offset + length])
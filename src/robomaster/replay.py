@@ -0,0 +1,253 @@
+import collections
+import queue
+import threading
+import time
+
+from src.robomaster import action
+from src.robomaster import config
+from src.robomaster import conn
+from src.robomaster import logger
+from src.robomaster import protocol
+from src.robomaster import recorder
+
+__all__ = ['ReplayConnection']
+
+
+def _cmdkey(proto_cls):
+    return protocol.make_proto_cls_key(proto_cls._cmdset, proto_cls._cmdid)
+
+
+def _id_remaps():
+    """ ids chosen by the sdk side and echoed back by the robot, request cmdkey -> (payload offset, push cmdkey,
+    payload offset), a recording is only meaningful once they are mapped to the ids of the replay session. """
+    remaps = {_cmdkey(protocol.ProtoAddSubMsg): (1, _cmdkey(protocol.ProtoPushPeriodMsg), 1)}
+    for action_cls in action.registered_actions.values():
+        req_cls, push_cls = action_cls._action_proto_cls, action_cls._push_proto_cls
+        if getattr(req_cls, '_req_names', ())[:1] == ('_action_id',) \
+                and getattr(push_cls, '_req_names', ())[:1] == ('_action_id',):
+            remaps[_cmdkey(req_cls)] = (0, _cmdkey(push_cls), 0)
+    return remaps
+
+
+def _payload_key(frame, id_offset):
+    payload = bytearray(frame[protocol.MSG_PAYLOAD_OFFSET:len(frame) - 2])
+    if id_offset is not None and id_offset < len(payload):
+        payload[id_offset] = 0
+    return bytes(payload)
+
+
+class ReplayConnection(conn.BaseConnection):
+    """ Connection feeding a recording made by recorder.Recorder to a Client.
+
+    The received datagrams of the recording are played back in order, at the recorded pace scaled by speed, or as
+    fast as the client takes them if speed is None, so decode_msg, unpack_protocol, Subscriber and ActionDispatcher
+    run exactly as in the field.
+
+    Requests sent by the client are paired with the recorded request of the same cmdkey and payload, or the oldest
+    one of the cmdkey if none has the same payload, and answered at once with its recorded ack. The subscription
+    msg_id and action id the client picks are mapped onto the recorded ones, so the recorded pushes reach the live
+    subscriptions and actions. Pushes of ids the client never asked for are dropped, subscribe before play().
+
+    Example::
+
+        with recorder.RecordReader("run.rec") as reader:
+            replay_conn = replay.ReplayConnection(reader, speed=10.0)
+            cli = client.Client(9, 6, replay_conn)
+            cli.start()
+            ...  # subscribe
+            replay_conn.play()
+            replay_conn.wait()
+            cli.stop()
+    """
+
+    def __init__(self, reader, speed=1.0, map_ids=True, max_pending=None):
+        """
+        :param reader: recorder.RecordReader, kept open until the replay is done
+        :param speed: float: pace factor, 1.0 for the recorded pace, None as fast as possible
+        :param map_ids: map the recorded subscription msg_ids and action ids to those of the replay session
+        :param max_pending: datagrams played ahead of the client recv task
+        """
+        super().__init__()
+        self._proto = "v1"
+        self._parser = self._make_parser(self._proto)
+        self._speed = speed
+        self._rx = queue.Queue()
+        self._window = threading.Semaphore(max_pending or config.DEFAULT_REPLAY_MAX_PENDING)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._remaps = _id_remaps() if map_ids else {}
+        self._push_offsets = {push_key: push_offset for _, push_key, push_offset in self._remaps.values()}
+        self._id_map = {}
+        self._lock = threading.Lock()
+
+        self._played = 0
+        self._acks_served = 0
+        self._unmatched = 0
+        self._unmapped = 0
+        self._load(reader)
+
+    def __repr__(self):
+        return "<ReplayConnection speed:{0}, {1}>".format(self._speed, self.stats())
+
+    def _load(self, reader):
+        # recorded requests waiting to be paired with a live one, and the recorded acks by (cmdkey, seq_id).
+        self._requests = collections.defaultdict(list)
+        self._acks = collections.defaultdict(collections.deque)
+        # received datagrams without the acks, (timestamp, [frame, ...]).
+        self._timeline = []
+        for frame in reader.frames():
+            if frame.direction == recorder.RECORD_TX:
+                if not frame.is_ack:
+                    self._requests[frame.cmdkey].append(frame.data)
+            elif frame.is_ack:
+                self._acks[(frame.cmdkey, frame.data[6] | (frame.data[7] << 8))].append(frame.data)
+            elif self._timeline and self._timeline[-1][0] == frame.timestamp:
+                self._timeline[-1][1].append(frame.data)
+            else:
+                self._timeline.append((frame.timestamp, [frame.data]))
+
+    @property
+    def target_addr(self):
+        return None
+
+    @property
+    def speed(self):
+        return self._speed
+
+    def stats(self):
+        """ :return: dict of datagrams played, acks served, requests without a recorded counterpart and pushes
+        dropped for an unmapped id """
+        return {'played': self._played, 'total': len(self._timeline), 'acks_served': self._acks_served,
+                'unmatched': self._unmatched, 'unmapped': self._unmapped}
+
+    def create(self):
+        pass
+
+    def close(self):
+        self._stop_event.set()
+        self._window.release()
+
+    def play(self):
+        """ start playing the received datagrams in a background thread """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._play_task, name="replay", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """ :return: bool: True once every datagram was handed to the client """
+        if self._thread is None:
+            return False
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _play_task(self):
+        if not self._timeline:
+            return
+        first = self._timeline[0][0]
+        start = time.monotonic()
+        for timestamp, frames in self._timeline:
+            if self._speed:
+                delay = start + (timestamp - first) / self._speed - time.monotonic()
+                if delay > 0 and self._stop_event.wait(delay):
+                    break
+            data = b''.join(self._map_push(frame) for frame in frames)
+            if not data:
+                continue
+            self._window.acquire()
+            if self._stop_event.is_set():
+                break
+            self._rx.put((data, True))
+            self._played += 1
+        logger.info("ReplayConnection: play done, {0}", self.stats())
+
+    def _map_push(self, frame):
+        if len(frame) < protocol.MSG_MIN_LEN:
+            return frame
+        key = (frame[9] << 8) | frame[10]
+        offset = self._push_offsets.get(key)
+        if offset is None:
+            return frame
+        pos = protocol.MSG_PAYLOAD_OFFSET + offset
+        live_id = self._id_map.get((key, frame[pos]))
+        if live_id is None:
+            self._unmapped += 1
+            return b''
+        if live_id == frame[pos]:
+            return frame
+        frame = bytearray(frame)
+        frame[pos] = live_id
+        return protocol.seal_frame(frame)
+
+    def _pair_request(self, frame, cmdkey, id_offset):
+        recorded = self._requests.get(cmdkey)
+        if not recorded:
+            return None
+        key = _payload_key(frame, id_offset)
+        for i, candidate in enumerate(recorded):
+            if _payload_key(candidate, id_offset) == key:
+                return recorded.pop(i)
+        # an id is only mapped to a request with the same payload, any recorded ack will do otherwise.
+        if id_offset is not None:
+            return None
+        return recorded.pop(0)
+
+    def send(self, buf):
+        """ pair a request of the client with the recording, answer it with the recorded ack """
+        if len(buf) < protocol.MSG_MIN_LEN or buf[0] != protocol.MSG_MAGIC or buf[8] & 0x80:
+            return
+        cmdkey = (buf[9] << 8) | buf[10]
+        remap = self._remaps.get(cmdkey)
+        need_ack = (buf[8] >> 5) & 0x3
+        if remap is None and not need_ack:
+            return
+        with self._lock:
+            recorded = self._pair_request(buf, cmdkey, remap[0] if remap else None)
+        if recorded is None:
+            self._unmatched += 1
+            logger.debug("ReplayConnection: send, no recorded request cmdkey:0x{0:04x}", cmdkey)
+            return
+        if remap is not None:
+            id_offset, push_key, _ = remap
+            pos = protocol.MSG_PAYLOAD_OFFSET + id_offset
+            self._id_map[(push_key, recorded[pos])] = buf[pos]
+        if not need_ack:
+            return
+        acks = self._acks.get((cmdkey, recorded[6] | (recorded[7] << 8)))
+        if not acks:
+            logger.debug("ReplayConnection: send, no recorded ack cmdkey:0x{0:04x}", cmdkey)
+            return
+        ack = bytearray(acks.popleft())
+        ack[4], ack[5] = buf[5], buf[4]
+        ack[6], ack[7] = buf[6], buf[7]
+        self._rx.put((bytes(protocol.seal_frame(ack)), False))
+        self._acks_served += 1
+
+    def send_self(self, buf):
+        self._rx.put((bytes(buf), False))
+
+    def recv_batch(self, max_num=conn.RECV_BATCH_MAX_NUM):
+        if self._pending:
+            msgs = list(self._pending)
+            self._pending.clear()
+        else:
+            msgs = self._recv_msgs()
+        for i in range(1, max_num):
+            try:
+                msgs.extend(self._recv_msgs(1))
+            except BlockingIOError:
+                break
+        return msgs
+
+    def _recv_msgs(self, flags=0):
+        """ take one datagram, block unless flags is set """
+        try:
+            data, played = self._rx.get_nowait() if flags else self._rx.get()
+        except queue.Empty:
+            raise BlockingIOError
+        if played:
+            self._window.release()
+        if self._recorder is not None:
+            self._recorder.record_rx(data)
+        return self._decode(data, None)
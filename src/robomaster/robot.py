@@ -1,5 +1,3 @@
-import threading
-
 from src.robomaster import dds
 from src.robomaster import action
 from src.robomaster import logger
@@ -7,6 +5,7 @@ from src.robomaster import protocol
 from src.robomaster import config
 from src.robomaster import conn
 from src.robomaster import client
+from src.robomaster import scheduler
 
 from src.robomaster import chassis
 
@@ -50,8 +49,9 @@ class Robot(RobotBase):
                 del self._modules[name]
 
     def _start_heart_beat_timer(self):
-        if self._running:
+        if self._running and not self._send_heart_beat_timer:
             self._send_heart_beat_msg()
+            self._send_heart_beat_timer = scheduler.default_scheduler().call_every(1, self._send_heart_beat_msg)
 
     def _stop_heart_beat_timer(self):
         if self._send_heart_beat_timer:
@@ -64,10 +64,7 @@ class Robot(RobotBase):
         try:
             self.client.send_msg(msg)
         except Exception as e:
-            logger.warning("Robot: send heart beat msg failed, exception {0}".format(e))
-        if self._running:
-            self._send_heart_beat_timer = threading.Timer(1, self._send_heart_beat_msg)
-            self._send_heart_beat_timer.start()
+            logger.warning("Robot: send heart beat msg failed, exception {0}", e)
 
     @property
     def conf(self):
@@ -116,14 +113,14 @@ class Robot(RobotBase):
             conn1 = self._wait_for_connection(conn_type, proto_type, sn)
 
             if conn1:
-                logger.info("Robot: initialized with {0}".format(conn1))
+                logger.info("Robot: initialized with {0}", conn1)
                 self._client = client.Client(9, 6, conn1)
             else:
                 logger.info("Robot: initialized, try to use default Client.")
                 try:
                     self._client = client.Client(9, 6)
                 except Exception as e:
-                    logger.error("Robot: initialized, can not create client, return, exception {0}".format(e))
+                    logger.error("Robot: initialized, can not create client, return, exception {0}", e)
                     return False
                 
         try:
@@ -168,9 +165,9 @@ class Robot(RobotBase):
         result, local_addr, remote_addr = self._sdk_conn.request_connection(self._sdk_host, conn_type, proto_type, sn)
         if not result:
             logger.error("Robot: Connection Failed, Please Check Hareware Connections!!! "
-                         "conn_type {0}, host {1}, target {2}.".format(conn_type, local_addr, remote_addr))
+                         "conn_type {0}, host {1}, target {2}.", conn_type, local_addr, remote_addr)
             return None
-        return conn.Connection(local_addr, remote_addr, protocol=proto_type)
+        return conn.Connection(local_addr, remote_addr, protocol=proto_type, zero_copy=config.DEFAULT_RECV_ZERO_COPY)
     
     def reset(self):
         self._sub_node_reset()
@@ -189,7 +186,7 @@ class Robot(RobotBase):
                 return True
             return False
         except Exception as e:
-            logger.warning("Robot: set_robot_mode, send_sync_msg exception {0}".format(str(e)))
+            logger.warning("Robot: set_robot_mode, send_sync_msg exception {0}", str(e))
             return False
         
     def set_robot_mode(self, mode=GIMBAL_LEAD):
@@ -203,7 +200,7 @@ class Robot(RobotBase):
             proto._mode = 2
             self.reset_robot_mode()
         else:
-            logger.warning("Robot: set_robot_mode, unsupported mode = {0}".format(mode))
+            logger.warning("Robot: set_robot_mode, unsupported mode = {0}", mode)
         msg = protocol.Msg(self._client.hostbyte, protocol.host2byte(9, 0), proto)
 
         try:
@@ -212,7 +209,7 @@ class Robot(RobotBase):
                 return True
             return False
         except Exception as e:
-            logger.warning("Robot: set_robot_mode, send_sync_msg exception {0}".format(str(e)))
+            logger.warning("Robot: set_robot_mode, send_sync_msg exception {0}", str(e))
             return False
 
     def get_robot_mode(self):
@@ -232,12 +229,12 @@ class Robot(RobotBase):
                 elif proto._mode == 2:
                     mode = CHASSIS_LEAD
                 else:
-                    logger.info("Robot: get_robot_mode, unsupported mode:{0}".format(proto._mode))
+                    logger.info("Robot: get_robot_mode, unsupported mode:{0}", proto._mode)
                 return mode
             else:
                 raise Exception('get_robot_mode failed, resp is None.')
         except Exception as e:
-            logger.warning("Robot: get_robot_mode, send_sync_msg e {0}".format(e))
+            logger.warning("Robot: get_robot_mode, send_sync_msg e {0}", e)
             return None
         
     def _enable_sdk(self, enable=1):
@@ -255,7 +252,7 @@ class Robot(RobotBase):
                 logger.warning("Robot: enable_sdk error.")
                 return False
         except Exception as e:
-            logger.warning("Robot: enable_sdk, send_sync_msg exception {0}".format(str(e)))
+            logger.warning("Robot: enable_sdk, send_sync_msg exception {0}", str(e))
             return False
         
     def get_version(self):
@@ -270,7 +267,7 @@ class Robot(RobotBase):
                 logger.warning("Robot: get_version failed.")
                 return None
         except Exception as e:
-            logger.warning("Robot: get_version, send_sync_msg exception {0}".format(str(e)))
+            logger.warning("Robot: get_version, send_sync_msg exception {0}", str(e))
             return None
         
     def get_sn(self):
@@ -288,7 +285,7 @@ class Robot(RobotBase):
                 logger.warning("Robot: get_sn failed.")
                 return None
         except Exception as e:
-            logger.warning("Robot: get_sn, send_sync_msg exception {0}".format(str(e)))
+            logger.warning("Robot: get_sn, send_sync_msg exception {0}", str(e))
             return None
         
     def _sub_add_node(self):
@@ -302,7 +299,7 @@ class Robot(RobotBase):
             else:
                 logger.warning("Robot: enable_dds err.")
         except Exception as e:
-            logger.warning("Robot: enable_dds, send_sync_msg exception {0}".format(str(e)))
+            logger.warning("Robot: enable_dds, send_sync_msg exception {0}", str(e))
             return False
         
     def _sub_node_reset(self):
@@ -317,7 +314,7 @@ class Robot(RobotBase):
                 logger.warning("Robot: reset dds node fail!")
                 return False
         except Exception as e:
-            logger.warning("Robot: reset_dds, send_sync_msg exception {0}".format(str(e)))
+            logger.warning("Robot: reset_dds, send_sync_msg exception {0}", str(e))
             return False
         
     # def play_audio(self, filename):
@@ -0,0 +1,158 @@
+import heapq
+import itertools
+import threading
+import time
+
+from src.robomaster import logger
+
+__all__ = ['Scheduler', 'ScheduledCall', 'default_scheduler']
+
+
+class ScheduledCall:
+    """ Handle of a call registered with Scheduler.call_later or Scheduler.call_every """
+    __slots__ = ('_scheduler', '_fn', '_args', '_interval', '_deadline', '_token', '_cancelled')
+
+    def __init__(self, scheduler, fn, args, interval):
+        self._scheduler = scheduler
+        self._fn = fn
+        self._args = args
+        self._interval = interval
+        self._deadline = None
+        self._token = None
+        self._cancelled = False
+
+    def __repr__(self):
+        return "<ScheduledCall {0}, deadline:{1}, interval:{2}, cancelled:{3}>".format(
+            getattr(self._fn, '__qualname__', self._fn), self._deadline, self._interval, self._cancelled)
+
+    @property
+    def deadline(self):
+        """ time.monotonic() of the next call, None once a one-shot call ran or was cancelled """
+        return self._deadline
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        self._scheduler._cancel(self)
+
+    def reschedule(self, delay):
+        """ move the next call to delay seconds from now, also re-arms a call that already ran """
+        self._scheduler._arm(self, time.monotonic() + delay)
+
+
+class Scheduler:
+    """ Deadlines of many timers served by one thread.
+
+    Every arm pushes (deadline, n, call) on a heap, a call rescheduled or cancelled leaves its old entry behind and
+    the entry is skipped when it surfaces because n is no longer the call's token, so re-arming is O(log n) and no
+    thread is created per timer. Callbacks run on the scheduler thread and must not block, send with
+    Client.send_async_msg rather than send_sync_msg.
+    """
+
+    def __init__(self, name="robomaster-scheduler"):
+        self._name = name
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition(threading.Lock())
+        self._thread = None
+        self._running = False
+
+    def __repr__(self):
+        return "<Scheduler {0}, entries:{1}>".format(self._name, len(self._heap))
+
+    def call_later(self, delay, fn, *args):
+        """ call fn(*args) once in delay seconds
+
+        :return: ScheduledCall
+        """
+        call = ScheduledCall(self, fn, args, None)
+        self._arm(call, time.monotonic() + delay)
+        return call
+
+    def call_every(self, interval, fn, *args):
+        """ call fn(*args) every interval seconds, the first call in interval seconds
+
+        :return: ScheduledCall
+        """
+        call = ScheduledCall(self, fn, args, interval)
+        self._arm(call, time.monotonic() + interval)
+        return call
+
+    def _arm(self, call, deadline):
+        with self._cond:
+            call._deadline = deadline
+            call._token = next(self._counter)
+            call._cancelled = False
+            heapq.heappush(self._heap, (deadline, call._token, call))
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+            elif self._heap[0][2] is call:
+                self._cond.notify()
+
+    def _cancel(self, call):
+        with self._cond:
+            call._deadline = None
+            call._token = None
+            call._cancelled = True
+
+    def stop(self):
+        """ stop the thread, pending calls are dropped """
+        with self._cond:
+            self._running = False
+            self._heap.clear()
+            thread, self._thread = self._thread, None
+            self._cond.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self):
+        heap = self._heap
+        while True:
+            with self._cond:
+                while self._running:
+                    # drop entries of calls cancelled or rescheduled since they were pushed.
+                    while heap and heap[0][1] != heap[0][2]._token:
+                        heapq.heappop(heap)
+                    if not heap:
+                        self._cond.wait()
+                        continue
+                    delay = heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                if not self._running:
+                    return
+                deadline, _, call = heapq.heappop(heap)
+                if call._interval is not None:
+                    # keep the period, skip the ticks missed by a late wake up.
+                    deadline += call._interval
+                    now = time.monotonic()
+                    if deadline <= now:
+                        deadline = now + call._interval
+                    call._deadline = deadline
+                    call._token = next(self._counter)
+                    heapq.heappush(heap, (deadline, call._token, call))
+                else:
+                    call._deadline = None
+                    call._token = None
+            try:
+                call._fn(*call._args)
+            except Exception as e:
+                logger.warning("Scheduler: {0} raised {1}", call, e)
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    """ :return: the Scheduler shared by the chassis auto stop and the robot heart beat """
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler()
+        return _default_scheduler
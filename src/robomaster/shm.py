@@ -0,0 +1,265 @@
+import struct
+import sys
+
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from src.robomaster import config
+from src.robomaster import telemetry
+
+__all__ = ['ShmRingWriter', 'ShmRingReader', 'shm_name']
+
+_MAGIC = b'RMSHM\x00\x00\x01'
+_VERSION = 1
+# magic, version, capacity, slot size, field number, offset of the first slot, struct format of a value
+_HEADER_STRUCT = struct.Struct('<8sIIIII4s')
+# samples published so far, written after the slot of the newest sample is complete
+_COUNT_STRUCT = struct.Struct('<Q')
+_COUNT_OFFSET = _HEADER_STRUCT.size
+_NAMES_OFFSET = _COUNT_OFFSET + _COUNT_STRUCT.size
+_NAME_SIZE = 32
+# slot: seqlock sequence, timestamp, values
+_SLOT_HEAD_STRUCT = struct.Struct('<Q')
+_SLOT_ALIGN = 8
+
+# numpy dtype of Subject.field_dtype to struct format
+_DTYPE_FORMATS = {'f8': 'd', 'f4': 'f', 'i8': 'q', 'i4': 'i', 'u1': 'B', '?': '?'}
+_FORMAT_DTYPES = {'d': '<f8', 'f': '<f4', 'q': '<i8', 'i': '<i4', 'B': 'u1', '?': '?'}
+
+# names of the rings written by this process, their registration with the resource tracker is the writer's.
+_writer_names = set()
+
+
+def shm_name(subject_name, scope=None):
+    """ default shared memory name of a subject
+
+    :param scope: tells apart the rings of several robots, see telemetry.Telemetry.shm_scope
+    """
+    if scope:
+        return "{0}{1}_{2}".format(config.DEFAULT_SHM_PREFIX, scope, subject_name)
+    return config.DEFAULT_SHM_PREFIX + subject_name
+
+
+def _slot_struct(fmt, nfields):
+    body = struct.Struct('<d' + fmt * nfields)
+    size = _SLOT_HEAD_STRUCT.size + body.size
+    return body, (size + _SLOT_ALIGN - 1) // _SLOT_ALIGN * _SLOT_ALIGN
+
+
+class ShmRingWriter:
+    """ Samples of one subject in a multiprocessing.shared_memory ring, for readers in other processes.
+
+    Every slot is guarded by a seqlock: the writer makes its sequence odd, writes timestamp and values, then sets it
+    to 2 * n for the n-th sample and updates the sample count. A reader copies a slot and keeps it only if the
+    sequence read before and after the copy is the expected even value, so no lock is shared between processes and
+    a slow reader never blocks the writer, it loses the samples overwritten meanwhile.
+    """
+
+    def __init__(self, name, fields, capacity=None, dtype='f8'):
+        """
+        :param name: shared memory name, readers attach by it
+        :param fields: value names of a sample
+        :param capacity: number of slots
+        :param dtype: value type, one of 'f8', 'f4', 'i8', 'i4', 'u1', '?'
+        """
+        if capacity is None:
+            capacity = config.DEFAULT_SHM_CAPACITY
+        if capacity <= 0:
+            raise ValueError("ShmRingWriter: capacity must be positive, got {0}".format(capacity))
+        fmt = _DTYPE_FORMATS.get(dtype)
+        if fmt is None:
+            raise ValueError("ShmRingWriter: unsupported dtype {0}, expect one of {1}".format(
+                dtype, tuple(_DTYPE_FORMATS)))
+        self._fields = tuple(fields)
+        self._body, self._slot_size = _slot_struct(fmt, len(self._fields))
+        self._capacity = capacity
+        self._first = _NAMES_OFFSET + _NAME_SIZE * len(self._fields)
+        self._first = (self._first + _SLOT_ALIGN - 1) // _SLOT_ALIGN * _SLOT_ALIGN
+        self._shm = shared_memory.SharedMemory(name, create=True, size=self._first + capacity * self._slot_size)
+        buf = self._shm.buf
+        for i, field in enumerate(self._fields):
+            struct.pack_into('<{0}s'.format(_NAME_SIZE), buf, _NAMES_OFFSET + _NAME_SIZE * i, field.encode())
+        _COUNT_STRUCT.pack_into(buf, _COUNT_OFFSET, 0)
+        _HEADER_STRUCT.pack_into(buf, 0, _MAGIC, _VERSION, capacity, self._slot_size, len(self._fields),
+                                 self._first, fmt.encode())
+        self._count = 0
+        _writer_names.add(self._shm._name)
+
+    def __repr__(self):
+        return "<ShmRingWriter {0}, fields:{1}, {2} samples>".format(self.name, self._fields, self._count)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def fields(self):
+        return self._fields
+
+    @property
+    def count(self):
+        return self._count
+
+    def publish(self, timestamp, values):
+        n = self._count + 1
+        buf = self._shm.buf
+        offset = self._first + (n - 1) % self._capacity * self._slot_size
+        _SLOT_HEAD_STRUCT.pack_into(buf, offset, 2 * n - 1)
+        self._body.pack_into(buf, offset + _SLOT_HEAD_STRUCT.size, timestamp, *values)
+        _SLOT_HEAD_STRUCT.pack_into(buf, offset, 2 * n)
+        _COUNT_STRUCT.pack_into(buf, _COUNT_OFFSET, n)
+        self._count = n
+
+    def close(self, unlink=True):
+        """ detach, and remove the shared memory unless unlink is False, attached readers keep their mapping """
+        if self._shm is None:
+            return
+        self._shm.close()
+        if unlink:
+            if sys.version_info < (3, 13):
+                # a reader sharing the resource tracker of this process, e.g. started by spawn, unregistered the
+                # name when it attached, register it again so that unlink unregisters a known name.
+                resource_tracker.register(self._shm._name, "shared_memory")
+            self._shm.unlink()
+        _writer_names.discard(self._shm._name)
+        self._shm = None
+
+
+def _attach(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    shm = shared_memory.SharedMemory(name)
+    # before 3.13 attaching registers the memory with the resource tracker, which unlinks it when this process
+    # exits. Unregister it, unless this process, or the parent it was forked from, is the writer.
+    if shm._name not in _writer_names:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class ShmRingReader:
+    """ Attach to the ring of a ShmRingWriter, from any process of the same host.
+
+    Example::
+
+        # name: ep_robot.dds.telemetry.shared(dds.DDS_ATTITUDE).name in the robot process
+        reader = shm.ShmRingReader(name)
+        cursor = reader.count
+        while True:
+            samples, cursor = reader.read(cursor)
+            ...
+    """
+
+    def __init__(self, name):
+        self._shm = _attach(name)
+        buf = self._shm.buf
+        magic, version, capacity, slot_size, nfields, first, fmt = _HEADER_STRUCT.unpack_from(buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._shm.close()
+            raise ValueError("ShmRingReader: {0} is not a telemetry ring, or of an unsupported version".format(name))
+        self._capacity = capacity
+        self._slot_size = slot_size
+        self._first = first
+        self._fmt = fmt.rstrip(b'\x00').decode()
+        self._body, _ = _slot_struct(self._fmt, nfields)
+        self._fields = tuple(bytes(buf[_NAMES_OFFSET + _NAME_SIZE * i:_NAMES_OFFSET + _NAME_SIZE * (i + 1)])
+                             .rstrip(b'\x00').decode() for i in range(nfields))
+        self._lost = 0
+
+    def __repr__(self):
+        return "<ShmRingReader {0}, fields:{1}, {2} samples>".format(self.name, self._fields, self.count)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def fields(self):
+        return self._fields
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def count(self):
+        """ number of samples published so far """
+        return _COUNT_STRUCT.unpack_from(self._shm.buf, _COUNT_OFFSET)[0]
+
+    @property
+    def lost(self):
+        """ samples overwritten before read() got to them """
+        return self._lost
+
+    def slots(self):
+        """ Zero-copy numpy view of the slots of the ring, requires numpy
+
+        Row (n - 1) % capacity holds the n-th sample while its seq is 2 * n. The view is not synchronised with the
+        writer, a row can change while it is used: copy the rows and check their seq afterwards, as read() and
+        latest() do. The view keeps the memory exported, drop it before close().
+
+        :return: numpy structured array of capacity rows, fields seq, timestamp and the value names
+        """
+        if np is None:
+            raise ImportError("ShmRingReader: slots requires numpy.")
+        value = np.dtype(_FORMAT_DTYPES[self._fmt])
+        head = _SLOT_HEAD_STRUCT.size
+        dtype = np.dtype({'names': ('seq', 'timestamp') + self._fields,
+                          'formats': ['<u8', '<f8'] + [value] * len(self._fields),
+                          'offsets': [0, head] + [head + 8 + value.itemsize * i for i in range(len(self._fields))],
+                          'itemsize': self._slot_size})
+        return np.ndarray((self._capacity,), dtype, buffer=self._shm.buf, offset=self._first)
+
+    def _read_slot(self, n):
+        """ the n-th sample, None if it was overwritten """
+        buf = self._shm.buf
+        offset = self._first + (n - 1) % self._capacity * self._slot_size
+        expect = 2 * n
+        if _SLOT_HEAD_STRUCT.unpack_from(buf, offset)[0] != expect:
+            return None
+        row = self._body.unpack_from(buf, offset + _SLOT_HEAD_STRUCT.size)
+        if _SLOT_HEAD_STRUCT.unpack_from(buf, offset)[0] != expect:
+            return None
+        return telemetry.TelemetrySample(row[0], row[1:])
+
+    def latest(self, default=None):
+        """ :return: newest TelemetrySample, default if nothing was published yet """
+        while True:
+            n = self.count
+            if n == 0:
+                return default
+            sample = self._read_slot(n)
+            if sample is not None:
+                return sample
+
+    def read(self, cursor=0):
+        """ samples published after cursor
+
+        :param cursor: count of the last read() call, 0 for everything still in the ring
+        :return: (list of TelemetrySample oldest first, new cursor)
+        """
+        n = self.count
+        start = max(cursor, n - self._capacity) + 1
+        if start > cursor + 1:
+            self._lost += start - cursor - 1
+        samples = []
+        for i in range(start, n + 1):
+            sample = self._read_slot(i)
+            if sample is None:
+                self._lost += 1
+                continue
+            samples.append(sample)
+        return samples, n
+
+    def close(self):
+        self._shm.close()
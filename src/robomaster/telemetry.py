@@ -0,0 +1,216 @@
+import collections
+import itertools
+import os
+import time
+
+from src.robomaster import logger
+from src.robomaster import shm
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = ['TelemetrySample', 'Telemetry', 'RingBuffer']
+
+# numbers the Telemetry instances of this process, part of their default shared memory names.
+_instance_ids = itertools.count()
+
+DEFAULT_HISTORY_CAPACITY = 4096
+
+
+class TelemetrySample(collections.namedtuple("TelemetrySample", ("timestamp values"))):
+    """ immutable snapshot of one subject, timestamp is time.monotonic() at dispatch """
+    __slots__ = ()
+
+
+class RingBuffer:
+    """ Fixed capacity time series of one subject, backed by a numpy structured array.
+
+    Every sample is written twice, at slot i and i + capacity, so the newest n samples are always one contiguous
+    slice and last()/since() return views without copying. A view is overwritten once capacity more samples have
+    arrived, copy() it to keep it longer.
+    """
+
+    def __init__(self, fields, capacity=DEFAULT_HISTORY_CAPACITY, dtype='f8'):
+        """
+        :param fields: names of the values of a sample, in data_info order
+        :param capacity: number of samples kept
+        :param dtype: numpy dtype of the values, timestamp is always float64
+        """
+        if np is None:
+            raise ImportError("RingBuffer requires numpy.")
+        if capacity <= 0:
+            raise ValueError("RingBuffer: capacity must be positive, got {0}".format(capacity))
+        self._dtype = np.dtype([('timestamp', 'f8')] + [(name, dtype) for name in fields])
+        self._capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=self._dtype)
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return "<RingBuffer fields:{0}, {1}/{2}>".format(self._dtype.names[1:], self._count, self._capacity)
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    def append(self, timestamp, values):
+        row = (timestamp,) + tuple(values)
+        head = self._head
+        self._data[head] = row
+        self._data[head + self._capacity] = row
+        self._head = head + 1 if head + 1 < self._capacity else 0
+        if self._count < self._capacity:
+            self._count += 1
+
+    def last(self, n=None):
+        """ view of the newest n samples (all if None), oldest first """
+        if n is None or n > self._count:
+            n = self._count
+        end = self._head + self._capacity
+        return self._data[end - n:end]
+
+    def since(self, timestamp):
+        """ view of the samples whose timestamp is >= timestamp, oldest first """
+        window = self.last()
+        return window[np.searchsorted(window['timestamp'], timestamp, side='left'):]
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+
+
+class Telemetry:
+    """ Latest value of every subscribed subject.
+
+    The dds dispatch task publishes a new TelemetrySample per push by replacing the dict entry, readers get the
+    reference to an immutable sample, so no lock is taken on either side.
+    """
+
+    def __init__(self, shm_scope=None):
+        """
+        :param shm_scope: part of the default shared memory names, pid and instance number of this process if None
+        """
+        self._latest = {}
+        self._fields = {}
+        self._history_capacity = {}
+        self._history = {}
+        self._shm_scope = shm_scope or "{0}_{1}".format(os.getpid(), next(_instance_ids))
+        self._shared_conf = {}
+        self._shared = {}
+
+    def __repr__(self):
+        return "<Telemetry {0}>".format(sorted(self._latest))
+
+    def register(self, name, fields, dtype='f8'):
+        """ declare the value fields of a subject, called by the subscriber when the subject is added """
+        self._fields[name] = (tuple(fields), dtype)
+        self._make_history(name)
+        self._make_shared(name)
+
+    def publish(self, name, values, timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self._latest[name] = TelemetrySample(timestamp, values)
+        history = self._history.get(name)
+        if history is not None:
+            history.append(timestamp, values)
+        shared = self._shared.get(name)
+        if shared is not None:
+            shared.publish(timestamp, values)
+
+    def enable_history(self, name, capacity=DEFAULT_HISTORY_CAPACITY):
+        """ Keep the last capacity samples of a subject in a RingBuffer, requires numpy
+
+        Can be called before or after the subject is subscribed, e.g. telemetry.enable_history(dds.DDS_IMU, 10000)
+        """
+        if np is None:
+            raise ImportError("Telemetry: enable_history requires numpy.")
+        self._history_capacity[name] = capacity
+        self._history.pop(name, None)
+        self._make_history(name)
+
+    def disable_history(self, name):
+        self._history_capacity.pop(name, None)
+        self._history.pop(name, None)
+
+    def history(self, name):
+        """ :return: RingBuffer of name, None if history is not enabled or the subject is not subscribed yet """
+        return self._history.get(name)
+
+    def _make_history(self, name):
+        capacity = self._history_capacity.get(name)
+        if capacity is None or name not in self._fields or name in self._history:
+            return
+        fields, dtype = self._fields[name]
+        self._history[name] = RingBuffer(fields, capacity, dtype)
+
+    def enable_shared(self, name, shm_name=None, capacity=None):
+        """ Publish the samples of a subject into shared memory for other processes, see shm.ShmRingReader
+
+        Can be called before or after the subject is subscribed, e.g. telemetry.enable_shared(dds.DDS_ATTITUDE)
+
+        :param name: subject name
+        :param shm_name: shared memory name, shm.shm_name(name, self.shm_scope) if None
+        :param capacity: samples kept in the ring
+        """
+        self.disable_shared(name)
+        self._shared_conf[name] = (shm_name or shm.shm_name(name, self._shm_scope), capacity)
+        self._make_shared(name)
+
+    @property
+    def shm_scope(self):
+        return self._shm_scope
+
+    def disable_shared(self, name):
+        self._shared_conf.pop(name, None)
+        shared = self._shared.pop(name, None)
+        if shared is not None:
+            shared.close()
+
+    def shared(self, name):
+        """ :return: shm.ShmRingWriter of name, None if not enabled or the subject is not subscribed yet """
+        return self._shared.get(name)
+
+    def _make_shared(self, name):
+        conf = self._shared_conf.get(name)
+        if conf is None or name not in self._fields or name in self._shared:
+            return
+        fields, dtype = self._fields[name]
+        try:
+            self._shared[name] = shm.ShmRingWriter(conf[0], fields, conf[1], dtype)
+        except FileExistsError:
+            # another robot or a stale segment owns the name, keep the subscription and leave sharing off.
+            logger.warning("Telemetry: enable_shared, {0} already exists, {1} is not shared.", conf[0], name)
+            self._shared_conf.pop(name, None)
+
+    def close(self):
+        """ remove the shared memory of every subject """
+        for name in list(self._shared_conf):
+            self.disable_shared(name)
+
+    def latest(self, name, default=None):
+        """ Get the latest sample of a subject
+
+        :param name: subject name, e.g. dds.DDS_IMU, dds.DDS_POSITION
+        :param default: returned when nothing was received for name yet
+        :return: TelemetrySample(timestamp, values), values is the tuple passed to the subject callback
+        """
+        return self._latest.get(name, default)
+
+    def names(self):
+        return list(self._latest)
+
+    def clear(self, name=None):
+        if name is None:
+            self._latest = {}
+        else:
+            self._latest.pop(name, None)
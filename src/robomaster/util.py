@@ -1,10 +1,36 @@
 from src.robomaster import logger
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 UNIT_METRIC = 'Unit Metric'
 UNIT_INCH = 'Unit Inch'
 
 _VALID_UNIT = {UNIT_METRIC, UNIT_INCH}
 
+# beyond 2**52 a float has no fractional digits left and x * 10**decimal may lose the value.
+_ROUND_EXACT_LIMIT = float(2 ** 52)
+
+
+def _round_array(vals, decimal):
+    """ round(val, decimal) for every element of a float64 array, with the same result as the builtin
+
+    rint(x * 10**decimal) / 10**decimal is the double nearest to the correctly rounded decimal, unless the product
+    was rounded across a .5 boundary, so elements close to a tie are rounded again one by one with round().
+    """
+    factor = 10.0 ** decimal
+    with np.errstate(over='ignore', invalid='ignore'):
+        scaled = vals * factor
+        result = np.rint(scaled) / factor
+        tie_dist = np.abs(scaled - np.floor(scaled) - 0.5)
+        suspect = (tie_dist <= np.abs(scaled) * 1e-12 + 1e-9) | ~(np.abs(scaled) < _ROUND_EXACT_LIMIT)
+    suspect &= np.isfinite(vals)
+    for i in np.flatnonzero(suspect):
+        result[i] = round(float(vals[i]), decimal)
+    return result
+
 
 class UnitChecker:
     # Unit
@@ -56,10 +82,10 @@ class UnitChecker:
         if self._start and self._end:
             if value > self._end:
                 value = self._end
-                logger.warning("{0}: over limit and is set to {1}".format(self._name, self._end))
+                logger.warning("{0}: over limit and is set to {1}", self._name, self._end)
             if value < self._start:
                 value = self._start
-                logger.warning("{0}: below limit and is set to {1}".format(self._name, self._start))
+                logger.warning("{0}: below limit and is set to {1}", self._name, self._start)
         return value
 
     def proto2val(self, val):
@@ -68,6 +94,27 @@ class UnitChecker:
         val = self.check(val)
         return val
 
+    def proto2val_array(self, vals):
+        """ Vectorised proto2val, the result equals proto2val applied element by element
+
+        :param vals: numpy array or sequence of protocol values
+        :return: numpy float64 array, int64 if decimal is 0
+        """
+        vals = np.asarray(vals, dtype=np.float64) / self._scale
+        if self._decimal is None:
+            vals = np.rint(vals)
+        else:
+            vals = _round_array(vals, self._decimal)
+        if self._start and self._end:
+            if np.any(vals > self._end):
+                logger.warning("{0}: over limit and is set to {1}", self._name, self._end)
+            if np.any(vals < self._start):
+                logger.warning("{0}: below limit and is set to {1}", self._name, self._start)
+            vals = np.clip(vals, self._start, self._end)
+        if self._decimal is None:
+            vals = vals.astype(np.int64)
+        return vals
+
     def val2proto(self, val):
         val = self.check(val)
         val = val * self._scale
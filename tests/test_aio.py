@@ -0,0 +1,238 @@
+import asyncio
+import struct
+import unittest
+
+from src.robomaster import aio
+from src.robomaster import algo
+from src.robomaster import chassis
+from src.robomaster import protocol
+
+
+def build_frame(cmdset, cmdid, payload, seq_id=0, attri=0, sender=0x09, receiver=0x69):
+    """ a v1 frame with valid header crc8 and crc16 """
+    n = protocol.MSG_MIN_LEN + len(payload)
+    frame = bytearray(n)
+    frame[0] = protocol.MSG_MAGIC
+    frame[1] = n & 0xff
+    frame[2] = (n >> 8) & 0x3 | 4
+    frame[3] = algo.crc8_calc(frame[0:3])
+    frame[4] = sender
+    frame[5] = receiver
+    frame[6] = seq_id & 0xff
+    frame[7] = (seq_id >> 8) & 0xff
+    frame[8] = attri
+    frame[9] = cmdset
+    frame[10] = cmdid
+    frame[protocol.MSG_PAYLOAD_OFFSET:n - 2] = payload
+    return bytes(protocol.seal_frame(frame))
+
+
+class _FakeRobot(asyncio.DatagramProtocol):
+    """ local udp peer acking every request that asks for it with retcode 0 """
+    ack_payload = b'\x00' * 32
+
+    def __init__(self):
+        self.transport = None
+        self.peer = None
+        self.received = []
+        # (cmdset, cmdid) of the requests left without an ack.
+        self.silent = set()
+        self._parser = protocol.FrameParser()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.peer = addr
+        for msg in self._parser.iter_frames(data):
+            self.received.append(msg)
+            if msg.is_ack or msg._need_ack == 0 or (msg.cmdset, msg.cmdid) in self.silent:
+                continue
+            self.transport.sendto(build_frame(msg.cmdset, msg.cmdid, self.ack_payload, msg._seq_id, 0x80,
+                                              msg._receiver, msg._sender), addr)
+
+    def push(self, cmdset, cmdid, payload, sender=0x09):
+        self.transport.sendto(build_frame(cmdset, cmdid, payload, sender=sender), self.peer)
+
+    def requests(self, proto_cls):
+        return [msg for msg in self.received if (msg.cmdset, msg.cmdid) == (proto_cls._cmdset, proto_cls._cmdid)]
+
+
+class _AioRobot:
+    def __init__(self, cli):
+        self.client = cli
+        self.action_dispatcher = aio.AioActionDispatcher(cli)
+        self.action_dispatcher.initialize()
+        self.dds = aio.AioSubscriber(cli)
+
+
+class AioTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        loop = asyncio.get_running_loop()
+        transport, self.robot = await loop.create_datagram_endpoint(_FakeRobot, local_addr=('127.0.0.1', 0))
+        self.client = aio.AioClient(9, 6, ('127.0.0.1', 0), transport.get_extra_info('sockname'))
+        await self.client.start()
+        # the fake robot learns the client address from the first datagram.
+        self.assertTrue(await self.client.send_sync_proto(protocol.ProtoSetSdkMode(), protocol.host2byte(9, 0)))
+
+    async def asyncTearDown(self):
+        self.client.close()
+        self.robot.transport.close()
+
+    async def wait_until(self, predicate, timeout=1.0):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not predicate():
+            if asyncio.get_running_loop().time() > deadline:
+                self.fail("timeout")
+            await asyncio.sleep(0.005)
+
+
+class TestAioClient(AioTestCase):
+
+    async def test_ack_resolution(self):
+        msgs = [protocol.Msg(self.client.hostbyte, protocol.host2byte(9, 0), protocol.ProtoGetVersion())
+                for _ in range(20)]
+        acks = await asyncio.wait_for(asyncio.gather(*[self.client.send_msg_future(msg) for msg in msgs]), 1.0)
+        self.assertEqual([ack._seq_id for ack in acks], [msg._seq_id for msg in msgs])
+        self.assertTrue(all(ack.is_ack for ack in acks))
+        self.assertEqual(self.client._wait_ack_list, {})
+
+    async def test_undecodable_ack(self):
+        self.robot.ack_payload = b'\x00'
+        msg = protocol.Msg(self.client.hostbyte, protocol.host2byte(9, 0), protocol.ProtoGetVersion())
+        # resolved with None at once instead of waiting for the timeout.
+        self.assertIsNone(await asyncio.wait_for(self.client.send_msg_future(msg), 1.0))
+        self.assertEqual(self.client._wait_ack_list, {})
+
+    async def test_timeout(self):
+        self.robot.silent.add((protocol.ProtoGetVersion._cmdset, protocol.ProtoGetVersion._cmdid))
+        msg = protocol.Msg(self.client.hostbyte, protocol.host2byte(9, 0), protocol.ProtoGetVersion())
+        self.assertIsNone(await self.client.send_sync_msg(msg, timeout=0.05))
+        self.assertEqual(self.client._wait_ack_list, {})
+
+    async def test_cancellation(self):
+        msg = protocol.Msg(self.client.hostbyte, protocol.host2byte(9, 0), protocol.ProtoGetVersion())
+        future = self.client.send_msg_future(msg)
+        future.cancel()
+        await asyncio.sleep(0)
+        self.assertEqual(self.client._wait_ack_list, {})
+        # the ack of the cancelled request arrives later and is dropped.
+        received = self.client._has_recv
+        await self.wait_until(lambda: self.client._has_recv > received)
+        self.assertTrue(future.cancelled())
+
+    async def test_close_cancels_pending(self):
+        self.robot.silent.add((protocol.ProtoGetVersion._cmdset, protocol.ProtoGetVersion._cmdid))
+        msg = protocol.Msg(self.client.hostbyte, protocol.host2byte(9, 0), protocol.ProtoGetVersion())
+        future = self.client.send_msg_future(msg)
+        self.client.close()
+        self.assertTrue(future.cancelled())
+        self.assertEqual(self.client._wait_ack_list, {})
+
+    async def test_drive_speed_is_sent_without_ack(self):
+        self.robot.silent.add((protocol.ProtoChassisSpeedMode._cmdset, protocol.ProtoChassisSpeedMode._cmdid))
+        aio_chassis = aio.AioChassis(_AioRobot(self.client))
+        self.assertTrue(await aio_chassis.drive_speed(0.5, 0, 30))
+        await self.wait_until(lambda: self.robot.requests(protocol.ProtoChassisSpeedMode))
+        msg = self.robot.requests(protocol.ProtoChassisSpeedMode)[0]
+        self.assertEqual(msg._need_ack, 0)
+        self.assertEqual(struct.unpack('<3f', bytes(msg._buf)), (0.5, 0.0, 30.0))
+        self.assertEqual(self.client._wait_ack_list, {})
+
+
+class TestSubscription(AioTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.subscriber = aio.AioSubscriber(self.client)
+
+    def _push_attitude(self, subscription, yaw):
+        payload = bytes((0, subscription.subject._subject_id)) + struct.pack('<3f', yaw, 0, 0)
+        self.robot.push(protocol.ProtoPushPeriodMsg._cmdset, protocol.ProtoPushPeriodMsg._cmdid, payload)
+
+    async def test_samples(self):
+        subscription = self.subscriber.subscribe(chassis.AttiInfoSubject())
+        async with subscription:
+            self.assertEqual(len(self.robot.requests(protocol.ProtoAddSubMsg)), 1)
+            for yaw in range(3):
+                self._push_attitude(subscription, yaw)
+            samples = [await subscription.__anext__() for _ in range(3)]
+        self.assertEqual([sample[0] for sample in samples], [0, 1, 2])
+        self.assertEqual(len(self.robot.requests(protocol.ProtoDelMsg)), 1)
+        self.assertEqual(subscription.dropped, 0)
+
+    async def test_overflow_drops_oldest(self):
+        subscription = self.subscriber.subscribe(chassis.AttiInfoSubject(), maxsize=3)
+        await subscription.open()
+        received = self.client._has_recv
+        for yaw in range(10):
+            self._push_attitude(subscription, yaw)
+        await self.wait_until(lambda: self.client._has_recv >= received + 10)
+        await subscription.close()
+        samples = [sample async for sample in subscription]
+        # the close marker takes a slot as well.
+        self.assertEqual([sample[0] for sample in samples], [8, 9])
+        self.assertEqual(subscription.dropped, 8)
+
+    async def test_close_ends_iteration(self):
+        subscription = self.subscriber.subscribe(chassis.AttiInfoSubject())
+        await subscription.open()
+
+        async def consume():
+            return [sample async for sample in subscription]
+
+        task = asyncio.ensure_future(consume())
+        received = self.client._has_recv
+        self._push_attitude(subscription, 1)
+        await self.wait_until(lambda: self.client._has_recv > received)
+        await asyncio.sleep(0)
+        await subscription.close()
+        samples = await asyncio.wait_for(task, 1.0)
+        self.assertEqual([sample[0] for sample in samples], [1])
+
+
+class TestAioActionDispatcher(AioTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.aio_robot = _AioRobot(self.client)
+
+    async def test_move_succeeds(self):
+        dispatcher = self.aio_robot.action_dispatcher
+
+        async def finish():
+            await self.wait_until(lambda: dispatcher._in_progress)
+            act = list(dispatcher._in_progress.values())[0]
+            await self.wait_until(lambda: act.is_running)
+            payload = struct.pack('<BBBhhh', act._action_id, 100, 1, 0, 0, 0)
+            self.robot.push(protocol.ProtoPositionPush._cmdset, protocol.ProtoPositionPush._cmdid, payload,
+                            protocol.host2byte(3, 6))
+
+        task = asyncio.ensure_future(finish())
+        act = await aio.AioChassis(self.aio_robot).move(x=0.5, timeout=2.0)
+        await task
+        self.assertTrue(act.has_succeeded)
+        self.assertEqual(dispatcher._in_progress, {})
+        self.assertEqual(dispatcher._futures, {})
+
+    async def test_move_timeout(self):
+        self.robot.silent.add((protocol.ProtoPositionMove._cmdset, protocol.ProtoPositionMove._cmdid))
+        dispatcher = self.aio_robot.action_dispatcher
+        act = await aio.AioChassis(self.aio_robot).move(x=0.5, timeout=0.05)
+        self.assertEqual(act.state, 'action_exception')
+        self.assertEqual(dispatcher._in_progress, {})
+        self.assertEqual(dispatcher._futures, {})
+
+    async def test_one_action_per_target(self):
+        self.robot.silent.add((protocol.ProtoPositionMove._cmdset, protocol.ProtoPositionMove._cmdid))
+        aio_chassis = aio.AioChassis(self.aio_robot)
+        first = asyncio.ensure_future(aio_chassis.move(x=0.5, timeout=0.2))
+        await self.wait_until(lambda: self.aio_robot.action_dispatcher._in_progress)
+        with self.assertRaises(Exception):
+            await aio_chassis.move(x=0.5, timeout=0.2)
+        await first
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import random
+import unittest
+
+from src.robomaster import algo
+
+
+def _crc8_bitwise(data, crc=0x77):
+    """ reference crc8, reflected polynomial 0x8c, one bit at a time """
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8c if crc & 1 else crc >> 1
+    return crc
+
+
+def _crc16_bitwise(data, crc=0x3692):
+    """ reference crc16, reflected polynomial 0x8408, one bit at a time """
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+    return crc
+
+
+def _frame(payload):
+    """ payload followed by its little-endian crc16 """
+    crc = _crc16_bitwise(payload)
+    return bytes(payload) + bytes((crc & 0xff, crc >> 8))
+
+
+_BACKENDS = [algo.CRC_BACKEND_TABLE, algo.CRC_BACKEND_HQX]
+if algo.np is not None:
+    _BACKENDS.append(algo.CRC_BACKEND_NUMPY)
+
+
+class TestCrcTables(unittest.TestCase):
+
+    def test_crc8_table(self):
+        self.assertEqual(algo.crc8_table, [_crc8_bitwise([i], 0) for i in range(256)])
+
+    def test_crc16_table(self):
+        self.assertEqual(algo.crc16_table, [_crc16_bitwise([i], 0) for i in range(256)])
+
+
+class TestCrcBackends(unittest.TestCase):
+
+    def setUp(self):
+        self._backend = algo.get_crc_backend() or algo.CRC_BACKEND_HQX
+        self._rng = random.Random(20201017)
+        self._samples = [bytes(self._rng.getrandbits(8) for _ in range(self._rng.randint(0, 1500)))
+                         for _ in range(64)]
+        self._samples += [b'', b'\x00', b'\xff', bytes(range(256))]
+
+    def tearDown(self):
+        algo.set_crc_backend(self._backend)
+
+    @staticmethod
+    def _variants(data):
+        """ the input types the receive and send paths hand to the crc functions """
+        return [bytes(data), bytearray(data), memoryview(data), memoryview(bytearray(data)), list(data)]
+
+    def _check_backend(self, name):
+        self.assertEqual(algo.set_crc_backend(name), name)
+        for data in self._samples:
+            crc8 = _crc8_bitwise(data)
+            crc16 = _crc16_bitwise(data)
+            for variant in self._variants(data):
+                self.assertEqual(algo.crc8_calc(variant), crc8, (name, type(variant), len(data)))
+                self.assertEqual(algo.crc16_calc(variant), crc16, (name, type(variant), len(data)))
+
+    def _check_seeds(self, name):
+        algo.set_crc_backend(name)
+        for data in self._samples[:16]:
+            for seed in (0, 1, 0x55, 0xff):
+                self.assertEqual(algo.crc8_calc(data, seed), _crc8_bitwise(data, seed))
+            for seed in (0, 1, 0xffff, 0x8000, self._rng.getrandbits(16)):
+                self.assertEqual(algo.crc16_calc(data, seed), _crc16_bitwise(data, seed))
+                self.assertEqual(algo.crc16_calc_many([data, data[:7]], seed),
+                                 [_crc16_bitwise(data, seed), _crc16_bitwise(data[:7], seed)])
+
+    def _check_many(self, name):
+        algo.set_crc_backend(name)
+        frames = [_frame(data) for data in self._samples]
+        self.assertEqual(algo.crc16_calc_many(self._samples), [_crc16_bitwise(data) for data in self._samples])
+        self.assertEqual(algo.crc16_calc_many([memoryview(frame)[:-2] for frame in frames]),
+                         [_crc16_bitwise(data) for data in self._samples])
+        self.assertEqual(algo.crc16_check_many(frames), [True] * len(frames))
+        self.assertEqual(algo.crc16_check_many([bytearray(frame) for frame in frames]), [True] * len(frames))
+
+        corrupted = [bytearray(frame) for frame in frames]
+        for frame in corrupted[::2]:
+            frame[self._rng.randrange(len(frame))] ^= 1 << self._rng.randrange(8)
+        expect = [i % 2 == 1 for i in range(len(frames))]
+        self.assertEqual(algo.crc16_check_many(corrupted), expect)
+
+    def test_table(self):
+        self._check_backend(algo.CRC_BACKEND_TABLE)
+        self._check_seeds(algo.CRC_BACKEND_TABLE)
+        self._check_many(algo.CRC_BACKEND_TABLE)
+
+    def test_hqx(self):
+        self._check_backend(algo.CRC_BACKEND_HQX)
+        self._check_seeds(algo.CRC_BACKEND_HQX)
+        self._check_many(algo.CRC_BACKEND_HQX)
+
+    @unittest.skipIf(algo.np is None, "numpy is not installed")
+    def test_numpy(self):
+        self._check_backend(algo.CRC_BACKEND_NUMPY)
+        self._check_seeds(algo.CRC_BACKEND_NUMPY)
+        self._check_many(algo.CRC_BACKEND_NUMPY)
+
+    def test_backends_agree(self):
+        results = {}
+        for name in _BACKENDS:
+            algo.set_crc_backend(name)
+            results[name] = ([algo.crc8_calc(data) for data in self._samples],
+                             [algo.crc16_calc(data) for data in self._samples],
+                             algo.crc16_calc_many(self._samples),
+                             algo.crc16_check_many([_frame(data) for data in self._samples]))
+        for name in _BACKENDS[1:]:
+            self.assertEqual(results[name], results[_BACKENDS[0]], name)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            algo.set_crc_backend("crc32")
+
+
+if __name__ == '__main__':
+    unittest.main()
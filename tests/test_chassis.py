@@ -0,0 +1,169 @@
+import math
+import random
+import struct
+import threading
+import unittest
+
+from src.robomaster import chassis
+from src.robomaster import client
+from src.robomaster import protocol
+from src.robomaster import util
+
+
+class _SentConn:
+    """ connection keeping the frames sent, nothing is received """
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(bytes(data))
+
+    def close(self):
+        pass
+
+
+class _Robot:
+    def __init__(self, cli):
+        self.client = cli
+        self.action_dispatcher = None
+
+
+def make_client():
+    cli = client.Client(9, 6, _SentConn())
+    # the recv task is not started, the sends only check the flag and Client.stop() that it is not alive.
+    cli._running = True
+    cli._thread = threading.Thread()
+    return cli
+
+
+class TestAutoStop(unittest.TestCase):
+
+    def setUp(self):
+        self._client = make_client()
+        self._chassis = chassis.Chassis(_Robot(self._client))
+
+    def tearDown(self):
+        self._chassis.stop()
+        self._client._running = False
+
+    def _sent(self, proto_cls):
+        return [frame for frame in self._client._conn.sent
+                if (frame[9], frame[10]) == (proto_cls._cmdset, proto_cls._cmdid)]
+
+    def test_auto_stop_wheels_without_ack(self):
+        self._chassis._auto_stop_timer("drive_wheels")
+        frames = self._sent(protocol.ProtoSetWheelSpeed)
+        self.assertEqual(len(frames), 1)
+        # need_ack bits of attri are clear, no AckFuture is left waiting.
+        self.assertEqual(frames[0][8] & 0x60, 0)
+        self.assertEqual(struct.unpack_from('<4h', frames[0], protocol.MSG_PAYLOAD_OFFSET), (0, 0, 0, 0))
+        self.assertEqual(self._client._wait_ack_list, {})
+
+    def test_auto_stop_speed_without_ack(self):
+        for _ in range(3):
+            self._chassis._auto_stop_timer("drive_speed")
+        frames = self._sent(protocol.ProtoChassisSpeedMode)
+        self.assertEqual(len(frames), 3)
+        self.assertEqual(struct.unpack_from('<3f', frames[0], protocol.MSG_PAYLOAD_OFFSET), (0.0, 0.0, 0.0))
+        self.assertEqual(self._client._wait_ack_list, {})
+
+    def test_unsupported_api(self):
+        self._chassis._auto_stop_timer("drive_pwm")
+        self.assertEqual(self._client._conn.sent, [])
+
+
+# float32 values on a .5 tie once scaled to the decimals of the checkers, and values past their limits.
+_TIES = [0.125, -0.125, 0.375, 2.5, -2.5, 0.5, 1.5, 0.005, 0.015, 1.0e-5 * 2.5, 179.995, -179.995, 0.0, -0.0]
+_SPECIAL = [float('nan'), float('inf'), float('-inf'), 180.5, -180.5, 1.0e30, -1.0e30, 3.4e38]
+
+
+def _same(a, b):
+    """ equal values, nan equal to nan, 0.0 different from -0.0 """
+    a = float(a)
+    b = float(b)
+    if math.isnan(a) or math.isnan(b):
+        return math.isnan(a) and math.isnan(b)
+    return a == b and math.copysign(1.0, a) == math.copysign(1.0, b)
+
+
+@unittest.skipIf(util.np is None, "numpy is not installed")
+class TestDecodeMany(unittest.TestCase):
+
+    def setUp(self):
+        self._rng = random.Random(20201015)
+
+    def _floats(self, n):
+        values = _TIES + _SPECIAL
+        values += [self._rng.uniform(-200, 200) for _ in range(n)]
+        values += [round(self._rng.uniform(-10, 10), 3) for _ in range(n)]
+        return values
+
+    def _float_payloads(self, num, n=200):
+        values = self._floats(n)
+        rows = []
+        for i in range(len(values)):
+            rows.append(struct.pack('<{0}f'.format(num), *[values[(i + k) % len(values)] for k in range(num)]))
+        return rows
+
+    def _check(self, make_subject, bufs, splits=(None,)):
+        """ decode_many over the chunks of bufs against decode() + data_info() one payload at a time """
+        scalar = make_subject()
+        expect = []
+        for buf in bufs:
+            scalar.decode(buf)
+            expect.append(scalar.data_info())
+        subject = make_subject()
+        rows = []
+        start = 0
+        for end in splits + (len(bufs),):
+            if end is None:
+                continue
+            rows.extend(subject.decode_many(bufs[start:end]).tolist())
+            start = end
+        self.assertEqual(len(rows), len(expect))
+        for i, (row, values) in enumerate(zip(rows, expect)):
+            self.assertEqual(len(row), len(values))
+            for got, want in zip(row, values):
+                self.assertTrue(_same(got, want), (make_subject, i, bufs[i], row, values))
+        self.assertTrue(all(_same(a, b) for a, b in zip(subject.data_info(), scalar.data_info())))
+
+    def test_position(self):
+        bufs = self._float_payloads(3)
+        # cs=0 takes the first position as origin and keeps it for the next calls.
+        self._check(lambda: chassis.PositionSubject(0), bufs)
+        self._check(lambda: chassis.PositionSubject(0), bufs, (1, 7, 100))
+        self._check(lambda: chassis.PositionSubject(1), bufs, (50,))
+
+    def test_position_origin(self):
+        bufs = [struct.pack('<3f', 1.0 + i, 2.0 - i, 0.5 * i) for i in range(10)]
+        subject = chassis.PositionSubject(0)
+        first = subject.decode_many(bufs[:3])
+        second = subject.decode_many(bufs[3:])
+        self.assertEqual(first[0].tolist(), (0.0, 0.0, 0.0))
+        self.assertEqual(second[0].tolist(), (3.0, -3.0, 0.15))
+
+    def test_attitude(self):
+        bufs = self._float_payloads(3)
+        self._check(chassis.AttiInfoSubject, bufs)
+        self._check(chassis.AttiInfoSubject, bufs, (3, 90))
+
+    def test_imu(self):
+        bufs = self._float_payloads(6)
+        self._check(chassis.ImuSubject, bufs)
+        self._check(chassis.ImuSubject, bufs, (10,))
+
+    def test_sa_status(self):
+        bufs = [bytes((i & 0xff, i >> 8)) for i in range(0, 1 << 16, 7)]
+        bufs += [bytes((0xff, 0xff, 0x12)), bytes((0, 0))]
+        self._check(chassis.SaStatusSubject, bufs)
+        self._check(chassis.SaStatusSubject, bufs, (100,))
+
+    def test_empty(self):
+        for subject in (chassis.PositionSubject(0), chassis.AttiInfoSubject(), chassis.ImuSubject(),
+                        chassis.SaStatusSubject()):
+            self.assertEqual(len(subject.decode_many([])), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
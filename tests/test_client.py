@@ -0,0 +1,144 @@
+import threading
+import time
+import unittest
+
+from src.robomaster import algo
+from src.robomaster import client
+from src.robomaster import protocol
+
+
+class _SentConn:
+    """ connection keeping the frames sent, nothing is received """
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(bytes(data))
+
+    def close(self):
+        pass
+
+
+def make_client():
+    cli = client.Client(9, 6, _SentConn())
+    # the recv task is not started, the sends only check the flag and Client.stop() that it is not alive.
+    cli._running = True
+    cli._thread = threading.Thread()
+    return cli
+
+
+def make_request(proto=None):
+    proto = proto or protocol.ProtoGetVersion()
+    return protocol.Msg(protocol.host2byte(9, 6), protocol.host2byte(3, 6), proto)
+
+
+def make_ack(request, payload=b'\x00\x01\x02\x03\x04'):
+    """ :return: the ack of request as the recv task decodes it """
+    n = protocol.MSG_MIN_LEN + len(payload)
+    frame = bytearray(n)
+    frame[0] = protocol.MSG_MAGIC
+    frame[1] = n & 0xff
+    frame[2] = (n >> 8) & 0x3 | 4
+    frame[3] = algo.crc8_calc(frame[0:3])
+    frame[4] = request._receiver
+    frame[5] = request._sender
+    frame[6] = request._seq_id & 0xff
+    frame[7] = (request._seq_id >> 8) & 0xff
+    frame[8] = 0x80
+    frame[9] = request.cmdset
+    frame[10] = request.cmdid
+    frame[protocol.MSG_PAYLOAD_OFFSET:n - 2] = payload
+    msgs = list(protocol.FrameParser().iter_frames(bytes(protocol.seal_frame(frame))))
+    return msgs[0]
+
+
+class TestAckFutureDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self._client = make_client()
+
+    def tearDown(self):
+        self._client._running = False
+
+    def test_dropped_future_is_cancelled(self):
+        future = self._client.send_msg_future(make_request(), timeout=0.05)
+        self.assertEqual(len(self._client._wait_ack_list), 1)
+        deadline = time.monotonic() + 2.0
+        while not future.done() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(future.cancelled())
+        self.assertEqual(self._client._wait_ack_list, {})
+
+    def test_acked_future_drops_its_deadline(self):
+        request = make_request()
+        future = self._client.send_msg_future(request, timeout=0.05)
+        self._client._dispatch_to_send_sync(make_ack(request))
+        self.assertTrue(future.done())
+        self.assertTrue(future._deadline.cancelled)
+        time.sleep(0.1)
+        self.assertFalse(future.cancelled())
+        self.assertEqual(future.result()._seq_id, request._seq_id)
+
+    def test_default_deadline(self):
+        future = self._client.send_msg_future(make_request())
+        self.assertIsNotNone(future._deadline)
+        self.assertFalse(future._deadline.cancelled)
+        future.cancel()
+        self.assertTrue(future._deadline.cancelled)
+        self.assertEqual(self._client._wait_ack_list, {})
+
+    def test_no_ack_no_deadline(self):
+        future = self._client.send_msg_future(make_request(protocol.ProtoChassisSpeedMode()))
+        self.assertIsNone(future.result(0))
+        self.assertIsNone(future._deadline)
+
+    def test_wait_returns_none_once_cancelled(self):
+        future = self._client.send_msg_future(make_request(), timeout=0.05)
+        self.assertIsNone(self._client.wait_msg_future(future, timeout=1.0))
+        self.assertEqual(self._client._wait_ack_list, {})
+
+
+class TestSeqIdReuse(unittest.TestCase):
+
+    def setUp(self):
+        self._client = make_client()
+        self._client._seq_ids = protocol.SeqIdAllocator(10000, 10003)
+        self._futures = []
+
+    def tearDown(self):
+        for future in self._futures:
+            future.cancel()
+        self._client._running = False
+
+    def _send(self):
+        request = make_request()
+        self._futures.append(self._client.send_msg_future(request))
+        return request
+
+    def test_wrap_around(self):
+        seq_ids = []
+        for _ in range(10):
+            request = self._send()
+            seq_ids.append(request._seq_id)
+            self._client._dispatch_to_send_sync(make_ack(request))
+        self.assertEqual(seq_ids, [10000, 10001, 10002, 10003] * 2 + [10000, 10001])
+        self.assertEqual(self._client._seq_id_reused, 0)
+        self.assertEqual(self._client._wait_ack_list, {})
+
+    def test_in_flight_seq_id_is_skipped(self):
+        requests = [self._send() for _ in range(4)]
+        self._client._dispatch_to_send_sync(make_ack(requests[1]))
+        self._client._dispatch_to_send_sync(make_ack(requests[3]))
+        # 10000 and 10002 still wait for their ack.
+        self.assertEqual([self._send()._seq_id for _ in range(2)], [10001, 10003])
+        self.assertEqual(self._client._seq_id_reused, 2)
+        self.assertEqual(len(self._client._wait_ack_list), 4)
+        # the ack of the first request still resolves it and not a later one.
+        self._client._dispatch_to_send_sync(make_ack(requests[0]))
+        self.assertEqual(self._futures[0].result(0)._seq_id, 10000)
+        self.assertFalse(self._futures[4].done())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import struct
+import threading
+import time
+import unittest
+
+from src.robomaster import algo
+from src.robomaster import chassis
+from src.robomaster import client
+from src.robomaster import dds
+from src.robomaster import protocol
+
+
+class _SentConn:
+    def send(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Robot:
+    def __init__(self, cli):
+        self.client = cli
+
+
+def make_push(msg_id, data):
+    """ :return: ProtoPushPeriodMsg msg of msg_id carrying data, unpacked as the client recv task does """
+    payload = bytes((0, msg_id)) + data
+    n = protocol.MSG_MIN_LEN + len(payload)
+    frame = bytearray(n)
+    frame[0] = protocol.MSG_MAGIC
+    frame[1] = n & 0xff
+    frame[2] = (n >> 8) & 0x3 | 4
+    frame[3] = algo.crc8_calc(frame[0:3])
+    frame[4] = protocol.host2byte(9, 0)
+    frame[5] = protocol.host2byte(9, 6)
+    frame[9] = protocol.ProtoPushPeriodMsg._cmdset
+    frame[10] = protocol.ProtoPushPeriodMsg._cmdid
+    frame[protocol.MSG_PAYLOAD_OFFSET:n - 2] = payload
+    msg = list(protocol.FrameParser().iter_frames(bytes(protocol.seal_frame(frame))))[0]
+    msg.unpack_protocol()
+    return msg
+
+
+class TestDispatchGuard(unittest.TestCase):
+
+    def setUp(self):
+        cli = client.Client(9, 6, _SentConn())
+        cli._thread = threading.Thread()
+        self._client = cli
+        self._subscriber = dds.Subscriber(_Robot(cli))
+        self._subscriber.start()
+        self._samples = []
+
+    def tearDown(self):
+        self._subscriber.stop()
+
+    def _add(self, subjects, msg_id):
+        """ route the pushes of msg_id to subjects as subscribe_many does, without the robot request """
+        with self._subscriber._dds_mutex:
+            if len(subjects) == 1:
+                # a single subject decodes the whole payload, as add_subject_info routes it.
+                subject = subjects[0]
+                subject.set_callback(lambda info: self._samples.append((subject.name, info)), (), {})
+                subject._subject_id = msg_id
+                self._subscriber._add_publisher(dds.SubHandler(self._subscriber, subject, subject._callback))
+                return
+            start = 0
+            for subject in subjects:
+                subject.set_callback(lambda info, name: self._samples.append((name, info)), (subject.name,), {})
+                subject._subject_id = msg_id
+                end = start + subject.data_size if subject.data_size is not None else None
+                self._subscriber._add_publisher(dds.SubHandler(self._subscriber, subject, subject._callback),
+                                                start, end)
+                start = end
+
+    def _push(self, msg_id, data):
+        self._subscriber._msg_recv(self._subscriber, make_push(msg_id, data))
+
+    def _wait_samples(self, n, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while len(self._samples) < n and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return self._samples
+
+    def test_short_batch_is_dropped(self):
+        self._add([chassis.AttiInfoSubject(), chassis.ImuSubject()], 30)
+        # 12 bytes of attitude, the imu is missing.
+        self._push(30, struct.pack('<3f', 1, 2, 3))
+        self._push(30, struct.pack('<3f', 4, 5, 6) + struct.pack('<6f', 1, 2, 3, 4, 5, 6))
+        samples = self._wait_samples(2)
+        self.assertEqual(sorted(name for name, _ in samples), [dds.DDS_ATTITUDE, dds.DDS_IMU])
+        self.assertEqual(dict(samples)[dds.DDS_ATTITUDE], (4.0, 5.0, 6.0))
+        stats = self._subscriber.stats()
+        self.assertEqual(stats['short_pushes'], 1)
+        self.assertEqual(stats['decode_errors'], 0)
+
+    def test_variable_tail(self):
+        self._add([chassis.AttiInfoSubject(), chassis.SaStatusSubject()], 31)
+        self._push(31, struct.pack('<3f', 1, 2, 3) + bytes((0x01, 0x02)))
+        self.assertEqual(len(self._wait_samples(2)), 2)
+        self.assertEqual(self._subscriber.stats()['short_pushes'], 0)
+
+    def test_decode_error_keeps_dispatching(self):
+        self._add([chassis.PositionSubject(1)], 32)
+        self._push(32, b'\x00' * 5)
+        self._push(32, struct.pack('<3f', 1, 2, 30))
+        samples = self._wait_samples(1)
+        self.assertEqual(samples, [(dds.DDS_POSITION, (1.0, 2.0, 3.0))])
+        self.assertTrue(self._subscriber._dispatcher_thread.is_alive())
+        self.assertEqual(self._subscriber.stats()['decode_errors'], 1)
+
+
+class TestRoutesSize(unittest.TestCase):
+
+    def test_routes_size(self):
+        self.assertEqual(dds._routes_size(()), 0)
+        self.assertEqual(dds._routes_size(((None, 0, None),)), 0)
+        self.assertEqual(dds._routes_size(((None, 0, 12), (None, 12, 36))), 36)
+        self.assertEqual(dds._routes_size(((None, 0, 12), (None, 12, None))), 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
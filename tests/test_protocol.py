@@ -0,0 +1,245 @@
+import random
+import struct
+import threading
+import unittest
+
+from src.robomaster import algo
+from src.robomaster import protocol
+
+
+def build_frame(cmdset, cmdid, payload, seq_id=0, attri=0, sender=0x09, receiver=0x69):
+    """ a v1 frame with valid header crc8 and crc16 """
+    n = protocol.MSG_MIN_LEN + len(payload)
+    frame = bytearray(n)
+    frame[0] = protocol.MSG_MAGIC
+    frame[1] = n & 0xff
+    frame[2] = (n >> 8) & 0x3 | 4
+    frame[3] = algo.crc8_calc(frame[0:3])
+    frame[4] = sender
+    frame[5] = receiver
+    frame[6] = seq_id & 0xff
+    frame[7] = (seq_id >> 8) & 0xff
+    frame[8] = attri
+    frame[9] = cmdset
+    frame[10] = cmdid
+    frame[protocol.MSG_PAYLOAD_OFFSET:n - 2] = payload
+    return bytes(protocol.seal_frame(frame))
+
+
+def _slotted_protos():
+    return [cls for cls in protocol.registered_protos.values() if '__slots__' in cls.__dict__]
+
+
+def _fixed_size_protos():
+    return [cls for cls in protocol.registered_protos.values() if cls._req_struct is not None]
+
+
+def _random_field(rng, fmt):
+    if fmt.endswith('s'):
+        return bytes(rng.getrandbits(8) for _ in range(int(fmt[:-1])))
+    if fmt == 'f':
+        return rng.uniform(-100, 100)
+    bits = struct.calcsize(fmt) * 8
+    if fmt.islower():
+        return rng.randint(-(1 << (bits - 1)), (1 << (bits - 1)) - 1)
+    return rng.getrandbits(bits)
+
+
+class TestFrameTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self._rng = random.Random(20201018)
+
+    def _random_proto(self, cls):
+        proto = cls()
+        for name, fmt in cls._req_fields:
+            # derived fields, e.g. ProtoSetSdkConnection._ip_bytes, keep the value of their source attribute.
+            if name and not isinstance(getattr(cls, name, None), property):
+                setattr(proto, name, _random_field(self._rng, fmt))
+        return proto
+
+    def test_fixed_size_protos_exist(self):
+        self.assertIn(protocol.ProtoChassisSpeedMode, _fixed_size_protos())
+        self.assertIn(protocol.ProtoSdkHeartBeat, _fixed_size_protos())
+
+    def test_template_matches_generic_pack(self):
+        hosts = [(protocol.host2byte(9, 6), protocol.host2byte(3, 6)),
+                 (protocol.host2byte(9, 0), protocol.host2byte(9, 6)),
+                 (protocol.host2byte(2, 1), protocol.host2byte(17, 7))]
+        for cls in _fixed_size_protos():
+            for sender, receiver in hosts:
+                for seq_id in (0, 1, 255, 256, 0x1234, 0xffff):
+                    proto = self._random_proto(cls)
+                    msg = protocol.Msg(sender, receiver, proto)
+                    msg._seq_id = seq_id
+                    expect = build_frame(cls._cmdset, cls._cmdid, bytes(proto.pack_req()), seq_id,
+                                         msg._need_ack << 5, sender, receiver)
+                    self.assertEqual(bytes(msg.pack()), expect, (cls.__name__, seq_id, sender, receiver))
+                    self.assertEqual(msg._len, len(expect))
+
+    def test_template_need_ack(self):
+        proto = protocol.ProtoSetWheelSpeed()
+        for need_ack in (0, 1, 2):
+            msg = protocol.Msg(protocol.host2byte(9, 6), protocol.host2byte(3, 6), proto)
+            msg._need_ack = need_ack
+            expect = build_frame(proto._cmdset, proto._cmdid, bytes(proto.pack_req()), msg._seq_id, need_ack << 5,
+                                 msg._sender, msg._receiver)
+            self.assertEqual(bytes(msg.pack()), expect)
+
+    def test_template_pack_into(self):
+        proto = self._random_proto(protocol.ProtoChassisSpeedMode)
+        template = protocol.frame_template(proto, 0x09, 0x69, 0)
+        out = bytearray(template.length)
+        self.assertIs(template.pack(7, proto, out), out)
+        self.assertEqual(bytes(out), build_frame(proto._cmdset, proto._cmdid, bytes(proto.pack_req()), 7))
+
+    def test_req_struct_round_trip(self):
+        for cls in _fixed_size_protos():
+            for _ in range(20):
+                proto = self._random_proto(cls)
+                buf = bytes(proto.pack_req())
+                self.assertEqual(len(buf), cls._req_size, cls.__name__)
+                out = bytearray(len(buf) + 3)
+                self.assertEqual(proto.pack_req_into(out, 3), len(buf))
+                self.assertEqual(bytes(out[3:]), buf)
+                other = cls()
+                other.unpack_req_from(out, 3)
+                self.assertEqual(bytes(other.pack_req()), buf, cls.__name__)
+                # float fields come back rounded to float32, compare them with the packed values.
+                values = cls._req_struct.unpack(buf)
+                self.assertEqual(tuple(getattr(other, name) for name in cls._req_names), values, cls.__name__)
+
+    def test_derived_fields_round_trip(self):
+        proto = protocol.ProtoSetSdkConnection()
+        proto._ip = '192.168.2.1'
+        other = protocol.ProtoSetSdkConnection()
+        other.unpack_req_from(proto.pack_req())
+        self.assertEqual(other._ip, '192.168.2.1')
+        proto = protocol.ProtoPositionMove()
+        proto._freq = 5
+        proto._action_ctrl = 1
+        other = protocol.ProtoPositionMove()
+        other.unpack_req_from(proto.pack_req())
+        self.assertEqual((other._freq, other._action_ctrl), (5, 1))
+
+    def test_struct_error_is_logged(self):
+        proto = protocol.ProtoSetWheelSpeed()
+        proto._w1_spd = 1 << 20
+        msg = protocol.Msg(protocol.host2byte(9, 6), protocol.host2byte(3, 6), proto)
+        # logged, and an empty payload is sent as when pack_req raised.
+        buf = msg.pack()
+        self.assertEqual(len(buf), protocol.MSG_MIN_LEN)
+
+
+class TestFrameParser(unittest.TestCase):
+
+    def setUp(self):
+        self._frames = [build_frame(0x3f, 0x21, bytes(range(i)), seq_id=i) for i in (0, 1, 7, 30)]
+
+    def _parse(self, parser, *chunks):
+        return [msg._seq_id for chunk in chunks for msg in parser.iter_frames(chunk)]
+
+    def test_split_stream(self):
+        stream = b''.join(self._frames)
+        for size in (1, 2, 5, 13, 64):
+            parser = protocol.FrameParser()
+            chunks = [stream[i:i + size] for i in range(0, len(stream), size)]
+            self.assertEqual(self._parse(parser, *chunks), [0, 1, 7, 30], size)
+            self.assertEqual((parser.frames, parser.dropped, parser.resyncs, parser.pending), (4, 0, 0, 0))
+
+    def test_memoryview(self):
+        parser = protocol.FrameParser()
+        self.assertEqual(self._parse(parser, memoryview(b'\x01' + b''.join(self._frames))), [0, 1, 7, 30])
+        self.assertEqual(parser.dropped, 1)
+
+    def test_garbage(self):
+        parser = protocol.FrameParser()
+        # a stray magic number without a valid header inside the garbage.
+        garbage = b'\x00\x13' + bytes((protocol.MSG_MAGIC,)) + b'\xff\x10\x20'
+        self.assertEqual(self._parse(parser, garbage + self._frames[2] + garbage, self._frames[3]), [7, 30])
+        self.assertEqual(parser.dropped, 2 * len(garbage))
+        self.assertEqual(parser.pending, 0)
+
+    def test_bad_header_crc8(self):
+        parser = protocol.FrameParser()
+        bad = bytearray(self._frames[2])
+        bad[3] ^= 0xff
+        self.assertEqual(self._parse(parser, bytes(bad) + self._frames[3]), [30])
+        self.assertEqual(parser.dropped, len(bad))
+        self.assertEqual(parser.crc_errors, 0)
+
+    def test_bad_crc16(self):
+        parser = protocol.FrameParser()
+        for i in (protocol.MSG_PAYLOAD_OFFSET, len(self._frames[2]) - 1):
+            bad = bytearray(self._frames[2])
+            bad[i] ^= 0x01
+            self.assertEqual(self._parse(parser, self._frames[1] + bytes(bad), self._frames[3]), [1, 30])
+        self.assertEqual(parser.crc_errors, 2)
+        self.assertEqual(parser.dropped, 2 * len(self._frames[2]))
+        self.assertEqual(parser.frames, 4)
+
+    def test_truncated_frame_is_skipped(self):
+        parser = protocol.FrameParser()
+        # the next frame starts before the end announced by the header of the truncated one.
+        self.assertEqual(self._parse(parser, self._frames[3][:20] + self._frames[2], self._frames[1] * 3),
+                         [7, 1, 1, 1])
+        self.assertEqual(parser.crc_errors, 1)
+        self.assertEqual(parser.pending, 0)
+
+    def test_reset(self):
+        parser = protocol.FrameParser()
+        self.assertEqual(self._parse(parser, self._frames[3][:20]), [])
+        self.assertEqual(parser.pending, 20)
+        parser.reset()
+        self.assertEqual(self._parse(parser, self._frames[0]), [0])
+
+
+class TestSeqIdAllocator(unittest.TestCase):
+
+    def test_wrap_around(self):
+        seq_ids = protocol.SeqIdAllocator(5, 7)
+        self.assertEqual(seq_ids.span, 3)
+        self.assertEqual([seq_ids.next() for _ in range(7)], [5, 6, 7, 5, 6, 7, 5])
+
+    def test_threads_draw_distinct_ids(self):
+        seq_ids = protocol.SeqIdAllocator(0, 99999)
+        drawn = [[] for _ in range(4)]
+
+        def draw(out):
+            for _ in range(5000):
+                out.append(next(seq_ids))
+
+        threads = [threading.Thread(target=draw, args=(out,)) for out in drawn]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ids = [seq_id for out in drawn for seq_id in out]
+        self.assertEqual(sorted(ids), list(range(20000)))
+
+
+class TestSlottedProtos(unittest.TestCase):
+
+    def test_slotted_protos_exist(self):
+        self.assertIn(protocol.ProtoPushPeriodMsg, _slotted_protos())
+
+    def test_unpack_ack(self):
+        parser = protocol.FrameParser()
+        for cls in _slotted_protos():
+            for payload in (b'\x00' * 12, b'\x01\x02\x03' + b'\x00' * 9):
+                frame = build_frame(cls._cmdset, cls._cmdid, payload, attri=0x80)
+                msgs = list(parser.iter_frames(frame))
+                self.assertEqual(len(msgs), 1)
+                self.assertTrue(msgs[0].is_ack)
+                # must not raise, the recv task would die.
+                msgs[0].unpack_protocol()
+
+    def test_unpack_resp_retcode(self):
+        proto = protocol.ProtoPushPeriodMsg()
+        self.assertFalse(proto.unpack_resp(b'\x01\x02\x03'))
+        self.assertEqual(proto._retcode, 1)
+        self.assertTrue(proto.unpack_resp(b'\x00'))
+
+
+if __name__ == '__main__':
+    unittest.main()
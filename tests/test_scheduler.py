@@ -0,0 +1,119 @@
+import threading
+import time
+import unittest
+
+from src.robomaster import scheduler
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self._scheduler = scheduler.Scheduler("test-scheduler")
+        self._calls = []
+        self._event = threading.Event()
+
+    def tearDown(self):
+        self._scheduler.stop()
+
+    def _record(self, name):
+        self._calls.append(name)
+        self._event.set()
+
+    def _wait(self, timeout=2.0):
+        self.assertTrue(self._event.wait(timeout))
+        self._event.clear()
+
+    def test_call_later_runs_once(self):
+        call = self._scheduler.call_later(0.01, self._record, 'a')
+        self.assertIsNotNone(call.deadline)
+        self._wait()
+        time.sleep(0.05)
+        self.assertEqual(self._calls, ['a'])
+        self.assertIsNone(call.deadline)
+        self.assertFalse(call.cancelled)
+
+    def test_deadline_order(self):
+        self._scheduler.call_later(0.06, self._record, 'c')
+        self._scheduler.call_later(0.02, self._record, 'a')
+        self._scheduler.call_later(0.04, self._record, 'b')
+        deadline = time.monotonic() + 2.0
+        while len(self._calls) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self._calls, ['a', 'b', 'c'])
+
+    def test_cancel(self):
+        call = self._scheduler.call_later(0.02, self._record, 'cancelled')
+        call.cancel()
+        self.assertTrue(call.cancelled)
+        self.assertIsNone(call.deadline)
+        self._scheduler.call_later(0.05, self._record, 'a')
+        self._wait()
+        self.assertEqual(self._calls, ['a'])
+
+    def test_reschedule_earlier(self):
+        call = self._scheduler.call_later(60, self._record, 'a')
+        call.reschedule(0.01)
+        self._wait()
+        self.assertEqual(self._calls, ['a'])
+
+    def test_reschedule_later(self):
+        call = self._scheduler.call_later(0.02, self._record, 'late')
+        call.reschedule(60)
+        # the entry left behind by the first deadline is skipped.
+        self._scheduler.call_later(0.05, self._record, 'a')
+        self._wait()
+        time.sleep(0.02)
+        self.assertEqual(self._calls, ['a'])
+        self.assertGreater(call.deadline, time.monotonic() + 50)
+        call.cancel()
+
+    def test_reschedule_rearms(self):
+        call = self._scheduler.call_later(0.01, self._record, 'a')
+        self._wait()
+        call.reschedule(0.01)
+        self._wait()
+        call.cancel()
+        call.reschedule(0.01)
+        self.assertFalse(call.cancelled)
+        self._wait()
+        self.assertEqual(self._calls, ['a', 'a', 'a'])
+
+    def test_reschedule_many_times(self):
+        # an auto stop timer pushed back by every drive command, it runs once after the last one.
+        call = self._scheduler.call_later(0.2, self._record, 'stop')
+        for _ in range(20):
+            time.sleep(0.005)
+            call.reschedule(0.2)
+        self._wait()
+        time.sleep(0.1)
+        self.assertEqual(self._calls, ['stop'])
+
+    def test_call_every(self):
+        call = self._scheduler.call_every(0.01, self._record, 'tick')
+        for _ in range(3):
+            self._wait()
+        call.cancel()
+        time.sleep(0.03)
+        ticks = len(self._calls)
+        self.assertGreaterEqual(ticks, 3)
+        time.sleep(0.05)
+        self.assertEqual(len(self._calls), ticks)
+
+    def test_callback_exception(self):
+        def fail():
+            raise RuntimeError("callback failed")
+
+        self._scheduler.call_later(0.01, fail)
+        self._scheduler.call_later(0.03, self._record, 'a')
+        self._wait()
+        self.assertEqual(self._calls, ['a'])
+
+    def test_stop_drops_pending(self):
+        self._scheduler.call_later(0.02, self._record, 'dropped')
+        self._scheduler.stop()
+        time.sleep(0.05)
+        self.assertEqual(self._calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
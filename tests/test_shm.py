@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from src.robomaster import shm
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _ring_name(tag):
+    return "rm_test_{0}_{1}".format(os.getpid(), tag)
+
+
+class TestShmRing(unittest.TestCase):
+
+    def setUp(self):
+        self._writer = shm.ShmRingWriter(_ring_name(self._testMethodName), ('x', 'y', 'z'), capacity=4)
+
+    def tearDown(self):
+        self._writer.close()
+
+    def test_read(self):
+        with shm.ShmRingReader(self._writer.name) as reader:
+            self.assertEqual(reader.fields, ('x', 'y', 'z'))
+            self.assertIsNone(reader.latest())
+            for i in range(6):
+                self._writer.publish(0.5 * i, (i, -i, 2 * i))
+            samples, cursor = reader.read()
+            self.assertEqual(cursor, 6)
+            # the 2 oldest samples were overwritten.
+            self.assertEqual([sample.timestamp for sample in samples], [1.0, 1.5, 2.0, 2.5])
+            self.assertEqual(reader.lost, 2)
+            self.assertEqual(tuple(reader.latest().values), (5.0, -5.0, 10.0))
+            self._writer.publish(3.0, (6, -6, 12))
+            samples, cursor = reader.read(cursor)
+            self.assertEqual([tuple(sample.values) for sample in samples], [(6.0, -6.0, 12.0)])
+            self.assertEqual(cursor, 7)
+
+    @unittest.skipIf(shm.np is None, "numpy is not installed")
+    def test_slots_view(self):
+        with shm.ShmRingReader(self._writer.name) as reader:
+            slots = reader.slots()
+            self.assertEqual(slots.dtype.names, ('seq', 'timestamp', 'x', 'y', 'z'))
+            self.assertEqual(len(slots), 4)
+            for i in range(1, 6):
+                self._writer.publish(float(i), (i, 10 * i, 100 * i))
+            # the view follows the writer without reading again.
+            self.assertEqual(slots['seq'].tolist(), [10, 4, 6, 8])
+            self.assertEqual(slots['timestamp'].tolist(), [5.0, 2.0, 3.0, 4.0])
+            self.assertEqual(slots[0][['x', 'y', 'z']].tolist(), (5.0, 50.0, 500.0))
+            del slots
+
+    def test_reader_process_exit_keeps_the_ring(self):
+        self._writer.publish(1.0, (1, 2, 3))
+        # a process of its own, with its own resource tracker.
+        code = "from src.robomaster import shm; print(tuple(shm.ShmRingReader({0!r}).latest().values))".format(
+            self._writer.name)
+        out = subprocess.run([sys.executable, "-c", code], cwd=_ROOT, check=True, capture_output=True, text=True)
+        self.assertEqual(out.stdout.strip(), "(1.0, 2.0, 3.0)")
+        self.assertNotIn("leaked", out.stderr)
+        with shm.ShmRingReader(self._writer.name) as reader:
+            self.assertEqual(reader.count, 1)
+
+    def test_close_unlinks(self):
+        name = self._writer.name
+        self._writer.close()
+        with self.assertRaises(FileNotFoundError):
+            shm.ShmRingReader(name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from src.robomaster import telemetry
+
+
+@unittest.skipIf(telemetry.np is None, "numpy is not installed")
+class TestRingBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self._ring = telemetry.RingBuffer(('x', 'y'), capacity=4)
+
+    def _append(self, *timestamps):
+        for timestamp in timestamps:
+            self._ring.append(timestamp, (timestamp * 10, -timestamp))
+
+    def test_empty(self):
+        self.assertEqual(len(self._ring), 0)
+        self.assertEqual(len(self._ring.last()), 0)
+        self.assertEqual(len(self._ring.last(3)), 0)
+        self.assertEqual(len(self._ring.since(0.0)), 0)
+
+    def test_last(self):
+        self._append(1, 2, 3)
+        self.assertEqual(self._ring.last()['timestamp'].tolist(), [1, 2, 3])
+        self.assertEqual(self._ring.last(2)['x'].tolist(), [20, 30])
+        self.assertEqual(len(self._ring.last(0)), 0)
+        self.assertEqual(len(self._ring.last(10)), 3)
+
+    def test_last_wraps_around(self):
+        for n in range(1, 12):
+            self._append(n)
+            expect = list(range(max(1, n - 3), n + 1))
+            self.assertEqual(self._ring.last()['timestamp'].tolist(), expect, n)
+            self.assertEqual(self._ring.last(2)['y'].tolist(), [-t for t in expect[-2:]], n)
+        self.assertEqual(len(self._ring), 4)
+
+    def test_last_is_a_view(self):
+        self._append(1, 2)
+        view = self._ring.last()
+        self.assertIs(view.base, self._ring._data)
+        kept = view.copy()
+        self._append(3, 4, 5, 6, 7)
+        self.assertEqual(kept['timestamp'].tolist(), [1, 2])
+
+    def test_since(self):
+        self._append(1, 2, 3, 4, 5, 6)
+        self.assertEqual(self._ring.since(4)['timestamp'].tolist(), [4, 5, 6])
+        self.assertEqual(self._ring.since(4.5)['timestamp'].tolist(), [5, 6])
+        # older samples were overwritten.
+        self.assertEqual(self._ring.since(0)['timestamp'].tolist(), [3, 4, 5, 6])
+        self.assertEqual(len(self._ring.since(7)), 0)
+
+    def test_clear(self):
+        self._append(1, 2, 3, 4, 5)
+        self._ring.clear()
+        self.assertEqual(len(self._ring.last()), 0)
+        self._append(6)
+        self.assertEqual(self._ring.last()['timestamp'].tolist(), [6])
+
+    def test_capacity(self):
+        with self.assertRaises(ValueError):
+            telemetry.RingBuffer(('x',), capacity=0)
+
+
+if __name__ == '__main__':
+    unittest.main()